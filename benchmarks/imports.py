@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Shows the import time of configtpl modules, as reported by `python -X importtime`.
+
+Each module is imported in a new interpreter several times, and the minimum is shown,
+since it's the least affected by other processes.
+Usage: python benchmarks/imports.py [--budget-ms 40]
+"""
+
+import argparse
+import subprocess
+import sys
+
+MODULES = ("configtpl", "configtpl.main", "configtpl.snapshot")
+REPEATS = 5
+
+
+def measure(module: str) -> int:
+  """
+  Returns the cumulative import time of module in microseconds
+  """
+  best = sys.maxsize
+  for _ in range(REPEATS):
+    stderr = subprocess.run(  # noqa: S603 trusted args
+      [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+      check=True,
+      capture_output=True,
+      text=True,
+    ).stderr
+    for line in stderr.splitlines():
+      # import time: self [us] | cumulative | imported package
+      (_, cumulative, name) = line.split("|")
+      if name.strip() == module:
+        best = min(best, int(cumulative))
+  return best
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--budget-ms", type=float, help="exit with code 1 if any module takes longer to import")
+  args = parser.parse_args()
+
+  over_budget = False
+  print(f"{'module':<24}{'time, ms':>10}")
+  for module in MODULES:
+    elapsed_ms = measure(module) / 1000
+    over_budget |= args.budget_ms is not None and elapsed_ms > args.budget_ms
+    print(f"{module:<24}{elapsed_ms:>10.2f}")
+  sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Shows how time and memory of `ConfigTpl.build_from_files` scale with the number of layers.
+
+Each layer is small, but the rendering context is large (a service catalog passed in `ctx`),
+which is the case where copying of the context for each layer dominates.
+Usage: python benchmarks/layers.py [--legacy]
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+
+from configtpl.main import ConfigTpl
+
+LAYER_COUNTS = (5, 10, 20, 40, 80)
+CATALOG_SIZE = 2000
+REPEATS = 3
+
+
+class LegacyConfigTpl(ConfigTpl):
+  """Copies the whole rendering context for each layer, as it was done before"""
+
+  def _render_layer(self, path: str, cfg: dict, ctx: dict) -> dict:
+    return self._render_cfg_from_file(path, deepcopy({**cfg, **ctx}))
+
+
+def make_layers(directory: Path, n: int) -> list[str]:
+  paths = []
+  for i in range(n):
+    path = directory / f"layer_{i:03}.cfg"
+    path.write_text(
+      f"layer_{i}:\n  name: layer {i}\n  service: {{{{ catalog.service_{i}.host }}}}\nshared:\n  last_layer: {i}\n",
+    )
+    paths.append(str(path))
+  return paths
+
+
+def measure(builder: ConfigTpl, paths: list[str], ctx: dict) -> tuple[float, int]:
+  best = float("inf")
+  for _ in range(REPEATS):
+    start = time.perf_counter()
+    builder.build_from_files(paths, ctx=ctx)
+    best = min(best, time.perf_counter() - start)
+
+  tracemalloc.start()
+  builder.build_from_files(paths, ctx=ctx)
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return best, peak
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--legacy", action="store_true", help="also measure copying of context for each layer")
+  args = parser.parse_args()
+
+  ctx = {
+    "catalog": {
+      f"service_{i}": {"host": f"service-{i}.internal", "port": 8000 + i, "tags": ["a", "b", "c"]}
+      for i in range(CATALOG_SIZE)
+    },
+  }
+  builders = {"current": ConfigTpl()}
+  if args.legacy:
+    builders["legacy"] = LegacyConfigTpl()
+
+  print(f"{'builder':<10}{'layers':>8}{'time, ms':>12}{'peak memory, KiB':>20}")
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for n in LAYER_COUNTS:
+      paths = make_layers(Path(tmp_dir), n)
+      for name, builder in builders.items():
+        elapsed, peak = measure(builder, paths, ctx)
+        print(f"{name:<10}{n:>8}{elapsed * 1000:>12.2f}{peak / 1024:>20.1f}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+"""
+Measures time and peak memory of the build pipeline on synthetic workloads.
+
+Usage:
+  python benchmarks/suite.py                                  # print results
+  python benchmarks/suite.py --save baseline.json             # save results as a baseline
+  python benchmarks/suite.py --compare baseline.json          # compare results with a baseline
+
+When comparing, the exit code is 1 if any workload got slower or used more memory than the threshold allows.
+Baselines are only comparable when they are taken on the same machine and Python version.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+from configtpl.env import EnvSnapshot, get_config_from_env
+from configtpl.main import ConfigTpl
+from configtpl.parsers import JsonParser
+from configtpl.utils.dicts import dict_deep_merge
+
+ENV_PREFIX = "CONFIGTPL_BENCH"
+
+# A workload prepares its inputs and returns a function to measure
+Workload = Callable[[Path, contextlib.ExitStack], Callable[[], object]]
+
+
+def write_files(directory: Path, contents: dict[str, str]) -> list[str]:
+  paths = []
+  for name, text in contents.items():
+    path = directory / name
+    path.write_text(text)
+    paths.append(str(path))
+  return paths
+
+
+def make_nested(depth: int, leaf: object) -> dict:
+  result = {"leaf": leaf}
+  for i in range(depth):
+    result = {f"level_{i}": result, "value": i}
+  return result
+
+
+def workload_many_small_layers(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  paths = write_files(
+    tmp_dir,
+    {
+      f"layer_{i:03}.cfg": (
+        f"layer_{i}:\n  name: layer {i}\n  prev: {{{{ shared.last_layer }}}}\nshared:\n  last_layer: {i}\n"
+      )
+      for i in range(100)
+    },
+  )
+  builder = ConfigTpl(defaults={"shared": {"last_layer": None}})
+  return lambda: builder.build_from_files(paths)
+
+
+def workload_few_huge_layers(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  paths = write_files(
+    tmp_dir,
+    {
+      f"huge_{i}.cfg": "\n".join(f"key_{j}:\n  value: {{{{ {j} * {i} }}}}\n  name: item {j}" for j in range(3000))
+      for i in range(3)
+    },
+  )
+  builder = ConfigTpl()
+  return lambda: builder.build_from_files(paths)
+
+
+def workload_deep_nesting(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  paths = write_files(
+    tmp_dir,
+    {f"deep_{i}.json": json.dumps(make_nested(300, f"layer {i}")) for i in range(5)},
+  )
+  builder = ConfigTpl(parsers_by_extension={".json": JsonParser()})
+  return lambda: builder.build_from_files(paths)
+
+
+def workload_includes(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  write_files(
+    tmp_dir,
+    {
+      "_macros.j2": "{% macro endpoint(name) %}{{ name }}.internal:{{ 8000 + name | length }}{% endmacro %}",
+      **{f"_part_{i}.j2": f'part_{i}: "{{{{ m.endpoint("service_{i}") }}}}"\n' for i in range(20)},
+    },
+  )
+  paths = write_files(
+    tmp_dir,
+    {
+      f"layer_{i:02}.cfg": '{% import "_macros.j2" as m %}\n'
+      + "".join(f'{{% include "_part_{j}.j2" %}}\n' for j in range(20))
+      for i in range(20)
+    },
+  )
+  builder = ConfigTpl()
+  return lambda: builder.build_from_files(paths)
+
+
+def workload_large_ctx(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  ctx = {
+    "catalog": {f"service_{i}": {"host": f"service-{i}.internal", "port": 8000 + i} for i in range(5000)},
+  }
+  paths = write_files(
+    tmp_dir,
+    {f"layer_{i:02}.cfg": f"service_{i}: {{{{ catalog.service_{i}.host }}}}\n" for i in range(20)},
+  )
+  builder = ConfigTpl()
+  return lambda: builder.build_from_files(paths, ctx=ctx)
+
+
+def workload_generated_layer(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  paths = write_files(
+    tmp_dir,
+    {"routes.cfg": "routes:\n{% for i in range(20000) %}  - {path: /route/{{ i }}, port: {{ i % 100 }}}\n{% endfor %}"},
+  )
+  builder = ConfigTpl(stream_render=True)
+  return lambda: builder.build_from_files(paths)
+
+
+def workload_generated_documents(tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  document = "---\n{% for j in range(10) %}route_{{ j }}: /{{ i }}/{{ j }}\n{% endfor %}"
+  (path,) = write_files(tmp_dir, {"routes.cfg": f"{{% for i in range(2000) %}}{document}{{% endfor %}}"})
+  builder = ConfigTpl()
+  return lambda: sum(1 for _ in builder.build_documents_from_file(path))
+
+
+def workload_build_from_str(_tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  tpl = "\n".join(f"key_{i}: {{{{ base + {i} }}}}" for i in range(2000))
+  builder = ConfigTpl(defaults={"base": 1})
+  return lambda: builder.build_from_str(tpl)
+
+
+def workload_merge_wide_dicts(_tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  dicts = [{f"key_{j}": {"value": j, "layer": i, "tags": [i, j]} for j in range(20000)} for i in range(3)]
+  return lambda: dict_deep_merge(*dicts)
+
+
+def workload_merge_deep_dicts(_tmp_dir: Path, _stack: contextlib.ExitStack) -> Callable[[], object]:
+  dicts = [make_nested(2000, i) for i in range(5)]
+  return lambda: dict_deep_merge(*dicts)
+
+
+def workload_env_prefix(_tmp_dir: Path, stack: contextlib.ExitStack) -> Callable[[], object]:
+  env_vars = {f"{ENV_PREFIX}__SECTION_{i % 50}__KEY_{i}": str(i) for i in range(5000)}
+  stack.enter_context(patch.dict(os.environ, env_vars))
+  return lambda: get_config_from_env(ENV_PREFIX)
+
+
+def workload_env_snapshot(_tmp_dir: Path, stack: contextlib.ExitStack) -> Callable[[], object]:
+  env_vars = {f"{ENV_PREFIX}__SECTION_{i % 50}__KEY_{i}": str(i) for i in range(5000)}
+  stack.enter_context(patch.dict(os.environ, env_vars))
+  snapshot = EnvSnapshot()
+  return lambda: snapshot.get_config(ENV_PREFIX)
+
+
+WORKLOADS: dict[str, Workload] = {
+  "build_from_files/many_small_layers": workload_many_small_layers,
+  "build_from_files/few_huge_layers": workload_few_huge_layers,
+  "build_from_files/deep_nesting": workload_deep_nesting,
+  "build_from_files/includes": workload_includes,
+  "build_from_files/large_ctx": workload_large_ctx,
+  "build_from_files/generated_layer_streamed": workload_generated_layer,
+  "build_documents_from_file/generated_documents": workload_generated_documents,
+  "build_from_str/wide_template": workload_build_from_str,
+  "dict_deep_merge/wide_dicts": workload_merge_wide_dicts,
+  "dict_deep_merge/deep_dicts": workload_merge_deep_dicts,
+  "get_config_from_env/large_prefix": workload_env_prefix,
+  "env_snapshot/large_prefix": workload_env_snapshot,
+}
+
+
+def measure(workload: Workload, repeats: int) -> dict[str, float]:
+  """
+  Returns the best and median time in seconds and peak memory in bytes.
+  The first call is not measured, so caches which live in builders are warm, as in a long-running service.
+  """
+  with tempfile.TemporaryDirectory() as tmp_dir, contextlib.ExitStack() as stack:
+    fn = workload(Path(tmp_dir), stack)
+    fn()
+    times = []
+    for _ in range(repeats):
+      start = time.perf_counter()
+      fn()
+      times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+      fn()
+      _, peak = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+  return {"time": min(times), "median_time": statistics.median(times), "peak_memory": peak}
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> bool:
+  """
+  Prints the comparison report. Returns True if there are regressions.
+  """
+  regressed = False
+  print(f"{'workload':<42}{'time, ms':>12}{'baseline':>12}{'change':>9}", end="")
+  print(f"{'memory, KiB':>14}{'baseline':>12}{'change':>9}")
+  for name, result in results.items():
+    base = baseline["results"].get(name)
+    if base is None:
+      print(f"{name:<42}{result['time'] * 1000:>12.2f}{'-':>21}{result['peak_memory'] / 1024:>14.1f}{'-':>21}")
+      continue
+    time_change = result["time"] / base["time"] - 1
+    memory_change = result["peak_memory"] / max(base["peak_memory"], 1) - 1
+    marks = ""
+    if time_change > threshold or memory_change > threshold:
+      regressed = True
+      marks = "  REGRESSION"
+    print(
+      f"{name:<42}{result['time'] * 1000:>12.2f}{base['time'] * 1000:>12.2f}{time_change:>+9.1%}"
+      f"{result['peak_memory'] / 1024:>14.1f}{base['peak_memory'] / 1024:>12.1f}{memory_change:>+9.1%}{marks}",
+    )
+  return regressed
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--save", type=Path, help="save results into a baseline file")
+  parser.add_argument("--compare", type=Path, help="compare results with a baseline file")
+  parser.add_argument(
+    "--threshold",
+    type=float,
+    default=0.2,
+    help="allowed relative growth of time and memory (default: 0.2)",
+  )
+  parser.add_argument("--repeats", type=int, default=5, help="number of measured runs of each workload")
+  parser.add_argument("--only", action="append", help="run only workloads which names contain the value")
+  args = parser.parse_args()
+
+  results = {}
+  for name, workload in WORKLOADS.items():
+    if args.only and not any(only in name for only in args.only):
+      continue
+    results[name] = measure(workload, args.repeats)
+    if not args.compare:
+      print(f"{name:<42}{results[name]['time'] * 1000:>12.2f} ms{results[name]['peak_memory'] / 1024:>14.1f} KiB")
+
+  if args.save:
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    args.save.write_text(json.dumps(report, indent=2))
+  if args.compare and compare(json.loads(args.compare.read_text()), results, args.threshold):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
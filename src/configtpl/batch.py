@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTORS = (EXECUTOR_THREAD, EXECUTOR_PROCESS)
+
+ERR_UNKNOWN_EXECUTOR = "Unknown executor '{executor}'. Supported executors: {executors}"
+ERR_INVALID_JOB = "A batch job must be an instance of BatchJob, got {job!r}"
+ERR_UNPICKLABLE_BUILDER = (
+  "The builder cannot be sent to worker processes: {error}. "
+  "Globals, filters and other arguments of builder must be picklable, e.g. functions defined at module level"
+)
+
+
+@dataclass
+class BatchJob:
+  """
+  A configuration to build in a batch. Arguments are the same as in `ConfigTpl.build_from_files`.
+
+  Args:
+      paths (list[str]): paths to configuration files
+      overrides (dict | None): Overrides are applied at the very end stage after all templates are rendered
+      ctx (dict | None): additional rendering context which is NOT injected into configuration
+  """
+
+  paths: list[str]
+  overrides: dict | None = None
+  ctx: dict | None = None
+
+
+@dataclass
+class BatchResult:
+  """
+  A result of batch job.
+
+  Args:
+      index (int): a position of job in the batch
+      job (BatchJob): the job
+      cfg (dict | None): the built configuration, None if the build failed
+      error (Exception | None): an error raised by the build
+  """
+
+  index: int
+  job: BatchJob
+  cfg: dict | None = None
+  error: Exception | None = None
+
+  @property
+  def ok(self) -> bool:
+    return self.error is None
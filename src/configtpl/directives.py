@@ -0,0 +1,117 @@
+import os.path
+from collections import deque
+from pathlib import Path
+
+DIRECTIVE_KEY = "@configtpl"
+DIRECTIVE_LOAD_NEXT_DEFER = "load_next_defer"
+DIRECTIVES = (DIRECTIVE_LOAD_NEXT_DEFER,)
+
+ERR_INVALID_DIRECTIVE = "Invalid '" + DIRECTIVE_KEY + "' directive in '{path}': {error}"
+ERR_RECURSIVE_LOADING = "Recursive loading of configuration files: {chain}"
+
+
+def directives_pop(cfg: dict, path: str, base_dir: str | Path) -> tuple[dict, list[str]]:
+  """
+  Removes the "@configtpl" directive from configuration rendered from a file.
+  Returns the configuration without directive and real paths of files which the file requests to load next.
+
+  Args:
+      cfg (dict): the configuration rendered from a file
+      path (str): the path of file, for error messages
+      base_dir (str | Path): a directory which relative paths in directive are resolved against
+  """
+  if not isinstance(cfg, dict) or DIRECTIVE_KEY not in cfg:
+    return cfg, []
+
+  directive = cfg[DIRECTIVE_KEY]
+  cfg = {k: v for k, v in cfg.items() if k != DIRECTIVE_KEY}
+  if directive is None:
+    return cfg, []
+  if not isinstance(directive, dict):
+    raise TypeError(ERR_INVALID_DIRECTIVE.format(path=path, error="a mapping is expected"))
+  unknown = set(directive) - set(DIRECTIVES)
+  if unknown:
+    error = f"unknown keys {', '.join(sorted(map(str, unknown)))}. Supported keys: {', '.join(DIRECTIVES)}"
+    raise ValueError(ERR_INVALID_DIRECTIVE.format(path=path, error=error))
+
+  next_paths = directive.get(DIRECTIVE_LOAD_NEXT_DEFER) or []
+  if isinstance(next_paths, str):
+    next_paths = [next_paths]
+  if not isinstance(next_paths, list) or not all(isinstance(p, str) for p in next_paths):
+    error = f"'{DIRECTIVE_LOAD_NEXT_DEFER}' must be a path or a list of paths"
+    raise TypeError(ERR_INVALID_DIRECTIVE.format(path=path, error=error))
+  return cfg, [os.path.realpath(Path(base_dir, p)) for p in next_paths]
+
+
+def directives_check_recursion(path: str, parents: tuple[str, ...]) -> None:
+  """
+  Raises an error if a file is requested by itself or by a file which it requests, directly or indirectly
+
+  Args:
+      path (str): a path of requested file
+      parents (tuple[str, ...]): a chain of files which lead to the request, from the first one
+  """
+  if path in parents:
+    chain = " -> ".join((*parents[parents.index(path) :], path))
+    raise ValueError(ERR_RECURSIVE_LOADING.format(chain=chain))
+
+
+class LayerQueue:
+  def __init__(self, paths: list[str], requested_by: str | None = None):
+    """
+    Orders the files of a build. Files are loaded in the given order. Files which a file requests
+    with "@configtpl" directive are loaded right after it, before the next files (depth first).
+    Each file is loaded once, even if it's given several times or requested by several files.
+    A requested file which is also given in `paths` is loaded at its position in `paths`.
+    Recursive requests raise an error.
+
+    Args:
+        paths (list[str]): real paths of files to load
+        requested_by (str | None): if specified, the files are treated as requested by this file, e.g. by a template
+          rendered from string
+    """
+    self._queue: deque[tuple[str, tuple[str, ...]]] = deque()
+    self._loaded: set[str] = set()
+    self._requested: set[str] = set()
+    if requested_by is None:
+      self._queue.extend((p, ()) for p in paths)
+      self._requested.update(paths)
+    else:
+      self.push_next(requested_by, (), paths)
+
+  def __bool__(self) -> bool:
+    self._skip_loaded()
+    return bool(self._queue)
+
+  def pop(self) -> tuple[str, tuple[str, ...]]:
+    """
+    Returns a path of the next file to load and a chain of files which requested it
+    """
+    self._skip_loaded()
+    (path, parents) = self._queue.popleft()
+    self._loaded.add(path)
+    return path, parents
+
+  def push_next(self, path: str, parents: tuple[str, ...], next_paths: list[str]) -> list[str]:
+    """
+    Schedules the files requested by a file. Returns the ones which are not loaded or scheduled yet.
+
+    Args:
+        path (str): a path of file which requests other files
+        parents (tuple[str, ...]): a chain of files which requested the file
+        next_paths (list[str]): real paths of requested files
+    """
+    chain = (*parents, path)
+    scheduled = []
+    for next_path in next_paths:
+      directives_check_recursion(next_path, chain)
+      if next_path in self._loaded or next_path in self._requested:
+        continue
+      self._requested.add(next_path)
+      scheduled.append(next_path)
+    self._queue.extendleft((p, chain) for p in reversed(scheduled))
+    return scheduled
+
+  def _skip_loaded(self) -> None:
+    while self._queue and self._queue[0][0] in self._loaded:
+      self._queue.popleft()
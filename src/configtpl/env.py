@@ -1,4 +1,12 @@
 import os
+import threading
+from collections.abc import Mapping
+
+from configtpl.manifest import manifest_record_env_prefix_vars
+from configtpl.schema import Schema
+from configtpl.utils.dicts import dict_thaw
+
+ERR_INVALID_ENV_VAR = "Invalid environment variable '{name}': {error}"
 
 
 def _parse_env_var_value(value: str) -> object:  # noqa: PLR0911 too  many return statements
@@ -33,22 +41,122 @@ def _parse_env_var_value(value: str) -> object:  # noqa: PLR0911 too  many retur
   return value
 
 
-def get_config_from_env(env_prefix: str | None = None) -> dict:
+def get_config_from_env(
+  env_prefix: str | None = None,
+  environ: Mapping[str, str] | None = None,
+  schema: Schema | None = None,
+) -> dict:
   """
   Parses environment variables into a dictionary.
   If prefix is not provided, an empty dictionary is returned.
+
+  Args:
+      env_prefix (str | None): a prefix of variables, e.g. "MY_APP" for variables like "MY_APP__DB__HOST"
+      environ (Mapping[str, str] | None): variables to read. `os.environ` is read by default
+      schema (Schema | None): if specified, values are converted into the types of their keys.
+        Types of values for keys which are not described by schema are guessed
   """
   if env_prefix is None:
     return {}
 
+  (consumed, env_vars) = _parse_env(os.environ if environ is None else environ, env_prefix, schema)
+  manifest_record_env_prefix_vars(f"{env_prefix}__", consumed)
+  return env_vars
+
+
+class EnvSnapshot:
+  def __init__(self, environ: Mapping[str, str] | None = None):
+    """
+    Reads configuration from environment variables like `get_config_from_env`,
+    but keeps the parsed configuration for each prefix and reuses it while the variables are unchanged.
+    Changes are detected by comparing the variables with their copy taken on the previous call,
+    which is much cheaper than parsing. Only the prefixes with changed variables are parsed again.
+
+    Args:
+        environ (Mapping[str, str] | None): variables to read. By default, `os.environ` is read on each call,
+          so its changes are picked up. An explicit mapping is useful for tests and for builds of multiple tenants
+          in the same process
+    """
+    self.environ = os.environ if environ is None else environ
+    self._lock = threading.Lock()
+    self._raw: dict | None = None
+    # Prefixes and schemas, variables with prefix and parsed configuration
+    self._entries: dict[tuple[str, Schema | None], tuple[dict[str, str], dict]] = {}
+
+  def __reduce__(self) -> tuple:
+    # Only the explicit mapping is copied, e.g. into worker processes, which have their own `os.environ`
+    return (EnvSnapshot, (None if self.environ is os.environ else dict(self.environ),))
+
+  def get_config(self, env_prefix: str | None = None, schema: Schema | None = None) -> dict:
+    """
+    Returns a configuration made of variables with the prefix, same as `get_config_from_env`.
+    The result is a copy, so it might be modified by caller.
+    """
+    if env_prefix is None:
+      return {}
+    (consumed, env_vars) = self._get_entry(env_prefix, schema)
+    manifest_record_env_prefix_vars(f"{env_prefix}__", consumed)
+    return dict_thaw(env_vars)
+
+  def get_vars(self, env_prefix: str | None = None) -> dict[str, str]:
+    """
+    Returns the raw variables with the prefix
+    """
+    if env_prefix is None:
+      return {}
+    return dict(self._get_entry(env_prefix)[0])
+
+  def _get_entry(self, env_prefix: str, schema: Schema | None = None) -> tuple[dict[str, str], dict]:
+    with self._lock:
+      self._refresh()
+      entry = self._entries.get((env_prefix, schema))
+      if entry is None:
+        entry = self._entries[(env_prefix, schema)] = _parse_env(self.environ, env_prefix, schema)
+      return entry
+
+  def _refresh(self) -> None:
+    """
+    Drops the entries of prefixes which variables have changed since the previous call
+    """
+    # `os.environ` keeps the raw variables in a dictionary. Comparing it is much faster than decoding the values
+    raw = getattr(self.environ, "_data", self.environ)
+    if raw == self._raw:
+      return
+    old = {} if self._raw is None else self._raw
+    changed = {os.fsdecode(k) for k, _ in raw.items() ^ old.items()}
+    self._entries = {
+      (prefix, schema): entry
+      for (prefix, schema), entry in self._entries.items()
+      if not any(k.startswith(f"{prefix}__") for k in changed)
+    }
+    self._raw = dict(raw)
+
+
+def _parse_env(
+  environ: Mapping[str, str],
+  env_prefix: str,
+  schema: Schema | None = None,
+) -> tuple[dict[str, str], dict]:
+  """
+  Returns the variables with prefix and the configuration parsed from them
+  """
   env_vars = {}
   prefix = f"{env_prefix}__"
-  for key, value in os.environ.items():
+  consumed = {}
+  for key, value in environ.items():
     if key.startswith(prefix):
+      consumed[key] = value
       path = key[len(prefix) :].lower().split("__")
 
       current_level = env_vars
       for part in path[:-1]:
         current_level = current_level.setdefault(part, {})
-      current_level[path[-1]] = _parse_env_var_value(value)
-  return env_vars
+      convert = None if schema is None else schema.get_env_converter(path)
+      if convert is None:
+        current_level[path[-1]] = _parse_env_var_value(value)
+        continue
+      try:
+        current_level[path[-1]] = convert(value)
+      except ValueError as e:
+        raise ValueError(ERR_INVALID_ENV_VAR.format(name=key, error=e)) from e
+  return consumed, env_vars
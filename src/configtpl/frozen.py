@@ -0,0 +1,209 @@
+import sys
+from collections.abc import Iterator, Mapping, Sequence
+
+PATH_SEPARATOR = "."
+
+ERR_UNHASHABLE = "The configuration contains unhashable values"
+
+_MISSING = object()
+
+
+class FrozenConfig(Mapping):
+  __slots__ = ("_data", "_hash", "_index", "_prefix")
+
+  def __init__(self, cfg: Mapping, *, index: bool = False):
+    """
+    An immutable configuration which can be shared between threads without copying.
+
+    Nested dictionaries become `FrozenConfig` sections and lists become tuples. String keys are interned,
+    so the same keys in many sections share memory. `get_path` finds values by their dotted paths
+    (e.g. "db.replicas.0.host") walking the sections, or with a single dictionary lookup if index is built.
+    The configuration is hashable: the hash is computed from its structure once, when it's created,
+    so it's a cheap way to detect changes between builds in the same process.
+
+    Args:
+        cfg (Mapping): a configuration to freeze
+        index (bool): if True, all values are indexed by their dotted paths. Lookups don't depend
+          on the depth of paths then, but the index of path strings takes more memory than the configuration itself
+    """
+    _freeze(self, cfg, {} if index else None)
+
+  def __getitem__(self, key: object) -> object:
+    return self._data[key]
+
+  def __iter__(self) -> Iterator:
+    return iter(self._data)
+
+  def __len__(self) -> int:
+    return len(self._data)
+
+  def __contains__(self, key: object) -> bool:
+    return key in self._data
+
+  def __hash__(self) -> int:
+    if self._hash is None:
+      raise TypeError(ERR_UNHASHABLE)
+    return self._hash
+
+  def __eq__(self, other: object) -> bool:
+    if isinstance(other, FrozenConfig):
+      if self is other:
+        return True
+      if self._hash is not None and other._hash is not None and self._hash != other._hash:
+        return False
+      return self._data == other._data
+    if isinstance(other, Mapping):
+      return self.to_dict() == other
+    return NotImplemented
+
+  def __repr__(self) -> str:
+    return f"FrozenConfig({self.to_dict()!r})"
+
+  def __reduce__(self) -> tuple:
+    return (_restore, (self.to_dict(), self._index is not None))
+
+  def get_path(self, path: str | Sequence, default: object = _MISSING) -> object:
+    """
+    Returns a value by path relative to this section. Raises KeyError if there is no such value and
+    no default value is provided.
+
+    Args:
+        path (str | Sequence): keys separated by dots, e.g. "db.replicas.0.host", or a sequence of keys,
+          e.g. ["db", "replicas", 0, "host"]. Use a sequence for keys which contain dots or are not strings
+        default (object): a value to return if there is no value at the path
+    """
+    if isinstance(path, str) and self._prefix is not None:
+      value = self._index.get(self._prefix + path, _MISSING)
+    else:
+      value = self._walk(path.split(PATH_SEPARATOR) if isinstance(path, str) else path)
+    if value is not _MISSING:
+      return value
+    if default is _MISSING:
+      raise KeyError(path)
+    return default
+
+  def to_dict(self) -> dict:
+    """
+    Returns the configuration as a new regular dictionary. Tuples are converted into lists.
+    """
+
+    def make(v: object) -> object:
+      if not isinstance(v, (FrozenConfig, tuple)):
+        return v
+      copy = {} if isinstance(v, FrozenConfig) else []
+      stack.append((copy, v))
+      return copy
+
+    stack: list[tuple[object, object]] = []
+    result = make(self)
+    while stack:
+      target, source = stack.pop()
+      if isinstance(source, FrozenConfig):
+        for k, v in source._data.items():  # noqa: SLF001 a section of the same class
+          target[k] = make(v)
+      else:
+        target.extend(make(v) for v in source)
+    return result
+
+  def _walk(self, keys: Sequence) -> object:
+    value = self
+    for key in keys:
+      if isinstance(value, FrozenConfig):
+        value = value._data.get(key, _MISSING)  # noqa: SLF001 a section of the same class
+      elif isinstance(value, tuple):
+        try:
+          value = value[int(key)]
+        except (ValueError, IndexError):
+          return _MISSING
+      else:
+        return _MISSING
+      if value is _MISSING:
+        return _MISSING
+    return value
+
+
+class _Frame:
+  """
+  A container which is being frozen.
+
+  Args:
+      source (Mapping | list | tuple): the source container
+      target (FrozenConfig | None): a section to fill, None for lists
+      prefix (str | None): the path of container in index with trailing separator.
+        None if container is not indexed, e.g. index is not built or it's under a key which contains a separator
+      key (object): the key of container in its parent
+  """
+
+  __slots__ = ("items", "key", "prefix", "target", "values")
+
+  def __init__(self, source: Mapping | list | tuple, target: FrozenConfig | None, prefix: str | None, key: object):
+    self.items = iter(source.items() if isinstance(source, Mapping) else enumerate(source))
+    self.target = target
+    self.prefix = prefix
+    self.key = key
+    self.values: dict | list = {} if target is not None else []
+
+
+def _restore(cfg: Mapping, index: bool) -> FrozenConfig:  # noqa: FBT001 positional args of pickle
+  return FrozenConfig(cfg, index=index)
+
+
+def _freeze(root: FrozenConfig, cfg: Mapping, index: dict[str, object] | None) -> None:
+  """
+  Fills the root section from configuration and the index of values by dotted paths, if it's not None.
+  Containers are converted without recursion, so the depth of configuration is not limited.
+  """
+  stack = [_Frame(cfg, root, None if index is None else "", None)]
+  while stack:
+    frame = stack[-1]
+    item = next(frame.items, None)
+    if item is None:
+      stack.pop()
+      value = _finish(frame, index)
+      if stack:
+        _add(stack[-1], frame.key, value, index)
+      continue
+
+    (key, value) = item
+    if isinstance(key, str):
+      key = sys.intern(key)
+    if isinstance(value, (Mapping, list, tuple)):
+      prefix = None
+      if frame.prefix is not None and _is_path_key(frame, key):
+        prefix = f"{frame.prefix}{key}{PATH_SEPARATOR}"
+      target = object.__new__(FrozenConfig) if isinstance(value, Mapping) else None
+      stack.append(_Frame(value, target, prefix, key))
+    else:
+      _add(frame, key, value, index)
+
+
+def _finish(frame: _Frame, index: dict[str, object] | None) -> object:
+  if frame.target is None:
+    return tuple(frame.values)
+  section = frame.target
+  section._data = frame.values  # noqa: SLF001 the section is being created
+  section._index = index  # noqa: SLF001
+  section._prefix = frame.prefix  # noqa: SLF001
+  try:
+    section._hash = hash(frozenset(frame.values.items()))  # noqa: SLF001
+  except TypeError:
+    section._hash = None  # noqa: SLF001
+  return section
+
+
+def _add(frame: _Frame, key: object, value: object, index: dict[str, object] | None) -> None:
+  if frame.target is None:
+    frame.values.append(value)
+  else:
+    frame.values[key] = value
+  if frame.prefix is not None and _is_path_key(frame, key):
+    index[f"{frame.prefix}{key}"] = value
+
+
+def _is_path_key(frame: _Frame, key: object) -> bool:
+  """
+  Returns True if the key can be a part of dotted path
+  """
+  if frame.target is None:
+    return True
+  return isinstance(key, str) and PATH_SEPARATOR not in key
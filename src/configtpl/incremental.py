@@ -0,0 +1,119 @@
+import os
+import os.path
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+from .directives import LayerQueue, directives_pop
+from .jinja.analysis import analysis_get_inputs
+from .main import ConfigTpl
+from .manifest import BuildManifest, manifest_record_manifest, manifest_scope
+from .utils.dicts import dict_freeze, dict_init_dicts_from_list, dict_thaw
+
+
+@dataclass
+class _LayerState:
+  """
+  A state of configuration file rendered during the previous build.
+
+  Args:
+      path (str): a real path to the configuration file
+      read_vars (frozenset[str] | None): top-level context variables which are referenced by template.
+        None means that template might read any variable (e.g. the name of included template is computed)
+      inputs (dict): values of `read_vars` in the rendering context
+      manifest (BuildManifest): inputs of the file rendering
+      output (dict): the configuration rendered from this file
+      next_paths (list[str]): files requested by "@configtpl" directive of this file
+      cfg (dict): the configuration built from this file and all files before it
+  """
+
+  path: str
+  read_vars: frozenset[str] | None
+  inputs: dict
+  manifest: BuildManifest
+  output: dict
+  next_paths: list[str]
+  cfg: dict
+
+
+class IncrementalBuilder:
+  def __init__(
+    self,
+    builder: ConfigTpl,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ):
+    """
+    Builds configuration from files and rebuilds it incrementally.
+
+    The state of each file is kept between builds. On rebuild, a file is rendered again only if
+    its template, included templates, files or environment variables it reads have changed,
+    or if the variables it reads from configuration built by previous files have changed.
+    Files which use nondeterministic globals (`cmd`, `uuid`) are always rendered again.
+
+    Args:
+        builder (ConfigTpl): a builder which renders the files
+        paths (list[str]): paths to configuration files, same as in `ConfigTpl.build_from_files`
+        overrides (dict | None): Overrides are applied at the very end stage after all templates are rendered
+        ctx (dict | None): additional rendering context which is NOT injected into configuration
+    """
+    self.builder = builder
+    self.paths = [os.path.realpath(p) for p in paths]
+    (self.overrides, ctx) = dict_init_dicts_from_list(overrides, ctx)
+    self.ctx = dict_freeze(ctx)
+    self.layers_rendered = 0
+    self._layers: list[_LayerState] = []
+
+  def build(self) -> dict:
+    """
+    Builds the configuration, reusing the files which are not affected by changes since the previous build.
+    The number of files rendered during this build is available as `layers_rendered` attribute.
+
+    Returns:
+        dict: The rendered configuration
+    """
+    with self.builder.cmd_runner.build_scope():
+      return self._build()
+
+  def _build(self) -> dict:
+    self.layers_rendered = 0
+    cfg = dict_freeze(self.builder.defaults)
+    # True while all previous files were reused, so the previous configuration is the same as in the last build
+    prefix_unchanged = True
+    layers = []
+    queue = LayerQueue(self.paths)
+    while queue:
+      (path, parents) = queue.pop()
+      i = len(layers)
+      state = self._layers[i] if i < len(self._layers) else None
+      ctx_iter = {**cfg, **self.ctx}
+      if state is not None and self._is_reusable(state, path, ctx_iter, prefix_unchanged=prefix_unchanged):
+        manifest_record_manifest(state.manifest)
+        cfg = state.cfg if prefix_unchanged else self.builder._merge_layers(cfg, state.output)  # noqa: SLF001 builder internals
+        layers.append(replace(state, cfg=cfg))
+        queue.push_next(path, parents, state.next_paths)
+        continue
+
+      prefix_unchanged = False
+      with manifest_scope() as manifest:
+        output = self.builder._render_layer(path, cfg, self.ctx)  # noqa: SLF001 builder internals
+      self.layers_rendered += 1
+      read_vars = self.builder._find_read_vars(path)  # noqa: SLF001 builder internals
+      (output, next_paths) = directives_pop(output, path, Path(path).parent)
+      output = dict_freeze(output)
+      cfg = self.builder._merge_layers(cfg, output)  # noqa: SLF001 builder internals
+      inputs = analysis_get_inputs(ctx_iter, read_vars)
+      layers.append(_LayerState(path, read_vars, inputs, manifest, output, next_paths, cfg))
+      queue.push_next(path, parents, next_paths)
+
+    self._layers = layers
+    # The states are shared between builds, so the result is copied to keep them intact
+    return dict_thaw(self.builder._finalize_cfg(cfg, self.overrides))  # noqa: SLF001 builder internals
+
+  def _is_reusable(self, state: _LayerState, path: str, ctx: dict, *, prefix_unchanged: bool) -> bool:
+    return (
+      state.path == path
+      and state.manifest.is_deterministic
+      and state.manifest.is_up_to_date(os.environ, self.builder.env_snapshot.environ)
+      and (prefix_unchanged or analysis_get_inputs(ctx, state.read_vars) == state.inputs)
+    )
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from configtpl.utils.cache import CacheStats, LruCache
+from configtpl.utils.fs import fs_hash_file, fs_hash_text
+
+if TYPE_CHECKING:
+  import jinja2
+
+DEFAULT_MAX_ENTRIES = 1024
+# Globals, filters and tests from these packages read only their arguments, not the rendering context.
+# The globals of configtpl, e.g. `cmd` or `uuid`, are not known: they might have side effects
+# or produce a different result on each call, so the templates which call them are rendered only once
+KNOWN_MODULES = frozenset(("_operator", "builtins", "configtpl", "jinja2", "markupsafe", "operator"))
+
+
+@dataclass
+class _Analysis:
+  """
+  Args:
+      read_vars (frozenset[str] | None): see `analysis_find_read_vars`
+      sources (dict[str, str]): file names of analyzed templates and digests of their sources
+      env_version (int | None): the version of globals and filters of environment, see `JinjaEnvFactory`
+  """
+
+  read_vars: frozenset[str] | None
+  sources: dict[str, str]
+  env_version: int | None = None
+
+
+class ReadVarsCache:
+  def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+    """
+    Caches the results of `analysis_find_read_vars` for templates loaded from files.
+    An entry is valid while the sources of template and of all templates it includes are unchanged,
+    and while the globals and filters of environment are unchanged.
+
+    Args:
+        max_entries (int): the maximum number of templates to keep
+    """
+    self._cache = LruCache(max_entries)
+
+  @property
+  def stats(self) -> CacheStats:
+    return self._cache.stats
+
+  def get(self, env: "jinja2.Environment", name: str) -> frozenset[str] | None:
+    """
+    Returns the variables which are referenced by template, see `analysis_find_read_vars`
+
+    Args:
+        env (jinja2.Environment): an environment which loads the template
+        name (str): a name of template
+    """
+    (source, filename, _) = env.loader.get_source(env, name)
+    digest = fs_hash_text(source)
+    env_version = getattr(env, "factory_version", None)
+    analysis = self._cache.get(filename)
+    if (
+      analysis is not None
+      and analysis.env_version == env_version
+      and analysis.sources.get(filename) == digest
+      and all(fs_hash_file(f) == d for f, d in analysis.sources.items() if f != filename)
+    ):
+      return analysis.read_vars
+
+    analysis = _analyze(env, source)
+    analysis.sources[filename] = digest
+    analysis.env_version = env_version
+    self._cache.put(filename, analysis)
+    return analysis.read_vars
+
+
+def analysis_find_read_vars(env: "jinja2.Environment", source: str) -> frozenset[str] | None:
+  """
+  Returns the top-level variables of rendering context which are referenced by template
+  and by templates it includes or imports. Referenced global functions are returned too.
+  None means that template might read any variable, e.g. the name of included template is computed during rendering,
+  or template uses a global, filter or test which might read the rendering context or have side effects
+  (see `KNOWN_MODULES`).
+
+  Args:
+      env (jinja2.Environment): an environment which loads the included templates
+      source (str): the source of template
+  """
+  return _analyze(env, source).read_vars
+
+
+def analysis_get_inputs(ctx: dict, read_vars: frozenset[str] | None) -> dict:
+  """
+  Returns the part of rendering context which is read by template.
+  The values are not copied, so comparison of inputs is cheap for values shared between contexts.
+  """
+  return ctx if read_vars is None else {k: ctx[k] for k in read_vars if k in ctx}
+
+
+def _analyze(env: "jinja2.Environment", source: str) -> _Analysis:
+  import jinja2  # noqa: PLC0415 imported on first use
+  from jinja2 import meta  # noqa: PLC0415
+
+  read_vars = set()
+  sources = {}
+  visited = set()
+  queue = [source]
+  while queue:
+    ast = env.parse(queue.pop())
+    read_vars.update(meta.find_undeclared_variables(ast))
+    if not _uses_known_functions(env, ast):
+      return _Analysis(None, sources)
+    for tpl_name in meta.find_referenced_templates(ast):
+      if tpl_name is None or env.loader is None:
+        return _Analysis(None, sources)
+      if tpl_name in visited:
+        continue
+      visited.add(tpl_name)
+      try:
+        (tpl_source, tpl_filename, _) = env.loader.get_source(env, tpl_name)
+      except jinja2.TemplateNotFound:
+        return _Analysis(None, sources)
+      if tpl_filename is not None:
+        sources[tpl_filename] = fs_hash_text(tpl_source)
+      queue.append(tpl_source)
+  return _Analysis(frozenset(read_vars), sources)
+
+
+def _uses_known_functions(env: "jinja2.Environment", ast: "jinja2.nodes.Template") -> bool:
+  """
+  Returns True if all globals, filters and tests used by template are known, see `_is_known`
+  """
+  from jinja2 import nodes  # noqa: PLC0415 imported on first use
+
+  # Globals are not reported as undeclared variables, so they are found by names
+  for node in ast.find_all((nodes.Name, nodes.Filter, nodes.Test)):
+    if isinstance(node, nodes.Name):
+      if node.name in env.globals and not _is_known_global(env, env.globals[node.name]):
+        return False
+      continue
+    functions = env.filters if isinstance(node, nodes.Filter) else env.tests
+    if node.name not in functions or not _is_known(env, functions[node.name]):
+      return False
+  return True
+
+
+def _is_known(env: "jinja2.Environment", v: object) -> bool:
+  """
+  Returns True if a global, filter or test cannot read the rendering context: it's defined in `KNOWN_MODULES`
+  and it isn't decorated with `pass_context`, `pass_eval_context` or `pass_environment`.
+  Decorated Jinja built-ins, e.g. `map`, use the context only to call the filters and tests of environment,
+  so they are known if all filters and tests are.
+  """
+  if not _is_known_function(v):
+    return False
+  if getattr(v, "jinja_pass_arg", None) is None:
+    return True
+  return all(_is_known_function(f) for f in (*env.filters.values(), *env.tests.values()))
+
+
+def _is_known_global(env: "jinja2.Environment", v: object) -> bool:
+  return _get_package(v) != "configtpl" and _is_known(env, v)
+
+
+def _is_known_function(v: object) -> bool:
+  package = _get_package(v)
+  return package in KNOWN_MODULES and (package == "jinja2" or getattr(v, "jinja_pass_arg", None) is None)
+
+
+def _get_package(v: object) -> str:
+  # The module of class is taken for values without a module, e.g. for strings and dicts
+  return (getattr(v, "__module__", None) or type(v).__module__).partition(".")[0]
@@ -0,0 +1,151 @@
+import contextlib
+import hashlib
+import os
+import threading
+from dataclasses import replace
+from pathlib import Path
+
+import jinja2
+from jinja2.bccache import Bucket
+
+from configtpl.utils.cache import CacheStats
+from configtpl.utils.fs import fs_write_atomic
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+FILE_PREFIX = "__configtpl_"
+FILE_SUFFIX = ".cache"
+
+# Environment options which affect the generated Python code
+_ENV_COMPILE_OPTIONS = (
+  "block_start_string",
+  "block_end_string",
+  "variable_start_string",
+  "variable_end_string",
+  "comment_start_string",
+  "comment_end_string",
+  "line_statement_prefix",
+  "line_comment_prefix",
+  "trim_blocks",
+  "lstrip_blocks",
+  "newline_sequence",
+  "keep_trailing_newline",
+  "optimized",
+  "autoescape",
+  "is_async",
+)
+
+
+class JinjaBytecodeCache(jinja2.BytecodeCache):
+  def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+    """
+    A persistent cache of compiled templates which can be shared by multiple processes.
+
+    Cache entries are keyed by template name and path, Jinja version and the options of Jinja environment.
+    Jinja itself rejects the entries whose source checksum doesn't match the current template source.
+    Files are written atomically. Once the total size of cache files exceeds `max_size`,
+    the least recently used entries are removed.
+
+    Args:
+        directory (str): a directory to store the compiled templates in. It is created if missing
+        max_size (int): the maximum total size of cache files in bytes
+    """
+    self.directory = Path(directory)
+    self.directory.mkdir(parents=True, exist_ok=True)
+    self.max_size = max_size
+    self._stats = CacheStats()
+    self._lock = threading.Lock()
+
+  def __reduce__(self) -> tuple:
+    # The cache is shared by directory, e.g. with worker processes
+    return (JinjaBytecodeCache, (str(self.directory), self.max_size))
+
+  @property
+  def stats(self) -> CacheStats:
+    """
+    Returns a snapshot of hit, miss and eviction counters
+    """
+    with self._lock:
+      return replace(self._stats)
+
+  def get_bucket(self, environment: jinja2.Environment, name: str, filename: str | None, source: str) -> Bucket:
+    key = self.get_cache_key(f"{_get_env_fingerprint(environment)}|{name}", filename)
+    bucket = Bucket(environment, key, self.get_source_checksum(source))
+    self.load_bytecode(bucket)
+    return bucket
+
+  def load_bytecode(self, bucket: Bucket) -> None:
+    path = self._get_path(bucket.key)
+    try:
+      with path.open("rb") as f:
+        bucket.load_bytecode(f)
+    except OSError:
+      # The file is missing or was evicted by another process
+      bucket.reset()
+
+    if bucket.code is None:
+      self._inc_stats(misses=1)
+      return
+
+    self._inc_stats(hits=1)
+    # The modification time is used as the last access time for eviction
+    with contextlib.suppress(OSError):
+      os.utime(path)
+
+  def dump_bytecode(self, bucket: Bucket) -> None:
+    fs_write_atomic(self._get_path(bucket.key), bucket.bytecode_to_string())
+    self._evict()
+
+  def clear(self) -> None:
+    for path in self._list_files():
+      path.unlink(missing_ok=True)
+
+  def _get_path(self, key: str) -> Path:
+    return self.directory / f"{FILE_PREFIX}{key}{FILE_SUFFIX}"
+
+  def _list_files(self) -> list[Path]:
+    return list(self.directory.glob(f"{FILE_PREFIX}*{FILE_SUFFIX}"))
+
+  def _evict(self) -> None:
+    """
+    Removes the least recently used files until the cache fits into the size limit
+    """
+    entries = []
+    for path in self._list_files():
+      try:
+        st = path.stat()
+      except OSError:
+        continue
+      entries.append((st.st_mtime_ns, st.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    if total_size <= self.max_size:
+      return
+
+    entries.sort()
+    for _, size, path in entries:
+      if total_size <= self.max_size:
+        break
+      path.unlink(missing_ok=True)
+      total_size -= size
+      self._inc_stats(evictions=1)
+
+  def _inc_stats(self, hits: int = 0, misses: int = 0, evictions: int = 0) -> None:
+    with self._lock:
+      self._stats.hits += hits
+      self._stats.misses += misses
+      self._stats.evictions += evictions
+
+
+def _get_env_fingerprint(environment: jinja2.Environment) -> str:
+  """
+  Returns a hash of Jinja version and environment options which affect compilation of templates
+  """
+  parts = [jinja2.__version__]
+  for opt in _ENV_COMPILE_OPTIONS:
+    value = getattr(environment, opt, None)
+    # Callables (e.g. autoescape functions) are identified by name, because their repr differs between processes
+    if callable(value):
+      value = f"{value.__module__}.{value.__qualname__}"
+    parts.append(f"{opt}={value!r}")
+  parts.extend(sorted(environment.extensions))
+  return hashlib.sha256("\n".join(parts).encode()).hexdigest()
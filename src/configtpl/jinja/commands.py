@@ -0,0 +1,220 @@
+import functools
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+
+from configtpl.manifest import manifest_record_command
+from configtpl.utils.cache import CacheStats, LruCache
+
+if TYPE_CHECKING:
+  from concurrent.futures import Future, ThreadPoolExecutor
+
+  import jinja2
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_CACHE_MAX_ENTRIES = 256
+
+
+class CommandRunner:
+  def __init__(
+    self,
+    *,
+    timeout: float | None = None,
+    ttl: float | None = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    prefetch: bool = False,
+    cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+  ):
+    """
+    Runs system commands for `cmd` function of templates.
+
+    Within a build, each command runs once: all calls of the same command in all files get the same output.
+    Optionally, the outputs are also cached between builds for `ttl` seconds.
+
+    Args:
+        timeout (float | None): a timeout of command in seconds. `subprocess.TimeoutExpired` is raised on timeout
+        ttl (float | None): if specified, outputs are reused by next builds for this number of seconds
+        max_concurrency (int): the maximum number of commands which run at the same time
+        prefetch (bool): if True, the commands with constant arguments found in templates (including
+          the included ones) start in parallel before rendering
+        cache_max_entries (int): the maximum number of outputs kept between builds
+    """
+    self.timeout = timeout
+    self.ttl = ttl
+    self.max_concurrency = max_concurrency
+    self.prefetch = prefetch
+    self._cache = LruCache(cache_max_entries)
+    self._slots = threading.BoundedSemaphore(max_concurrency)
+    self._lock = threading.Lock()
+    self._executor: ThreadPoolExecutor | None = None
+    self._memo: ContextVar[dict[str, Future] | None] = ContextVar(f"configtpl_cmd_memo_{id(self)}", default=None)
+
+  def __reduce__(self) -> tuple:
+    # Only the settings are copied, e.g. into worker processes
+    settings = {
+      "timeout": self.timeout,
+      "ttl": self.ttl,
+      "max_concurrency": self.max_concurrency,
+      "prefetch": self.prefetch,
+      "cache_max_entries": self._cache.max_entries,
+    }
+    return (functools.partial(CommandRunner, **settings), ())
+
+  @property
+  def stats(self) -> CacheStats:
+    """
+    Returns a snapshot of counters of the cache between builds
+    """
+    return self._cache.stats
+
+  @contextmanager
+  def build_scope(self) -> Iterator[None]:
+    """
+    Makes all commands within the scope run once. Nested scopes share the outputs of the outer one.
+    """
+    if self._memo.get() is not None:
+      yield
+      return
+    token = self._memo.set({})
+    try:
+      yield
+    finally:
+      self._memo.reset(token)
+
+  def run(self, cmd: str) -> str:
+    """
+    Returns the output of command. Is used as `cmd` global function of templates.
+
+    Args:
+        cmd (str): a command to execute
+    """
+    output = self._get_future(cmd, background=False).result()
+    manifest_record_command(cmd, output)
+    return output
+
+  async def run_async(self, cmd: str) -> str:
+    """
+    Same as `run`, but doesn't block the event loop: the command runs in a background thread.
+    Is used as `cmd` global function of templates rendered in async mode.
+
+    Args:
+        cmd (str): a command to execute
+    """
+    import asyncio  # noqa: PLC0415 imported on first use
+
+    output = await asyncio.wrap_future(self._get_future(cmd, background=True))
+    manifest_record_command(cmd, output)
+    return output
+
+  def start(self, cmds: Iterable[str]) -> None:
+    """
+    Starts the commands in background threads, so their outputs are ready when templates call them.
+    Has no effect outside of build scope, since the outputs would not be reused.
+    Errors are raised when the command is called by template.
+    """
+    if self._memo.get() is None:
+      return
+    for cmd in cmds:
+      self._get_future(cmd, background=True)
+
+  def clear(self) -> None:
+    """
+    Removes the outputs cached between builds
+    """
+    self._cache.clear()
+
+  def close(self) -> None:
+    """
+    Stops the background threads
+    """
+    with self._lock:
+      executor, self._executor = self._executor, None
+    if executor is not None:
+      executor.shutdown(wait=True)
+
+  def _get_future(self, cmd: str, *, background: bool) -> "Future":
+    from concurrent.futures import Future  # noqa: PLC0415 imported on first use
+
+    memo = self._memo.get()
+    with self._lock:
+      future = None if memo is None else memo.get(cmd)
+      if future is not None:
+        return future
+      future = Future()
+      if memo is not None:
+        memo[cmd] = future
+
+    if self.ttl is not None:
+      cached = self._cache.get(cmd)
+      if cached is not None and cached[0] > time.monotonic():
+        future.set_result(cached[1])
+        return future
+
+    if background:
+      self._get_executor().submit(self._resolve, cmd, future)
+    else:
+      self._resolve(cmd, future)
+    return future
+
+  def _resolve(self, cmd: str, future: "Future") -> None:
+    import subprocess  # noqa: PLC0415 imported on first use
+
+    try:
+      with self._slots:
+        result = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True, timeout=self.timeout)
+    except Exception as e:  # noqa: BLE001 the error is raised from the future
+      future.set_exception(e)
+      return
+    if self.ttl is not None:
+      self._cache.put(cmd, (time.monotonic() + self.ttl, result.stdout))
+    future.set_result(result.stdout)
+
+  def _get_executor(self) -> "ThreadPoolExecutor":
+    from concurrent.futures import ThreadPoolExecutor  # noqa: PLC0415 imported on first use
+
+    with self._lock:
+      if self._executor is None:
+        self._executor = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="configtpl-cmd")
+      return self._executor
+
+
+def commands_find_calls(env: "jinja2.Environment", source: str, name: str = "cmd") -> set[str]:
+  """
+  Returns the constant arguments of calls of a global function in template and in templates it includes or imports.
+  Calls with arguments which are computed during rendering are skipped.
+
+  Args:
+      env (jinja2.Environment): an environment which loads the included templates
+      source (str): the source of template
+      name (str): the name of global function
+  """
+  import jinja2  # noqa: PLC0415 imported on first use
+  from jinja2 import meta, nodes  # noqa: PLC0415
+
+  result = set()
+  visited = set()
+  sources = [source]
+  while sources:
+    ast = env.parse(sources.pop())
+    for call in ast.find_all(nodes.Call):
+      if (
+        isinstance(call.node, nodes.Name)
+        and call.node.name == name
+        and len(call.args) == 1
+        and isinstance(call.args[0], nodes.Const)
+        and isinstance(call.args[0].value, str)
+      ):
+        result.add(call.args[0].value)
+    for tpl_name in meta.find_referenced_templates(ast):
+      if tpl_name is None or tpl_name in visited or env.loader is None:
+        continue
+      visited.add(tpl_name)
+      try:
+        (tpl_source, _, _) = env.loader.get_source(env, tpl_name)
+      except jinja2.TemplateNotFound:
+        continue
+      sources.append(tpl_source)
+  return result
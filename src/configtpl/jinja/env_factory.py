@@ -1,34 +1,74 @@
+import sys
+import threading
 from collections.abc import Callable
-
-import jinja2
+from typing import TYPE_CHECKING
 
 from configtpl.jinja import filters as jinja_filters
 from configtpl.jinja import globals as jinja_globals
-from configtpl.utils.dicts import dict_deep_merge
+from configtpl.jinja.commands import CommandRunner
+from configtpl.jinja.files import FileReader
+from configtpl.stats import BuildHooks, stats_instrument_global
+from configtpl.utils.cache import CacheStats, LruCache
+from configtpl.utils.dicts import dict_deep_merge, dict_register_yaml_representers
+
+if TYPE_CHECKING:
+  import jinja2
+
+DEFAULT_STR_TEMPLATE_CACHE_MAX_ENTRIES = 128
+DEFAULT_STR_TEMPLATE_CACHE_MAX_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_ENVIRONMENTS = 64
+# The default size of template cache of Jinja environment
+DEFAULT_TEMPLATE_CACHE_SIZE = 400
+DEFAULT_TEMPLATE_CACHE_MAX_SIZE = 64 * 1024 * 1024
 
 
 class JinjaEnvFactory:
-  def __init__(self, constructor_args: dict | None = None, globs: dict | None = None, filters: dict | None = None):
+  def __init__(  # noqa: PLR0913 too many arguments
+    self,
+    constructor_args: dict | None = None,
+    globs: dict | None = None,
+    filters: dict | None = None,
+    bytecode_cache: "jinja2.BytecodeCache | None" = None,
+    hooks: BuildHooks | None = None,
+    cmd_runner: CommandRunner | None = None,
+    file_reader: FileReader | None = None,
+    str_template_cache_max_entries: int = DEFAULT_STR_TEMPLATE_CACHE_MAX_ENTRIES,
+    str_template_cache_max_size: int | None = DEFAULT_STR_TEMPLATE_CACHE_MAX_SIZE,
+    max_environments: int = DEFAULT_MAX_ENVIRONMENTS,
+    template_cache_max_size: int | None = DEFAULT_TEMPLATE_CACHE_MAX_SIZE,
+  ):
     """
     A constructor for Jinja Envoronment Factory
 
     Args:
         constructor_args (dict | None): argument for Jinja environment constructor
         globs (dict | None): globals to inject into Jinja environment
+        bytecode_cache (jinja2.BytecodeCache | None): a cache of compiled templates shared by all environments
+        hooks (BuildHooks | None): if specified, the duration of each call of global functions is reported into hooks
+        cmd_runner (CommandRunner | None): runs the commands of `cmd` function. If not specified,
+          each call runs a command
+        file_reader (FileReader | None): reads files for `file` function and computes file digests.
+          If not specified, each call of `file` reads the file and digest functions are not available
+        str_template_cache_max_entries (int): the maximum number of compiled templates from strings to keep
+        str_template_cache_max_size (int | None): the maximum total length of kept template strings in characters.
+          None disables the limit
+        max_environments (int): the maximum number of environments (one per directory and rendering mode) to keep.
+          All environments share one cache of compiled templates which size is limited by "cache_size"
+          argument of Jinja environment constructor (400 by default)
+        template_cache_max_size (int | None): the maximum total length of sources of templates
+          in the shared cache in characters. None disables the limit
     """
-    self._constructor_args = dict_deep_merge(
-      {
-        "undefined": jinja2.StrictUndefined,
-      },
-      {} if constructor_args is None else constructor_args,
-    )
+    # The defaults of `DEFAULT_CONSTRUCTOR_ARGS` are added when environments are created, so Jinja isn't imported
+    # until the first template is rendered
+    self._constructor_args = dict_deep_merge({}, {} if constructor_args is None else constructor_args)
     self._globals = dict_deep_merge(
       {
-        "cmd": jinja_globals.jinja_global_cmd,
+        "cmd": jinja_globals.jinja_global_cmd if cmd_runner is None else cmd_runner.run,
         "cwd": jinja_globals.jinja_global_cwd,
         "env": jinja_globals.jinja_global_env,
-        "file": jinja_globals.jinja_global_file,
+        "file": jinja_globals.jinja_global_file if file_reader is None else file_reader.read,
         "uuid": jinja_globals.jinja_global_uuid,
+        **_get_file_digest_functions(file_reader),
       },
       {} if globs is None else globs,
     )
@@ -40,36 +80,184 @@ class JinjaEnvFactory:
         "split_space": jinja_filters.jinja_filter_split_space,
         "sha256": jinja_filters.jinja_filter_sha256,
         "sha512": jinja_filters.jinja_filter_sha512,
+        **_get_file_digest_functions(file_reader),
       },
       {} if filters is None else filters,
     )
 
-    self._fs_loader_cache = {}
+    if bytecode_cache is not None:
+      self._constructor_args["bytecode_cache"] = bytecode_cache
+
+    # Async versions of default globals, which replace them in environments with async rendering
+    self._async_globals = [
+      (jinja_globals.jinja_global_file, jinja_globals.jinja_global_file_async)
+      if file_reader is None
+      else (file_reader.read, file_reader.read_async),
+      (
+        jinja_globals.jinja_global_cmd,
+        jinja_globals.jinja_global_cmd_async,
+      )
+      if cmd_runner is None
+      else (cmd_runner.run, cmd_runner.run_async),
+    ]
+
+    self._hooks = hooks
+    self._lock = threading.Lock()
+    # Is incremented when globals or filters change, so the environments are updated before next use.
+    # New environments have version 0, so they are updated before the first use
+    self._version = 1
+    # The templates compiled from strings by an evicted environment are removed too, so they don't keep it alive
+    self._environments = LruCache(max_environments, on_evict=self._on_environment_evicted)
+    # Keys of entries contain the loader of environment, so templates of different environments don't collide.
+    # It's created with the first environment
+    self._template_cache = None
+    self._template_cache_max_size = template_cache_max_size
+    # Entry sizes are the lengths of template strings
+    self._str_templates = LruCache(str_template_cache_max_entries, max_size=str_template_cache_max_size)
 
   def set_global(self, k: str, v: Callable) -> None:
     """
-    Sets a global for children Jinja environments
+    Sets a global for children Jinja environments, including the already created ones
     """
-    self._globals[k] = v
+    with self._lock:
+      self._globals[k] = v
+      self._version += 1
 
   def set_filter(self, k: str, v: Callable) -> None:
     """
-    Sets a filter for children Jinja environments
+    Sets a filter for children Jinja environments, including the already created ones
+    """
+    with self._lock:
+      self._filters[k] = v
+      self._version += 1
+
+  def get_fingerprint(self) -> str:
+    """
+    Returns a string which identifies the configuration of factory: constructor args, globals and filters.
+    Callables are identified by their qualified names, lambdas and closures by their identity too.
+    """
+    parts = [f"args.{k}={_describe(v)}" for k, v in self._constructor_args.items() if k != "bytecode_cache"]
+    parts.extend(f"global.{k}={_describe(v)}" for k, v in self._globals.items())
+    parts.extend(f"filter.{k}={_describe(v)}" for k, v in self._filters.items())
+    return "\n".join(sorted(parts))
+
+  def get_fs_jinja_environment(self, d: str, *, is_async: bool = False) -> "jinja2.Environment":
+    """
+    Returns an instance of Jinja environment with filesystem loader for provided directory.
+    If `is_async` is True, the environment renders templates in async mode and uses async versions
+    of `cmd` and `file` globals, unless they are overridden.
+    Environments are reused and might be used by concurrent builds.
+    """
+    key = (str(d), is_async)
+    with self._lock:
+      jinja_env = self._environments.get(key)
+      if jinja_env is None:
+        jinja_env = self._create_environment(d, is_async=is_async)
+        self._environments.put(key, jinja_env)
+      if jinja_env.factory_version != self._version:
+        # Globals and filters are updated in place, so the compiled templates see them too
+        jinja_env.globals.update(self._get_globals(is_async=is_async))
+        jinja_env.filters.update(self._filters)
+        jinja_env.factory_version = self._version
+      return jinja_env
+
+  @property
+  def environment_stats(self) -> CacheStats:
+    """
+    Returns a snapshot of counters of the cache of environments
+    """
+    return self._environments.stats
+
+  def get_str_template(self, s: str, d: str, *, is_async: bool = False) -> "jinja2.Template":
+    """
+    Returns a template compiled from string by environment of `get_fs_jinja_environment`.
+    Compiled templates are cached, so the same string is parsed and compiled once.
+    """
+    # The environment is taken on each call, so the changes of globals and filters are applied to it
+    jinja_env = self.get_fs_jinja_environment(d, is_async=is_async)
+    # The string itself is a part of key: its hash is computed once and kept by string object,
+    # so lookups are cheaper than hashing the contents, and there are no collisions
+    key = (s, str(d), is_async)
+    tpl = self._str_templates.get(key)
+    if tpl is None or tpl.environment is not jinja_env:
+      tpl = jinja_env.from_string(s)
+      self._str_templates.put(key, tpl, size=len(s))
+    return tpl
+
+  @property
+  def template_stats(self) -> CacheStats | None:
+    """
+    Returns a snapshot of counters of the cache of compiled templates shared by environments.
+    None if no environment is created yet, or the cache is disabled by "cache_size" argument of Jinja environment
+    """
+    return None if self._template_cache is None else self._template_cache.stats
+
+  @property
+  def str_template_stats(self) -> CacheStats:
+    """
+    Returns a snapshot of counters of the cache of templates compiled from strings
     """
-    self._filters[k] = v
+    return self._str_templates.stats
 
-  def get_fs_jinja_environment(self, d: str) -> jinja2.Environment:
+  def clear_str_templates(self) -> None:
     """
-    Creates an instance of Jinja environment with filesystem loaded for provided directory
+    Removes the cached templates compiled from strings
     """
-    if d in self._fs_loader_cache:
-      return self._fs_loader_cache[d]
+    self._str_templates.clear()
 
-    # S701: autoescape is up to user
-    jinja_env = jinja2.Environment(**self._constructor_args, loader=jinja2.FileSystemLoader(d))  # noqa: S701
-    jinja_env.globals.update(self._globals)
-    jinja_env.filters.update(self._filters)
+  def _on_environment_evicted(self, key: tuple[str, bool], jinja_env: "jinja2.Environment") -> None:
+    self._str_templates.remove_if(lambda k, _: k[1:] == key)
+    if self._template_cache is not None:
+      self._template_cache.remove_loader(jinja_env.loader)
 
-    self._fs_loader_cache[d] = jinja_env
+  def _create_environment(self, d: str, *, is_async: bool) -> "jinja2.Environment":
+    from configtpl.jinja.environment import (  # noqa: PLC0415 imported on first use
+      DEFAULT_CONSTRUCTOR_ARGS,
+      TemplateCache,
+      TrackingEnvironment,
+      TrackingFileSystemLoader,
+    )
 
+    # Templates receive the read-only configuration, so filters like `yaml.safe_dump` must be able to dump it
+    dict_register_yaml_representers()
+    constructor_args = {**DEFAULT_CONSTRUCTOR_ARGS, **self._constructor_args}
+    if is_async:
+      constructor_args["enable_async"] = True
+    jinja_env = TrackingEnvironment(**constructor_args, loader=TrackingFileSystemLoader(d))
+    if jinja_env.cache is not None:
+      if self._template_cache is None:
+        # A negative size means an unlimited number of templates, like in Jinja
+        cache_size = self._constructor_args.get("cache_size", DEFAULT_TEMPLATE_CACHE_SIZE)
+        max_entries = sys.maxsize if cache_size < 0 else cache_size
+        self._template_cache = TemplateCache(max_entries, self._template_cache_max_size)
+      jinja_env.cache = self._template_cache
     return jinja_env
+
+  def _get_globals(self, *, is_async: bool) -> dict:
+    globs = self._globals
+    if is_async:
+      globs = {k: next((a for s, a in self._async_globals if s == v), v) for k, v in globs.items()}
+    if self._hooks is None:
+      return globs
+    return {k: stats_instrument_global(k, v, self._hooks) if callable(v) else v for k, v in globs.items()}
+
+
+def _get_file_digest_functions(file_reader: FileReader | None) -> dict[str, Callable]:
+  if file_reader is None:
+    return {}
+  return {
+    "file_md5": file_reader.file_md5,
+    "file_sha256": file_reader.file_sha256,
+    "file_sha512": file_reader.file_sha512,
+  }
+
+
+def _describe(v: object) -> str:
+  if callable(v) and hasattr(v, "__qualname__"):
+    name = f"{v.__module__}.{v.__qualname__}"
+    # Lambdas and closures share their qualified names, so they are told apart by identity.
+    # Such fingerprints differ between processes, so the results built with them are not reused by other processes
+    if "<" in v.__qualname__ or getattr(v, "__closure__", None):
+      name = f"{name}@{id(v):x}"
+    return name
+  return repr(v)
@@ -0,0 +1,96 @@
+from collections.abc import Callable
+
+import jinja2
+
+from configtpl.manifest import manifest_record_template
+from configtpl.utils.cache import CacheStats, LruCache
+from configtpl.utils.fs import fs_hash_text
+
+# Arguments of environment constructor which are used unless `JinjaEnvFactory` overrides them
+DEFAULT_CONSTRUCTOR_ARGS = {
+  "undefined": jinja2.StrictUndefined,
+}
+
+
+class TrackingFileSystemLoader(jinja2.FileSystemLoader):
+  """
+  A filesystem loader which remembers the digests and lengths of loaded template sources
+  """
+
+  def __init__(self, searchpath: str) -> None:
+    super().__init__(searchpath)
+    self.digests: dict[str, str] = {}
+    self.sizes: dict[str, int] = {}
+
+  def get_source(self, environment: jinja2.Environment, template: str) -> tuple[str, str, Callable[[], bool]]:
+    contents, filename, uptodate = super().get_source(environment, template)
+    self.digests[filename] = fs_hash_text(contents)
+    self.sizes[filename] = len(contents)
+    return contents, filename, uptodate
+
+
+class TemplateCache:
+  def __init__(self, max_entries: int, max_size: int | None = None):
+    """
+    A cache of compiled templates which is shared by Jinja environments, see `jinja2.Environment.cache`.
+    Besides the number of templates, it limits the total length of their sources,
+    so directories with large templates don't keep unbounded amounts of compiled code.
+
+    Args:
+        max_entries (int): the maximum number of templates to keep
+        max_size (int | None): the maximum total length of sources of kept templates in characters
+    """
+    self._cache = LruCache(max_entries, max_size=max_size)
+
+  @property
+  def stats(self) -> CacheStats:
+    return self._cache.stats
+
+  @property
+  def size(self) -> int:
+    return self._cache.size
+
+  @property
+  def capacity(self) -> int:
+    # Is read by Jinja when an overlay of environment creates its own cache
+    return self._cache.max_entries
+
+  def get(self, key: tuple, default: object = None) -> object:
+    return self._cache.get(key, default)
+
+  def __setitem__(self, key: tuple, tpl: jinja2.Template) -> None:
+    # The first item of key is a weak reference to the loader of environment
+    loader = key[0]()
+    sizes = getattr(loader, "sizes", {})
+    self._cache.put(key, tpl, size=sizes.get(tpl.filename, 0))
+
+  def remove_loader(self, loader: jinja2.BaseLoader) -> None:
+    """
+    Removes the templates loaded by the loader, e.g. of an evicted environment
+    """
+    self._cache.remove_if(lambda k, _: k[0]() is loader)
+
+  def clear(self) -> None:
+    self._cache.clear()
+
+  def __len__(self) -> int:
+    return len(self._cache)
+
+
+class TrackingEnvironment(jinja2.Environment):
+  """
+  A Jinja environment which records each used template into the active build manifests.
+  Templates are recorded on every use, including the ones taken from the environment cache.
+
+  Attributes:
+      factory_version (int): a version of globals and filters of `JinjaEnvFactory` which the environment has
+  """
+
+  factory_version = 0
+
+  def _load_template(self, name: str, globals: dict | None) -> jinja2.Template:  # noqa: A002 same as in parent
+    tpl = super()._load_template(name, globals)
+    digest = self.loader.digests.get(tpl.filename)
+    if digest is not None:
+      manifest_record_template(tpl.filename, digest)
+    return tpl
@@ -0,0 +1,176 @@
+import functools
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from configtpl.manifest import manifest_is_recording, manifest_record_file
+from configtpl.utils.cache import CacheStats, LruCache
+from configtpl.utils.fs import fs_digest_file, fs_hash_file, fs_hash_text, fs_read_text
+
+DEFAULT_CACHE_MAX_ENTRIES = 256
+DEFAULT_CACHE_MAX_FILE_SIZE = 16 * 1024 * 1024
+DEFAULT_CACHE_MAX_TOTAL_SIZE = 64 * 1024 * 1024
+DEFAULT_MMAP_THRESHOLD = 1024 * 1024
+
+ERR_FILE_TOO_LARGE = "File '{path}' is too large: {size} bytes, the limit is {max_size} bytes"
+
+# The algorithm of digests recorded into build manifests, see `fs_hash_file`
+_MANIFEST_DIGEST = "manifest"
+
+
+@dataclass
+class _CachedFile:
+  """
+  Args:
+      contents (str): text of file
+      digest (str | None): a digest of text for build manifests. It's computed on first use
+  """
+
+  contents: str
+  digest: str | None = None
+
+
+class FileReader:
+  def __init__(
+    self,
+    *,
+    max_size: int | None = None,
+    cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    cache_max_file_size: int = DEFAULT_CACHE_MAX_FILE_SIZE,
+    cache_max_total_size: int | None = DEFAULT_CACHE_MAX_TOTAL_SIZE,
+    mmap_threshold: int | None = DEFAULT_MMAP_THRESHOLD,
+  ):
+    """
+    Reads and hashes files for `file` and `file_<algorithm>` global functions of templates.
+
+    Contents and digests are cached between builds. A cache entry is identified by real path, modification time
+    and size of file, so a modified file is read again. Large files are read through memory mapping
+    and hashed in a streaming fashion, so they are never loaded into a template string to compute a digest.
+
+    Args:
+        max_size (int | None): the maximum size of file which might be read by `file` in bytes.
+          ValueError is raised for larger files. Digests are computed for files of any size
+        cache_max_entries (int): the maximum number of file contents and of digests kept between builds
+        cache_max_file_size (int): files larger than this number of bytes are read on each call
+        cache_max_total_size (int | None): the maximum total size of cached file contents in bytes.
+          The least recently used contents are evicted to stay within it. None disables the limit
+        mmap_threshold (int | None): files of this size in bytes or larger are memory-mapped.
+          None disables memory mapping
+    """
+    self.max_size = max_size
+    self.cache_max_file_size = cache_max_file_size
+    self.mmap_threshold = mmap_threshold
+    # Entry sizes are the sizes of files
+    self._contents = LruCache(cache_max_entries, max_size=cache_max_total_size)
+    self._digests = LruCache(cache_max_entries)
+
+  def __reduce__(self) -> tuple:
+    # Only the settings are copied, e.g. into worker processes
+    settings = {
+      "max_size": self.max_size,
+      "cache_max_entries": self._contents.max_entries,
+      "cache_max_file_size": self.cache_max_file_size,
+      "cache_max_total_size": self._contents.max_size,
+      "mmap_threshold": self.mmap_threshold,
+    }
+    return (functools.partial(FileReader, **settings), ())
+
+  @property
+  def stats(self) -> CacheStats:
+    """
+    Returns a snapshot of counters of the cache of file contents
+    """
+    return self._contents.stats
+
+  @property
+  def digest_stats(self) -> CacheStats:
+    """
+    Returns a snapshot of counters of the cache of file digests
+    """
+    return self._digests.stats
+
+  def read(self, path: str) -> str:
+    """
+    Returns contents of file. Is used as `file` global function of templates.
+
+    Args:
+        path (str): path to file
+    """
+    real_path = os.path.realpath(path)
+    stat = Path(real_path).stat()
+    if self.max_size is not None and stat.st_size > self.max_size:
+      raise ValueError(ERR_FILE_TOO_LARGE.format(path=path, size=stat.st_size, max_size=self.max_size))
+
+    key = (real_path, stat.st_mtime_ns, stat.st_size)
+    cached = self._contents.get(key)
+    if cached is None:
+      cached = _CachedFile(fs_read_text(real_path, self.mmap_threshold))
+      if stat.st_size <= self.cache_max_file_size:
+        self._contents.put(key, cached, size=stat.st_size)
+    if manifest_is_recording():
+      if cached.digest is None:
+        cached.digest = fs_hash_text(cached.contents)
+      manifest_record_file(real_path, cached.contents, cached.digest)
+    return cached.contents
+
+  async def read_async(self, path: str) -> str:
+    """
+    Same as `read`, but reads the file in a worker thread. Is used by templates rendered in async mode.
+
+    Args:
+        path (str): path to file
+    """
+    import asyncio  # noqa: PLC0415 imported on first use
+
+    return await asyncio.to_thread(self.read, path)
+
+  def digest(self, path: str, algorithm: str = "sha256") -> str:
+    """
+    Returns a hex digest of file bytes
+
+    Args:
+        path (str): path to file
+        algorithm (str): a name of `hashlib` algorithm, e.g. "sha256"
+    """
+    real_path = os.path.realpath(path)
+    result = self._get_digest(real_path, algorithm)
+    if manifest_is_recording():
+      manifest_record_file(real_path, None, self._get_digest(real_path, _MANIFEST_DIGEST))
+    return result
+
+  def file_md5(self, path: str) -> str:
+    """
+    Returns MD5 digest of file. Is used as `file_md5` global function and filter of templates.
+    """
+    return self.digest(path, "md5")
+
+  def file_sha256(self, path: str) -> str:
+    """
+    Returns SHA-256 digest of file. Is used as `file_sha256` global function and filter of templates.
+    """
+    return self.digest(path, "sha256")
+
+  def file_sha512(self, path: str) -> str:
+    """
+    Returns SHA-512 digest of file. Is used as `file_sha512` global function and filter of templates.
+    """
+    return self.digest(path, "sha512")
+
+  def clear(self) -> None:
+    """
+    Removes the cached contents and digests
+    """
+    self._contents.clear()
+    self._digests.clear()
+
+  def _get_digest(self, real_path: str, algorithm: str) -> str | None:
+    stat = Path(real_path).stat()
+    key = (real_path, stat.st_mtime_ns, stat.st_size, algorithm)
+    digest = self._digests.get(key)
+    if digest is None:
+      if algorithm == _MANIFEST_DIGEST:
+        digest = fs_hash_file(real_path)
+      else:
+        digest = fs_digest_file(real_path, algorithm, self.mmap_threshold)
+      self._digests.put(key, digest)
+    return digest
@@ -1,4 +1,3 @@
-import base64
 import hashlib
 
 
@@ -20,8 +19,12 @@ def jinja_filter_sha512(input_string: str) -> str:
 
 
 def jinja_filter_base64(input_string: str) -> str:
+  import base64  # noqa: PLC0415 imported on first use
+
   return base64.b64encode(input_string.encode()).decode()
 
 
 def jinja_filter_base64_decode(encoded_string: str) -> str:
+  import base64  # noqa: PLC0415 imported on first use
+
   return base64.b64decode(encoded_string.encode()).decode()
@@ -1,8 +1,13 @@
 import os
-import subprocess
-import uuid
 from pathlib import Path
 
+from configtpl.manifest import (
+  manifest_record_command,
+  manifest_record_env_var,
+  manifest_record_file,
+  manifest_record_nondeterministic,
+)
+
 ERR_NO_VAL_PROVIDED = "An environment variable '{name}' is not set and no default value is provided."
 
 
@@ -13,10 +18,33 @@ def jinja_global_cmd(cmd: str) -> str:
   Args:
       cmd (str): a command to execute
   """
+  import subprocess  # noqa: PLC0415 imported on first use
+
   result = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
+  manifest_record_command(cmd, result.stdout)
   return result.stdout
 
 
+async def jinja_global_cmd_async(cmd: str) -> str:
+  """
+  Same as `jinja_global_cmd`, but doesn't block the event loop while the command runs.
+  Is used by templates rendered in async mode.
+
+  Args:
+      cmd (str): a command to execute
+  """
+  import asyncio  # noqa: PLC0415 imported on first use
+  import subprocess  # noqa: PLC0415
+
+  proc = await asyncio.create_subprocess_shell(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+  stdout, stderr = await proc.communicate()
+  if proc.returncode != 0:
+    raise subprocess.CalledProcessError(proc.returncode, cmd, stdout.decode(), stderr.decode())
+  output = stdout.decode()
+  manifest_record_command(cmd, output)
+  return output
+
+
 def jinja_global_cwd() -> str:
   """
   Returns the current working directory
@@ -33,6 +61,7 @@ def jinja_global_env(name: str, default: str | None = "") -> str | None:
       default (str | None): a default value to return
   """
   v = os.getenv(name, default)
+  manifest_record_env_var(name, os.environ.get(name))
   if v is None:
     raise ValueError(ERR_NO_VAL_PROVIDED.format(name=name))
   return v
@@ -46,11 +75,29 @@ def jinja_global_file(path: str) -> str:
       path (str): path to file
   """
   with Path.open(path) as f:
-    return f.read()
+    contents = f.read()
+  manifest_record_file(str(Path(path).resolve()), contents)
+  return contents
+
+
+async def jinja_global_file_async(path: str) -> str:
+  """
+  Same as `jinja_global_file`, but reads the file in a worker thread.
+  Is used by templates rendered in async mode.
+
+  Args:
+      path (str): path to file
+  """
+  import asyncio  # noqa: PLC0415 imported on first use
+
+  return await asyncio.to_thread(jinja_global_file, path)
 
 
 def jinja_global_uuid() -> str:
   """
   Generates UUID
   """
+  import uuid  # noqa: PLC0415 imported on first use
+
+  manifest_record_nondeterministic("uuid")
   return str(uuid.uuid4())
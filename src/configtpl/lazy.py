@@ -0,0 +1,108 @@
+from collections.abc import Iterator, Mapping
+
+from configtpl.utils.dicts import (
+  ERR_UNKNOWN_LIST_STRATEGY,
+  LIST_STRATEGIES,
+  LIST_STRATEGY_REPLACE,
+  LIST_STRATEGY_UNIQUE,
+  dict_deep_merge,
+  dict_freeze,
+  dict_thaw,
+)
+
+
+class LazyConfig(Mapping):
+  __slots__ = ("_keys", "_layers", "_list_strategy", "_values")
+
+  def __init__(self, layers: list[dict], list_strategy: str = LIST_STRATEGY_REPLACE):
+    """
+    A read-only configuration which merges its layers on access.
+    A value is merged from layers when its key is accessed for the first time and then reused.
+    Nested sections are lazy configurations too, so only the accessed subtrees are merged.
+    The result of merging is the same as of `dict_deep_merge`.
+
+    The configuration is safe to share between threads: concurrent first accesses of a key might merge
+    the value twice, but the results are equal.
+
+    Args:
+        layers (list[dict]): read-only dictionaries to merge, see `dict_freeze`. Later layers override earlier ones
+        list_strategy (str): how the lists under the same key are merged, see `dict_deep_merge`
+    """
+    if list_strategy not in LIST_STRATEGIES:
+      raise ValueError(ERR_UNKNOWN_LIST_STRATEGY.format(strategy=list_strategy, strategies=", ".join(LIST_STRATEGIES)))
+    self._layers = layers
+    self._list_strategy = list_strategy
+    self._keys: tuple | None = None
+    self._values: dict = {}
+
+  def __getitem__(self, key: object) -> object:
+    try:
+      return self._values[key]
+    except KeyError:
+      pass
+    value = self._merge(key)
+    self._values[key] = value
+    return value
+
+  def __iter__(self) -> Iterator:
+    return iter(self._get_keys())
+
+  def __len__(self) -> int:
+    return len(self._get_keys())
+
+  def __contains__(self, key: object) -> bool:
+    return key in self._values or any(key in layer for layer in self._layers)
+
+  def __repr__(self) -> str:
+    return f"LazyConfig({self.to_dict()!r})"
+
+  def __reduce__(self) -> tuple:
+    return (LazyConfig, (self._layers, self._list_strategy))
+
+  @property
+  def layers(self) -> tuple[dict, ...]:
+    """
+    Returns the layers which are merged, in order
+    """
+    return tuple(self._layers)
+
+  def to_dict(self) -> dict:
+    """
+    Returns the whole configuration as a new regular dictionary
+    """
+    return dict_thaw(dict_deep_merge(*self._layers, list_strategy=self._list_strategy))
+
+  def _get_keys(self) -> tuple:
+    if self._keys is None:
+      self._keys = tuple(dict.fromkeys(k for layer in self._layers for k in layer))
+    return self._keys
+
+  def _merge(self, key: object) -> object:
+    """
+    Merges the value of key from all layers in the same way as `dict_deep_merge`
+    """
+    merge_lists = self._list_strategy != LIST_STRATEGY_REPLACE
+    # The trailing values which are merged together: a sequence of dictionaries (or lists, if they are not replaced).
+    # Any other value discards all previous ones
+    run = []
+    for layer in self._layers:
+      if key not in layer:
+        continue
+      value = layer[key]
+      if run and (
+        (isinstance(value, dict) and isinstance(run[-1], dict))
+        or (merge_lists and isinstance(value, list) and isinstance(run[-1], list))
+      ):
+        run.append(value)
+      else:
+        run = [value]
+    if not run:
+      raise KeyError(key)
+
+    if isinstance(run[0], dict):
+      return LazyConfig(run, self._list_strategy)
+    # A single list is merged too with "unique" strategy, so its duplicates are removed
+    if len(run) == 1 and not (self._list_strategy == LIST_STRATEGY_UNIQUE and isinstance(run[0], list)):
+      return dict_freeze(run[0])
+    # The lists are merged by the same rules as in `dict_deep_merge`
+    return dict_deep_merge(*({key: value} for value in run), list_strategy=self._list_strategy, frozen=True)[key]
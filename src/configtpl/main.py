@@ -1,19 +1,77 @@
+import contextlib
+import contextvars
 import os
 import os.path
-from collections.abc import Callable
-from copy import deepcopy
+import pickle
+import threading
+import time
+import weakref
+from collections.abc import Awaitable, Callable, Iterable, Iterator
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import yaml
-from jinja2 import Template
+from .batch import (
+  ERR_INVALID_JOB,
+  ERR_UNKNOWN_EXECUTOR,
+  ERR_UNPICKLABLE_BUILDER,
+  EXECUTOR_THREAD,
+  EXECUTORS,
+  BatchJob,
+  BatchResult,
+)
+from .directives import LayerQueue, directives_pop
+from .env import EnvSnapshot
+from .frozen import FrozenConfig
+from .jinja.analysis import ReadVarsCache, analysis_get_inputs
+from .jinja.commands import CommandRunner, commands_find_calls
+from .jinja.env_factory import (
+  DEFAULT_STR_TEMPLATE_CACHE_MAX_ENTRIES,
+  DEFAULT_STR_TEMPLATE_CACHE_MAX_SIZE,
+  JinjaEnvFactory,
+)
+from .jinja.files import FileReader
+from .lazy import LazyConfig
+from .manifest import BuildManifest, manifest_record_manifest, manifest_record_parser, manifest_scope
+from .parsers import ERR_STREAM_PARSER_REQUIRED, Parser, StreamParser, YamlParser
+from .result_cache import ResultCache
+from .schema import Schema
+from .stats import (
+  STAGE_COMPILE,
+  STAGE_ENV,
+  STAGE_MERGE,
+  STAGE_PARSE,
+  STAGE_RENDER,
+  STAGE_VALIDATE,
+  BuildHooks,
+  RecordedHooks,
+)
+from .utils.dicts import (
+  LIST_STRATEGY_REPLACE,
+  dict_deep_merge,
+  dict_freeze,
+  dict_init_dicts_from_list,
+  dict_thaw,
+)
+from .utils.fs import fs_hash_file
+from .utils.streams import ChunkReader
 
-from .env import get_config_from_env
-from .jinja.env_factory import JinjaEnvFactory
-from .utils.dicts import dict_deep_merge, dict_init_dicts_from_list
+if TYPE_CHECKING:
+  from concurrent.futures import Executor, Future, ProcessPoolExecutor
+
+  from jinja2 import BytecodeCache, Template
+
+# A name of template rendered from string, as it's reported in build manifest
+STR_TEMPLATE_NAME = "<string>"
+
+# Keeps the measurements of speculative rendering, see `ConfigTpl._render_speculative`
+_speculative_hooks: contextvars.ContextVar[RecordedHooks | None] = contextvars.ContextVar(
+  "configtpl_speculative_hooks",
+  default=None,
+)
 
 
 class ConfigTpl:
-  def __init__(
+  def __init__(  # noqa: PLR0913 too many arguments
     self,
     *,
     defaults: dict | None = None,
@@ -21,6 +79,20 @@ class ConfigTpl:
     jinja_constructor_args: dict | None = None,
     jinja_filters: dict | None = None,
     jinja_globals: dict | None = None,
+    jinja_bytecode_cache: "BytecodeCache | None" = None,
+    result_cache: ResultCache | None = None,
+    merge_list_strategy: str = LIST_STRATEGY_REPLACE,
+    parser: Parser | None = None,
+    parsers_by_extension: dict[str, Parser] | None = None,
+    hooks: BuildHooks | None = None,
+    cmd_runner: CommandRunner | None = None,
+    layer_workers: int = 1,
+    env_snapshot: EnvSnapshot | None = None,
+    schema: Schema | object | None = None,
+    file_reader: FileReader | None = None,
+    str_template_cache_max_entries: int = DEFAULT_STR_TEMPLATE_CACHE_MAX_ENTRIES,
+    str_template_cache_max_size: int | None = DEFAULT_STR_TEMPLATE_CACHE_MAX_SIZE,
+    stream_render: bool = False,
   ):
     """
     A constructor for Config Builder.
@@ -32,28 +104,116 @@ class ConfigTpl:
         jinja_constructor_args (dict | None): argument for Jinja environment constructor
         jinja_globals (dict | None): globals for Jinja environment constructor
         jinja_filters (dict | None): filters for Jinja environment constructor
+        jinja_bytecode_cache (BytecodeCache | None): a persistent cache of compiled templates,
+          e.g. `configtpl.jinja.bytecode_cache.JinjaBytecodeCache`
+        result_cache (ResultCache | None): if specified, the built configurations are cached
+          and served again while their inputs are unchanged
+        merge_list_strategy (str): how lists from different files and overrides are merged:
+          "replace" (default), "append" or "unique". See `dict_deep_merge`
+        parser (Parser | None): a parser of rendered templates. YAML parser is used by default
+        parsers_by_extension (dict[str, Parser] | None): parsers for files with specific extensions,
+          e.g. {".json": JsonParser()}. Other files are parsed with `parser`
+        hooks (BuildHooks | None): receives durations of build stages and calls of global functions,
+          e.g. `configtpl.stats.BuildStats`. Nothing is measured if hooks are not specified
+        cmd_runner (CommandRunner | None): runs the commands of `cmd` function with timeout, caching and prefetching.
+          By default, each command runs once per build, without timeout
+        layer_workers (int): if greater than 1, files are rendered in parallel by this number of worker processes.
+          The result is the same as with sequential rendering, see `_load_layers`. The processes are started
+          on first use and kept until `close` is called or the builder is garbage-collected
+        env_snapshot (EnvSnapshot | None): a source of environment variables which are injected into configuration
+          because of `env_var_prefix`. By default, `os.environ` is read and parsed variables are reused between builds
+        schema (Schema | object | None): a schema of configuration or its specification, see `Schema`.
+          If specified, environment variables are converted into the types of their keys,
+          and the built configurations are validated against it
+        file_reader (FileReader | None): reads files for `file` function and computes digests for `file_sha256`
+          and similar functions. By default, contents and digests are cached while files are unchanged
+        str_template_cache_max_entries (int): the maximum number of compiled templates of `build_from_str` to keep.
+          See `JinjaEnvFactory.str_template_stats` for statistics of this cache
+        str_template_cache_max_size (int | None): the maximum total length of kept templates of `build_from_str`
+          in characters. None disables the limit
+        stream_render (bool): if True, templates are rendered in chunks which are parsed as they are produced,
+          so the whole rendered text is never kept in memory. It applies to the parsers which support streams
+          (see `StreamParser`, e.g. the YAML parser) and to synchronous builds. Rendering and parsing are interleaved,
+          so their total duration is reported into hooks as render stage
     """
+    self.schema = schema if schema is None or isinstance(schema, Schema) else Schema(schema)
+    self.env_snapshot = EnvSnapshot() if env_snapshot is None else env_snapshot
+    self.cmd_runner = CommandRunner() if cmd_runner is None else cmd_runner
+    self.file_reader = FileReader() if file_reader is None else file_reader
     self.jinja_env_factory: JinjaEnvFactory = JinjaEnvFactory(
       constructor_args=jinja_constructor_args,
       globs=jinja_globals,
       filters=jinja_filters,
+      bytecode_cache=jinja_bytecode_cache,
+      hooks=hooks,
+      cmd_runner=self.cmd_runner,
+      file_reader=self.file_reader,
+      str_template_cache_max_entries=str_template_cache_max_entries,
+      str_template_cache_max_size=str_template_cache_max_size,
     )
     if defaults is None:
       defaults = {}
     self.defaults = defaults
     self.env_var_prefix = env_var_prefix
+    self.result_cache = result_cache
+    self.hooks = hooks
+    self.merge_list_strategy = merge_list_strategy
+    self.layer_workers = layer_workers
+    self.stream_render = stream_render
+    self._read_vars_cache = ReadVarsCache()
+    # Worker processes of `layer_workers`, see `_get_layer_pool`
+    self._layer_pool: ProcessPoolExecutor | None = None
+    self._layer_pool_finalizer: weakref.finalize | None = None
+    self._layer_pool_lock = threading.Lock()
+    self.parser = YamlParser() if parser is None else parser
+    self.parsers_by_extension = {} if parsers_by_extension is None else dict(parsers_by_extension)
+    # Arguments which recreate this builder in worker processes of `build_batch` and `layer_workers`
+    self._worker_spec = {
+      "defaults": defaults,
+      "env_var_prefix": env_var_prefix,
+      "jinja_constructor_args": jinja_constructor_args,
+      "jinja_filters": {} if jinja_filters is None else dict(jinja_filters),
+      "jinja_globals": {} if jinja_globals is None else dict(jinja_globals),
+      "jinja_bytecode_cache": jinja_bytecode_cache,
+      "merge_list_strategy": merge_list_strategy,
+      "parser": self.parser,
+      "parsers_by_extension": parsers_by_extension,
+      "cmd_runner": self.cmd_runner,
+      "file_reader": self.file_reader,
+      "str_template_cache_max_entries": str_template_cache_max_entries,
+      "str_template_cache_max_size": str_template_cache_max_size,
+      "layer_workers": layer_workers,
+      "env_snapshot": self.env_snapshot,
+      "schema": self.schema,
+      "stream_render": stream_render,
+    }
 
   def set_global(self, k: str, v: Callable) -> None:
     """
     Sets a global for children Jinja environments
     """
     self.jinja_env_factory.set_global(k, v)
+    self._worker_spec["jinja_globals"][k] = v
+    self.close()
 
   def set_filter(self, k: str, v: Callable) -> None:
     """
     Sets a filter for children Jinja environments
     """
     self.jinja_env_factory.set_filter(k, v)
+    self._worker_spec["jinja_filters"][k] = v
+    self.close()
+
+  def close(self) -> None:
+    """
+    Stops the worker processes which render files in parallel (see `layer_workers`), if they are started.
+    They are started again by the next build which needs them
+    """
+    with self._layer_pool_lock:
+      if self._layer_pool_finalizer is not None:
+        self._layer_pool_finalizer()
+      self._layer_pool = None
+      self._layer_pool_finalizer = None
 
   def build_from_files(
     self,
@@ -72,16 +232,146 @@ class ConfigTpl:
     Returns:
         dict: The rendered configuration
     """
-    (defaults, ctx, overrides) = dict_init_dicts_from_list(self.defaults, ctx, overrides)
+    return self._build_cached(
+      lambda: self._build_from_files(paths, overrides, ctx),
+      lambda: ("files", [(p, fs_hash_file(p)) for p in map(os.path.realpath, paths)], overrides, ctx),
+    )
+
+  def build_batch(
+    self,
+    jobs: Iterable[BatchJob],
+    *,
+    executor: str = EXECUTOR_THREAD,
+    max_workers: int | None = None,
+  ) -> Iterator[BatchResult]:
+    """
+    Builds many configurations in parallel, e.g. the same files with different context for many tenants.
+    Arguments are validated and the jobs are submitted when this method is called, like in `Executor.map`.
+    Results are yielded as soon as they are built, so their order differs from the order of jobs.
+    A failure of a job doesn't affect other jobs: the error is returned in the result.
+
+    Args:
+        jobs (Iterable[BatchJob]): configurations to build
+        executor (str): "thread" (default) - the jobs are built in threads by this builder, sharing the compiled
+          templates and caches. It suits the builds which spend the time in system commands and reading of files.
+          "process" - the jobs are built in worker processes, so rendering of templates uses multiple CPU cores.
+          Each worker process creates a copy of this builder once and reuses its compiled templates for all jobs
+          it builds. Configure `jinja_bytecode_cache` to share the compiled templates between processes.
+          Result cache and hooks are not used in worker processes
+        max_workers (int | None): the maximum number of threads or processes. Defaults to the pool default
+    Returns:
+        Iterator[BatchResult]: results of jobs in order of completion
+    """
+    if executor not in EXECUTORS:
+      raise ValueError(ERR_UNKNOWN_EXECUTOR.format(executor=executor, executors=", ".join(EXECUTORS)))
+    jobs = list(jobs)
+    for job in jobs:
+      if not isinstance(job, BatchJob):
+        raise TypeError(ERR_INVALID_JOB.format(job=job))
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # noqa: PLC0415 imported on first use
+
+    # The pools raise ValueError for invalid number of workers
+    if executor == EXECUTOR_THREAD:
+      pool = ThreadPoolExecutor(max_workers, thread_name_prefix="configtpl-batch")
+      build = self.build_from_files
+    else:
+      try:
+        pickle.dumps(self._worker_spec)
+      except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise ValueError(ERR_UNPICKLABLE_BUILDER.format(error=e)) from e
+      pool = ProcessPoolExecutor(max_workers, initializer=_worker_init, initargs=(self._worker_spec,))
+      build = _worker_build
+
+    try:
+      futures = {pool.submit(build, job.paths, job.overrides, job.ctx): i for i, job in enumerate(jobs)}
+    except BaseException:
+      pool.shutdown(wait=False, cancel_futures=True)
+      raise
+    return _iter_batch_results(pool, futures, jobs)
+
+  def _build_from_files(self, paths: list[str], overrides: dict | None, ctx: dict | None) -> dict:
+    with self.cmd_runner.build_scope():
+      if self.cmd_runner.prefetch:
+        self._prefetch_commands([os.path.realpath(p) for p in paths])
+      return self._build_layers(paths, overrides, ctx)
+
+  def _build_layers(self, paths: list[str], overrides: dict | None, ctx: dict | None) -> dict:
+    return self._finalize_cfg(dict_thaw(self._load_files(paths, ctx)), overrides)
+
+  def _load_files(self, paths: list[str], ctx: dict | None, *, lazy: bool = False) -> dict | LazyConfig:
+    """
+    Renders the files and returns a read-only configuration without environment variables and overrides.
+    If `lazy` is True, the configuration is a `LazyConfig` of defaults and outputs of files, which are not merged
+    """
+    (defaults, ctx) = dict_init_dicts_from_list(self.defaults, ctx)
 
-    cfg = deepcopy(defaults)
-    for cfg_path_raw in paths:
-      cfg_path = os.path.realpath(cfg_path_raw)
-      ctx_iter = deepcopy({**cfg, **ctx})
-      cfg_iter: dict = self._render_cfg_from_file(cfg_path, ctx_iter)
-      cfg = dict_deep_merge(cfg, cfg_iter)
+    # The configuration is kept read-only between the layers. It is shared with rendering context without copying,
+    # and merging reuses the subtrees which are not changed by the layer.
+    cfg = dict_freeze(defaults)
+    if lazy:
+      cfg = LazyConfig([cfg], self.merge_list_strategy)
+    ctx = dict_freeze(ctx)
+    return self._load_layers([os.path.realpath(p) for p in paths], cfg, ctx)
 
-    return self._finalize_cfg(cfg, overrides)
+  def build_from_files_lazy(
+    self,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ) -> LazyConfig:
+    """
+    Same as `build_from_files`, but returns a read-only `LazyConfig`. The files are rendered and parsed,
+    but their outputs are not merged together and with environment variables and overrides, and not copied into
+    a regular dictionary: each section is merged when it's accessed for the first time. Each file is rendered with
+    a `LazyConfig` of the previous outputs, so only the sections which templates read are merged.
+    Use `LazyConfig.to_dict` to get a regular dictionary.
+    The result is not cached by `result_cache`. If schema is configured, the whole configuration is merged
+    to validate it, so nothing is left to merge lazily.
+    """
+    with self.cmd_runner.build_scope():
+      if self.cmd_runner.prefetch:
+        self._prefetch_commands([os.path.realpath(p) for p in paths])
+      cfg = self._load_files(paths, ctx, lazy=True)
+      cfg_env = self._timed(STAGE_ENV, None, self.env_snapshot.get_config, self.env_var_prefix, self.schema)
+      layers = [*cfg.layers, dict_freeze(cfg_env), dict_freeze({} if overrides is None else overrides)]
+      result = LazyConfig(layers, self.merge_list_strategy)
+      if self.schema is not None:
+        self._timed(STAGE_VALIDATE, None, self.schema.validate, result.to_dict())
+      return result
+
+  def build_from_files_frozen(
+    self,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+    *,
+    index: bool = False,
+  ) -> FrozenConfig:
+    """
+    Same as `build_from_files`, but returns an immutable and hashable `FrozenConfig` with lookups by dotted paths.
+    It can be shared between threads without copying. The result is not cached by `result_cache`.
+    If `index` is True, the values are indexed by dotted paths, see `FrozenConfig`.
+    """
+    with self.cmd_runner.build_scope():
+      if self.cmd_runner.prefetch:
+        self._prefetch_commands([os.path.realpath(p) for p in paths])
+      # The read-only configuration isn't copied before freezing: merging doesn't modify it
+      cfg = self._finalize_cfg(self._load_files(paths, ctx), overrides)
+      return FrozenConfig(cfg, index=index)
+
+  def build_from_files_with_manifest(
+    self,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ) -> tuple[dict, BuildManifest]:
+    """
+    Same as `build_from_files`, but also returns a manifest of all inputs which influenced the result:
+    templates, files, environment variables and system commands.
+    """
+    with manifest_scope() as manifest:
+      cfg = self.build_from_files(paths, overrides=overrides, ctx=ctx)
+    return cfg, manifest
 
   def build_from_str(
     self,
@@ -104,38 +394,573 @@ class ConfigTpl:
     """
     if work_dir is None:
       work_dir = str(Path.cwd())
+    return self._build_cached(
+      lambda: self._build_from_str(s, work_dir, overrides, ctx),
+      lambda: ("str", s, work_dir, overrides, ctx),
+    )
+
+  def build_from_str_with_manifest(
+    self,
+    s: str,
+    work_dir: str | None = None,
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ) -> tuple[dict, BuildManifest]:
+    """
+    Same as `build_from_str`, but also returns a manifest of all inputs which influenced the result:
+    templates, files, environment variables and system commands.
+    """
+    with manifest_scope() as manifest:
+      cfg = self.build_from_str(s, work_dir=work_dir, overrides=overrides, ctx=ctx)
+    return cfg, manifest
+
+  def build_documents_from_file(self, path: str, ctx: dict | None = None) -> Iterator[object]:
+    """
+    Renders a file which contains multiple documents (e.g. YAML documents separated by "---")
+    and yields the parsed documents one by one. The template is rendered in chunks which are parsed
+    as they are produced, so each document is yielded before the next ones are rendered,
+    and huge generated files are processed in bounded memory.
+
+    The rendering context is made of default values and additional context. The documents are not merged
+    with each other, with environment variables and overrides, and the directives are not processed.
+    The parser of file must support streams (see `StreamParser`), otherwise TypeError is raised.
+
+    Args:
+        path (str): a path to file
+        ctx (dict | None): additional rendering context
+    """
+    (defaults, ctx) = dict_init_dicts_from_list(self.defaults, ctx)
+    path = os.path.realpath(path)
+    p = Path(path)
+    parser = self.parsers_by_extension.get(p.suffix.lower(), self.parser)
+    if not isinstance(parser, StreamParser):
+      raise TypeError(ERR_STREAM_PARSER_REQUIRED.format(path=path, parser=parser.name))
+    jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent)
+    tpl = self._timed(STAGE_COMPILE, path, jinja_env.get_template, p.name)
+    manifest_record_parser(path, parser.name)
+    return self._iter_documents(tpl, {**dict_freeze(defaults), **dict_freeze(ctx)}, parser, path)
+
+  async def build_from_files_async(
+    self,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ) -> dict:
+    """
+    Same as `build_from_files`, but doesn't block the event loop, so several builds can run concurrently.
+    Templates are rendered in Jinja async mode, `cmd` and `file` functions run in background,
+    loading of templates, parsing and merging run in worker threads.
+    """
+    return await self._build_cached_async(
+      lambda: self._build_from_files_async(paths, overrides, ctx),
+      lambda: ("files", [(p, fs_hash_file(p)) for p in map(os.path.realpath, paths)], overrides, ctx),
+    )
+
+  async def build_from_str_async(
+    self,
+    s: str,
+    work_dir: str | None = None,
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+  ) -> dict:
+    """
+    Same as `build_from_str`, but doesn't block the event loop. See `build_from_files_async`.
+    """
+    if work_dir is None:
+      work_dir = str(Path.cwd())
+    return await self._build_cached_async(
+      lambda: self._build_from_str_async(s, work_dir, overrides, ctx),
+      lambda: ("str", s, work_dir, overrides, ctx),
+    )
+
+  def _build_from_str(self, s: str, work_dir: str, overrides: dict | None, ctx: dict | None) -> dict:
+    from jinja2 import TemplateError  # noqa: PLC0415 imported on first use
+
     (defaults, ctx, overrides) = dict_init_dicts_from_list(self.defaults, ctx, overrides)
-    cfg = self._render_cfg_from_str(s=s, ctx=dict_deep_merge(defaults, ctx), work_dir=work_dir)
-    return self._finalize_cfg(cfg, overrides)
+    with self.cmd_runner.build_scope():
+      if self.cmd_runner.prefetch:
+        jinja_env = self.jinja_env_factory.get_fs_jinja_environment(work_dir)
+        with contextlib.suppress(TemplateError):
+          self.cmd_runner.start(commands_find_calls(jinja_env, s))
+      ctx = dict_deep_merge(defaults, ctx)
+      cfg = self._render_cfg_from_str(s=s, ctx=ctx, work_dir=work_dir)
+      (cfg, next_paths) = directives_pop(cfg, STR_TEMPLATE_NAME, work_dir)
+      if next_paths:
+        cfg = self._load_layers(next_paths, dict_freeze(cfg), dict_freeze(ctx), requested_by=STR_TEMPLATE_NAME)
+        cfg = dict_thaw(cfg)
+      return self._finalize_cfg(cfg, overrides)
+
+  async def _build_from_files_async(self, paths: list[str], overrides: dict | None, ctx: dict | None) -> dict:
+    (defaults, ctx, overrides) = dict_init_dicts_from_list(self.defaults, ctx, overrides)
+    with self.cmd_runner.build_scope():
+      if self.cmd_runner.prefetch:
+        await _to_thread(self._prefetch_commands, [os.path.realpath(p) for p in paths])
+      cfg = await self._load_layers_async([os.path.realpath(p) for p in paths], dict_freeze(defaults), dict_freeze(ctx))
+      return await _to_thread(self._finalize_cfg, dict_thaw(cfg), overrides)
+
+  async def _build_from_str_async(self, s: str, work_dir: str, overrides: dict | None, ctx: dict | None) -> dict:
+    from jinja2 import TemplateError  # noqa: PLC0415 imported on first use
+
+    (defaults, ctx, overrides) = dict_init_dicts_from_list(self.defaults, ctx, overrides)
+    with self.cmd_runner.build_scope():
+      jinja_env = self.jinja_env_factory.get_fs_jinja_environment(work_dir, is_async=True)
+      if self.cmd_runner.prefetch:
+        with contextlib.suppress(TemplateError):
+          self.cmd_runner.start(commands_find_calls(jinja_env, s))
+      tpl = await _to_thread(
+        self._timed,
+        STAGE_COMPILE,
+        STR_TEMPLATE_NAME,
+        self.jinja_env_factory.get_str_template,
+        s,
+        work_dir,
+        is_async=True,
+      )
+      manifest_record_parser(STR_TEMPLATE_NAME, self.parser.name)
+      ctx = dict_deep_merge(defaults, ctx)
+      cfg = await self._render_tpl_async(tpl, ctx, self.parser, STR_TEMPLATE_NAME)
+      (cfg, next_paths) = directives_pop(cfg, STR_TEMPLATE_NAME, work_dir)
+      if next_paths:
+        cfg = await self._load_layers_async(
+          next_paths,
+          dict_freeze(cfg),
+          dict_freeze(ctx),
+          requested_by=STR_TEMPLATE_NAME,
+        )
+        cfg = dict_thaw(cfg)
+      return await _to_thread(self._finalize_cfg, cfg, overrides)
+
+  async def _load_layers_async(self, paths: list[str], cfg: dict, ctx: dict, requested_by: str | None = None) -> dict:
+    """
+    Same as `_load_layers`, but renders the files in async mode. Files are not rendered in parallel.
+    """
+    queue = LayerQueue(paths, requested_by=requested_by)
+    while queue:
+      (path, parents) = queue.pop()
+      p = Path(path)
+      jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent, is_async=True)
+      tpl = await _to_thread(self._timed, STAGE_COMPILE, path, jinja_env.get_template, p.name)
+      parser = self.parsers_by_extension.get(p.suffix.lower(), self.parser)
+      manifest_record_parser(path, parser.name)
+      cfg_iter = await self._render_tpl_async(tpl, {**cfg, **ctx}, parser, path)
+      (cfg_iter, next_paths) = directives_pop(cfg_iter, path, p.parent)
+      cfg = await _to_thread(self._timed, STAGE_MERGE, path, self._merge_layers, cfg, cfg_iter)
+      queue.push_next(path, parents, next_paths)
+    return cfg
+
+  def _prefetch_commands(self, paths: list[str]) -> None:
+    """
+    Starts the commands called by templates in background, so they run in parallel with each other and with rendering.
+    Templates which cannot be loaded or parsed are skipped: the error is raised when they are rendered.
+    """
+    from jinja2 import TemplateError  # noqa: PLC0415 imported on first use
+
+    cmds = set()
+    for path in paths:
+      p = Path(path)
+      jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent)
+      with contextlib.suppress(TemplateError):
+        (source, _, _) = jinja_env.loader.get_source(jinja_env, p.name)
+        cmds.update(commands_find_calls(jinja_env, source))
+    self.cmd_runner.start(sorted(cmds))
+
+  def _build_cached(self, build: Callable[[], dict], get_key_parts: Callable[[], tuple]) -> dict:
+    """
+    Runs the build or serves its result from the result cache, if cache is configured.
+    """
+    if self.result_cache is None:
+      return build()
+
+    key = self._get_cache_key(get_key_parts)
+    cfg = self._get_cached_result(key)
+    if cfg is not None:
+      return cfg
+
+    with manifest_scope() as manifest:
+      cfg = build()
+    self._put_cached_result(key, cfg, manifest)
+    return cfg
+
+  async def _build_cached_async(
+    self,
+    build: Callable[[], Awaitable[dict]],
+    get_key_parts: Callable[[], tuple],
+  ) -> dict:
+    """
+    Same as `_build_cached`, but for async builds. Reading of files for cache validation runs in a worker thread.
+    """
+    if self.result_cache is None:
+      return await build()
+
+    key = await _to_thread(self._get_cache_key, get_key_parts)
+    cfg = await _to_thread(self._get_cached_result, key)
+    if cfg is not None:
+      return cfg
+
+    with manifest_scope() as manifest:
+      cfg = await build()
+    self._put_cached_result(key, cfg, manifest)
+    return cfg
+
+  def _get_cache_key(self, get_key_parts: Callable[[], tuple]) -> str | None:
+    return ResultCache.make_key(
+      self.jinja_env_factory.get_fingerprint(),
+      self.parser.name,
+      sorted((ext, p.name) for ext, p in self.parsers_by_extension.items()),
+      self.merge_list_strategy,
+      self.defaults,
+      self.env_var_prefix,
+      # The schema converts environment variables, so it changes the result. It's pickled as its specification
+      self.schema,
+      self._get_env_snapshot(),
+      str(Path.cwd()),
+      *get_key_parts(),
+    )
+
+  def _get_cached_result(self, key: str | None) -> dict | None:
+    if key is None:
+      return None
+    cached = self.result_cache.get(key, self.env_snapshot.environ)
+    if cached is None:
+      return None
+    (cfg, manifest) = cached
+    manifest_record_manifest(manifest)
+    return cfg
+
+  def _put_cached_result(self, key: str | None, cfg: dict, manifest: BuildManifest) -> None:
+    if key is not None:
+      self.result_cache.put(key, cfg, manifest)
+
+  def _get_env_snapshot(self) -> list[tuple[str, str]]:
+    """
+    Returns environment variables which are injected into configuration
+    """
+    return sorted(self.env_snapshot.get_vars(self.env_var_prefix).items())
+
+  def _load_layers(
+    self,
+    paths: list[str],
+    cfg: dict | LazyConfig,
+    ctx: dict,
+    requested_by: str | None = None,
+  ) -> dict | LazyConfig:
+    """
+    Renders the files and merges them in order, on top of the given configuration.
+    If the configuration is a `LazyConfig`, the outputs of files are added to its layers instead of merging.
+    Files might request other files with "@configtpl" directive, see `LayerQueue`. While the first requested file
+    is rendered, the other ones are loaded and compiled in background.
+
+    If `layer_workers` is greater than 1, the given files are rendered in parallel by worker processes.
+    All of them are rendered speculatively with the context made of the given configuration and additional context
+    only. Just the variables which the template of file reads (see `analysis_find_read_vars`) are sent to a worker.
+    A speculative result of file is used if these variables have the same values in the context built
+    from the previous files. Otherwise, the file is rendered again with that context. So the result is the same
+    as with sequential rendering. Files which call the globals of configtpl (e.g. `cmd`) or custom globals,
+    filters or tests are not rendered speculatively, so their calls run once, in this process.
+    """
+    from concurrent.futures import ThreadPoolExecutor  # noqa: PLC0415 imported on first use
+
+    queue = LayerQueue(paths, requested_by=requested_by)
+    speculative = {}
+    if self.layer_workers > 1 and len(paths) > 1:
+      pool = self._get_layer_pool()
+      if pool is not None:
+        speculative = self._submit_speculative(pool, paths, {**cfg, **ctx})
+
+    with ThreadPoolExecutor(1, thread_name_prefix="configtpl-layer") as pool:
+      while queue:
+        (path, parents) = queue.pop()
+        cfg_iter = self._take_speculative(speculative.get(path), {**cfg, **ctx})
+        if cfg_iter is None:
+          cfg_iter = self._render_layer(path, cfg, ctx)
+        (cfg_iter, next_paths) = directives_pop(cfg_iter, path, Path(path).parent)
+        merge = self._append_layer if isinstance(cfg, LazyConfig) else self._merge_layers
+        cfg = self._timed(STAGE_MERGE, path, merge, cfg, cfg_iter)
+        for next_path in queue.push_next(path, parents, next_paths)[1:]:
+          pool.submit(self._compile_quietly, next_path)
+    return cfg
+
+  def _get_layer_pool(self) -> "ProcessPoolExecutor | None":
+    """
+    Returns the worker processes which render files speculatively, starting them on first use.
+    Each of them renders with a copy of this builder. None if the builder cannot be copied,
+    e.g. its globals are lambdas: then the files are rendered sequentially.
+    """
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415 imported on first use
+
+    with self._layer_pool_lock:
+      if self._layer_pool is None:
+        try:
+          pickle.dumps(self._worker_spec)
+        except (pickle.PicklingError, TypeError, AttributeError):
+          return None
+        self._layer_pool = ProcessPoolExecutor(
+          self.layer_workers,
+          initializer=_worker_init,
+          initargs=(self._worker_spec,),
+        )
+        self._layer_pool_finalizer = weakref.finalize(self, self._layer_pool.shutdown, wait=False, cancel_futures=True)
+      return self._layer_pool
+
+  def _submit_speculative(self, pool: "ProcessPoolExecutor", paths: list[str], ctx: dict) -> dict:
+    """
+    Submits the speculative rendering of files into worker processes.
+    Returns the variables which template of each submitted file reads, their values and the future of result
+    """
+    speculative = {}
+    try:
+      for path in paths:
+        read_vars = self._find_read_vars(path)
+        if read_vars is not None and path not in speculative:
+          inputs = analysis_get_inputs(ctx, read_vars)
+          future = pool.submit(_worker_render_speculative, path, inputs, record_hooks=self.hooks is not None)
+          speculative[path] = (read_vars, inputs, future)
+    except RuntimeError:
+      # The pool is closed or broken by a failed worker process: the remaining files are rendered sequentially,
+      # and the broken pool is replaced on next build
+      if self._layer_pool is pool:
+        self.close()
+    return speculative
+
+  def _compile_quietly(self, path: str) -> None:
+    """
+    Loads and compiles the template of file into the cache of Jinja environment.
+    Errors are ignored: they are raised when the file is rendered.
+    """
+    from jinja2 import TemplateError  # noqa: PLC0415 imported on first use
+
+    p = Path(path)
+    jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent)
+    with contextlib.suppress(TemplateError, OSError):
+      jinja_env.get_template(p.name)
+
+  def _take_speculative(self, speculative: "tuple[frozenset[str], dict, Future] | None", ctx: dict) -> dict | None:
+    """
+    Returns the speculative result of file if the variables which its template reads have the same values
+    in the given context
+    """
+    if speculative is None:
+      return None
+    (read_vars, inputs, future) = speculative
+    if analysis_get_inputs(ctx, read_vars) != inputs:
+      future.cancel()
+      return None
+    try:
+      result = future.result()
+    except Exception:  # noqa: BLE001 e.g. the inputs cannot be sent to worker: the file is rendered again
+      return None
+    if result is None:
+      return None
+    (cfg, manifest, hooks) = result
+    manifest_record_manifest(manifest)
+    if hooks is not None and self.hooks is not None:
+      hooks.replay(self.hooks)
+    return cfg
+
+  def _render_speculative(
+    self,
+    path: str,
+    ctx: dict,
+    *,
+    record_hooks: bool,
+  ) -> tuple[dict, BuildManifest, RecordedHooks | None] | None:
+    """
+    Renders a file with its own manifest and measurements, so they are recorded only if the result is used.
+    Returns None on error: if the result is needed, the file is rendered again to raise the error.
+    """
+    hooks = RecordedHooks() if record_hooks else None
+    _speculative_hooks.set(hooks)
+    with manifest_scope(isolated=True) as manifest:
+      try:
+        cfg = self._render_cfg_from_file(path, ctx)
+      except Exception:  # noqa: BLE001 the error is raised by the rendering with actual context
+        return None
+    return cfg, manifest, hooks
+
+  def _find_read_vars(self, path: str) -> frozenset[str] | None:
+    """
+    Returns the variables which are referenced by template of file. None if they are unknown,
+    including the case when the template cannot be loaded: the error is raised when the file is rendered.
+    None is returned for templates which call the globals of configtpl too (see `KNOWN_MODULES`),
+    so they are rendered only with the actual context.
+    """
+    from jinja2 import TemplateError  # noqa: PLC0415 imported on first use
+
+    p = Path(path)
+    jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent)
+    try:
+      return self._read_vars_cache.get(jinja_env, p.name)
+    except (TemplateError, OSError):
+      return None
+
+  def _render_layer(self, path: str, cfg: dict | LazyConfig, ctx: dict) -> dict:
+    """
+    Renders a configuration file on top of configuration built from previous files.
+    The rendering context is made of previous configuration and additional context.
+    Both must be read-only (see `dict_freeze`), so templates cannot modify them.
+    """
+    ctx_iter = {**cfg, **ctx}
+    return self._render_cfg_from_file(path, ctx_iter)
 
   def _render_cfg_from_file(self, path: str, ctx: dict) -> dict:
     """
     Renders a template file into config dictionary in two steps:
     1. Renders a file as Jinja template
-    2. Parses the rendered file as YAML template
+    2. Parses the rendered file as YAML template (or with other parser configured for the file extension)
     """
     p = Path(path)
     jinja_env = self.jinja_env_factory.get_fs_jinja_environment(p.parent)
-    tpl = jinja_env.get_template(p.name)
-    return _render_tpl(tpl, ctx)
+    tpl = self._timed(STAGE_COMPILE, path, jinja_env.get_template, p.name)
+    parser = self.parsers_by_extension.get(p.suffix.lower(), self.parser)
+    manifest_record_parser(path, parser.name)
+    return self._render_tpl(tpl, ctx, parser, path)
 
   def _render_cfg_from_str(self, s: str, ctx: dict, work_dir: str) -> dict:
-    jinja_env = self.jinja_env_factory.get_fs_jinja_environment(work_dir)
-    tpl = jinja_env.from_string(s)
-    return _render_tpl(tpl, ctx)
+    tpl = self._timed(STAGE_COMPILE, STR_TEMPLATE_NAME, self.jinja_env_factory.get_str_template, s, work_dir)
+    manifest_record_parser(STR_TEMPLATE_NAME, self.parser.name)
+    return self._render_tpl(tpl, ctx, self.parser, STR_TEMPLATE_NAME)
+
+  def _render_tpl(self, tpl: "Template", ctx: dict, parser: Parser, path: str) -> dict:
+    if self.stream_render and isinstance(parser, StreamParser):
+      return self._render_tpl_stream(tpl, ctx, parser, path)
+    tpl_rendered = self._timed(STAGE_RENDER, path, tpl.render, ctx)
+    return self._parse_rendered(tpl_rendered, parser, path)
+
+  def _render_tpl_stream(self, tpl: "Template", ctx: dict, parser: StreamParser, path: str) -> dict:
+    hooks = self._get_hooks()
+    stream = ChunkReader(tpl.generate(ctx), count_bytes=hooks is not None)
+    try:
+      result = self._timed(STAGE_RENDER, path, parser.parse_stream, stream)
+    finally:
+      stream.close()
+    if hooks is not None:
+      hooks.on_render(path, stream.bytes_read)
+    if result is None:
+      return {}
+
+    return result
+
+  def _iter_documents(self, tpl: "Template", ctx: dict, parser: StreamParser, path: str) -> Iterator[object]:
+    stream = ChunkReader(tpl.generate(ctx), count_bytes=self.hooks is not None)
+    try:
+      yield from parser.parse_stream_all(stream)
+    finally:
+      stream.close()
+    if self.hooks is not None:
+      self.hooks.on_render(path, stream.bytes_read)
+
+  async def _render_tpl_async(self, tpl: "Template", ctx: dict, parser: Parser, path: str) -> dict:
+    start = time.perf_counter()
+    tpl_rendered = await tpl.render_async(ctx)
+    if self.hooks is not None:
+      self.hooks.on_stage(STAGE_RENDER, path, time.perf_counter() - start)
+    return await _to_thread(self._parse_rendered, tpl_rendered, parser, path)
+
+  def _parse_rendered(self, tpl_rendered: str, parser: Parser, path: str) -> dict:
+    hooks = self._get_hooks()
+    if hooks is not None:
+      hooks.on_render(path, len(tpl_rendered.encode()))
+    result = self._timed(STAGE_PARSE, path, parser.parse, tpl_rendered)
+    if result is None:
+      return {}
+
+    return result
 
   def _finalize_cfg(self, cfg: dict, overrides: dict | None = None) -> dict:
-    """Applies the final steps (env vars and overrides) to the configuration"""
+    """Applies the final steps (env vars, overrides and validation) to the configuration"""
     if overrides is None:
       overrides = {}
-    cfg = dict_deep_merge(cfg, get_config_from_env(self.env_var_prefix))
-    return dict_deep_merge(cfg, overrides)
+    cfg_env = self._timed(STAGE_ENV, None, self.env_snapshot.get_config, self.env_var_prefix, self.schema)
+    cfg = self._timed(
+      STAGE_MERGE,
+      None,
+      dict_deep_merge,
+      cfg,
+      cfg_env,
+      overrides,
+      list_strategy=self.merge_list_strategy,
+    )
+    if self.schema is not None:
+      self._timed(STAGE_VALIDATE, None, self.schema.validate, cfg)
+    return cfg
+
+  def _merge_layers(self, *cfgs: dict) -> dict:
+    """
+    Merges configurations of layers into a read-only configuration
+    """
+    return dict_deep_merge(*cfgs, list_strategy=self.merge_list_strategy, frozen=True)
+
+  def _append_layer(self, cfg: LazyConfig, cfg_iter: dict) -> LazyConfig:
+    """
+    Adds the configuration of layer to a lazy configuration without merging
+    """
+    return LazyConfig([*cfg.layers, dict_freeze(cfg_iter)], self.merge_list_strategy)
+
+  def _timed(self, stage: str, path: str | None, fn: Callable, *args: object, **kwargs: object) -> object:
+    """
+    Calls the function and reports its duration into hooks, if hooks are configured
+    """
+    hooks = self._get_hooks()
+    if hooks is None:
+      return fn(*args, **kwargs)
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    hooks.on_stage(stage, path, time.perf_counter() - start)
+    return result
+
+  def _get_hooks(self) -> BuildHooks | None:
+    """
+    Returns the hooks which receive the measurements: the configured ones, or the recorder of speculative rendering
+    """
+    hooks = _speculative_hooks.get()
+    return self.hooks if hooks is None else hooks
+
+
+# A builder of worker process of `ConfigTpl.build_batch` and `layer_workers`
+_worker_state: dict[str, ConfigTpl] = {}
+
+
+def _worker_init(spec: dict) -> None:
+  # Worker processes render files sequentially, they don't start their own workers
+  _worker_state["builder"] = ConfigTpl(**{**spec, "layer_workers": 1})
+
+
+def _worker_build(paths: list[str], overrides: dict | None, ctx: dict | None) -> dict:
+  return _worker_state["builder"].build_from_files(paths, overrides=overrides, ctx=ctx)
+
+
+def _worker_render_speculative(
+  path: str,
+  ctx: dict,
+  *,
+  record_hooks: bool,
+) -> tuple[dict, BuildManifest, RecordedHooks | None] | None:
+  return _worker_state["builder"]._render_speculative(path, ctx, record_hooks=record_hooks)  # noqa: SLF001
+
+
+def _iter_batch_results(pool: "Executor", futures: "dict[Future, int]", jobs: list[BatchJob]) -> Iterator[BatchResult]:
+  """
+  Yields the results of jobs of `ConfigTpl.build_batch` as they are built, and shuts the pool down at the end
+  """
+  from concurrent.futures import as_completed  # noqa: PLC0415 imported on first use
+
+  try:
+    for future in as_completed(futures):
+      i = futures[future]
+      try:
+        result = BatchResult(i, jobs[i], cfg=future.result())
+      except Exception as e:  # noqa: BLE001 the error is returned in the result
+        result = BatchResult(i, jobs[i], error=e)
+      yield result
+  finally:
+    pool.shutdown(wait=True, cancel_futures=True)
 
 
-def _render_tpl(tpl: Template, ctx: dict) -> dict:
-  tpl_rendered = tpl.render(ctx)
-  result = yaml.safe_load(tpl_rendered)
-  if result is None:
-    return {}
+async def _to_thread(fn: Callable, /, *args: object, **kwargs: object) -> object:
+  """
+  Same as `asyncio.to_thread`. The module is imported here rather than with `configtpl.main`,
+  since an event loop has already loaded it when a coroutine runs
+  """
+  import asyncio  # noqa: PLC0415 imported on first use
 
-  return result
+  return await asyncio.to_thread(fn, *args, **kwargs)
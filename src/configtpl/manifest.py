@@ -0,0 +1,162 @@
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from configtpl.utils.fs import fs_hash_file, fs_hash_text
+
+_active_manifests: ContextVar[tuple["BuildManifest", ...]] = ContextVar("configtpl_active_manifests", default=())
+
+
+@dataclass
+class BuildManifest:
+  """
+  Inputs which influenced the result of a configuration build.
+
+  Args:
+      templates (dict[str, str]): paths of loaded templates (including the included ones) and digests of their source
+      files (dict[str, str | None]): paths of files read by `file` global and digests of their contents
+      env_vars (dict[str, str | None]): names of environment variables read by `env` global and their values.
+        None means that variable is not set
+      env_prefix_vars (dict[str, dict[str, str]]): environment variables which are injected into configuration
+        because of configured prefix. Keys are prefixes, values are variables with this prefix and their values
+      commands (dict[str, str]): system commands executed by `cmd` global and digests of their output
+      parsers (dict[str, str]): paths of rendered configuration files and names of parsers used for them.
+        A template rendered from string is reported as "<string>"
+      nondeterministic (set[str]): names of globals which might produce a different result on each call,
+        e.g. `uuid` or `cmd`
+  """
+
+  templates: dict[str, str] = field(default_factory=dict)
+  files: dict[str, str | None] = field(default_factory=dict)
+  env_vars: dict[str, str | None] = field(default_factory=dict)
+  env_prefix_vars: dict[str, dict[str, str]] = field(default_factory=dict)
+  commands: dict[str, str] = field(default_factory=dict)
+  parsers: dict[str, str] = field(default_factory=dict)
+  nondeterministic: set[str] = field(default_factory=set)
+
+  @property
+  def is_deterministic(self) -> bool:
+    return not self.nondeterministic
+
+  def is_up_to_date(self, environ: Mapping[str, str], prefix_environ: Mapping[str, str] | None = None) -> bool:
+    """
+    Checks if recorded files, templates and environment variables are unchanged.
+    See `is_env_up_to_date` for arguments.
+    """
+    if not self.is_env_up_to_date(environ, prefix_environ):
+      return False
+    return all(fs_hash_file(path) == digest for path, digest in (*self.templates.items(), *self.files.items()))
+
+  def is_env_up_to_date(self, environ: Mapping[str, str], prefix_environ: Mapping[str, str] | None = None) -> bool:
+    """
+    Checks if recorded environment variables are unchanged
+
+    Args:
+        environ (Mapping[str, str]): variables which are read by templates
+        prefix_environ (Mapping[str, str] | None): variables which are injected into configuration because of prefix,
+          if they are taken from other mapping than `environ` (see `configtpl.env.EnvSnapshot`)
+    """
+    if prefix_environ is None:
+      prefix_environ = environ
+    if any(environ.get(name) != value for name, value in self.env_vars.items()):
+      return False
+    return all(
+      {k: v for k, v in prefix_environ.items() if k.startswith(prefix)} == env_vars
+      for prefix, env_vars in self.env_prefix_vars.items()
+    )
+
+  def update(self, other: "BuildManifest") -> None:
+    """
+    Adds the inputs recorded in other manifest into this one
+    """
+    self.templates.update(other.templates)
+    self.files.update(other.files)
+    self.env_vars.update(other.env_vars)
+    for prefix, env_vars in other.env_prefix_vars.items():
+      self.env_prefix_vars.setdefault(prefix, {}).update(env_vars)
+    self.commands.update(other.commands)
+    self.parsers.update(other.parsers)
+    self.nondeterministic.update(other.nondeterministic)
+
+
+@contextmanager
+def manifest_scope(*, isolated: bool = False) -> Iterator[BuildManifest]:
+  """
+  Collects the inputs which are used inside the block into a new manifest.
+  Scopes might be nested: inputs are recorded into all active manifests.
+
+  Args:
+      isolated (bool): if True, the inputs are recorded only into the new manifest, but not into the outer ones.
+        The manifest might be recorded into the outer ones later with `manifest_record_manifest`
+  """
+  manifest = BuildManifest()
+  token = _active_manifests.set((manifest,) if isolated else (*_active_manifests.get(), manifest))
+  try:
+    yield manifest
+  finally:
+    _active_manifests.reset(token)
+
+
+def manifest_record_template(path: str, digest: str) -> None:
+  for m in _active_manifests.get():
+    m.templates[path] = digest
+
+
+def manifest_is_recording() -> bool:
+  """
+  Returns True if there are active manifests, so inputs which are expensive to describe should be recorded
+  """
+  return bool(_active_manifests.get())
+
+
+def manifest_record_file(path: str, contents: str | None, digest: str | None = None) -> None:
+  """
+  Records a file read by templates. The digest must match the one returned by `fs_hash_file`.
+  If digest is not provided, it's computed from contents.
+  """
+  manifests = _active_manifests.get()
+  if not manifests:
+    return
+  if digest is None and contents is not None:
+    digest = fs_hash_text(contents)
+  for m in manifests:
+    m.files[path] = digest
+
+
+def manifest_record_env_var(name: str, value: str | None) -> None:
+  for m in _active_manifests.get():
+    m.env_vars[name] = value
+
+
+def manifest_record_env_prefix_vars(prefix: str, env_vars: dict[str, str]) -> None:
+  for m in _active_manifests.get():
+    m.env_prefix_vars.setdefault(prefix, {}).update(env_vars)
+
+
+def manifest_record_command(cmd: str, output: str) -> None:
+  manifests = _active_manifests.get()
+  if not manifests:
+    return
+  digest = fs_hash_text(output)
+  for m in manifests:
+    m.commands[cmd] = digest
+    m.nondeterministic.add("cmd")
+
+
+def manifest_record_parser(path: str, name: str) -> None:
+  for m in _active_manifests.get():
+    m.parsers[path] = name
+
+
+def manifest_record_manifest(manifest: "BuildManifest") -> None:
+  """
+  Records all inputs from existing manifest, e.g. when the result of previous build is reused
+  """
+  for m in _active_manifests.get():
+    m.update(manifest)
+
+
+def manifest_record_nondeterministic(name: str) -> None:
+  for m in _active_manifests.get():
+    m.nondeterministic.add(name)
@@ -0,0 +1,99 @@
+import json
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Protocol, runtime_checkable
+
+if TYPE_CHECKING:
+  import yaml
+
+  from configtpl.utils.streams import ChunkReader
+
+ERR_STREAM_PARSER_REQUIRED = "File '{path}' cannot be parsed as a stream: parser '{parser}' doesn't support streams"
+
+
+class Parser(Protocol):
+  """
+  Parses a rendered template into configuration.
+  A parser must not execute arbitrary code, since the rendered text might include values from environment or files.
+
+  Attributes:
+      name (str): a name of parser which is reported in build manifest
+  """
+
+  name: str
+
+  def parse(self, text: str) -> object: ...
+
+
+@runtime_checkable
+class StreamParser(Parser, Protocol):
+  """
+  A parser which also reads the text from a stream, so the whole text doesn't need to be kept in memory
+  """
+
+  def parse_stream(self, stream: "ChunkReader") -> object:
+    """
+    Same as `parse`, but reads the text from stream
+    """
+
+  def parse_stream_all(self, stream: "ChunkReader") -> Iterator[object]:
+    """
+    Parses a text of multiple documents and yields them one by one as they are read from stream
+    """
+
+
+class YamlParser:
+  def __init__(self, loader: "type[yaml.SafeLoader] | None" = None):
+    """
+    Parses YAML text. PyYAML is imported when the first text is parsed.
+
+    Args:
+        loader (type[yaml.SafeLoader] | None): a safe YAML loader class. By default, the C loader is used
+          if PyYAML is built with libyaml, or the pure Python one otherwise
+    """
+    self._loader = loader
+
+  @property
+  def name(self) -> str:
+    """
+    The name of loader is a part of parser name, e.g. "yaml:CSafeLoader". Reading it imports PyYAML
+    """
+    return f"yaml:{self.loader.__name__}"
+
+  @property
+  def loader(self) -> "type[yaml.SafeLoader]":
+    if self._loader is None:
+      import yaml  # noqa: PLC0415 imported on first use
+
+      self._loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return self._loader
+
+  def parse(self, text: str) -> object:
+    import yaml  # noqa: PLC0415 imported on first use
+
+    # S506: the loader is safe, see the constructor
+    return yaml.load(text, Loader=self.loader)  # noqa: S506
+
+  def parse_stream(self, stream: "ChunkReader") -> object:
+    import yaml  # noqa: PLC0415 imported on first use
+
+    return yaml.load(stream, Loader=self.loader)  # noqa: S506
+
+  def parse_stream_all(self, stream: "ChunkReader") -> Iterator[object]:
+    import yaml  # noqa: PLC0415 imported on first use
+
+    return yaml.load_all(stream, Loader=self.loader)
+
+
+class JsonParser:
+  """
+  Parses JSON text. It's faster than YAML parser for templates which render JSON.
+  It's not used by default: configure it for specific file extensions, e.g. {".json": JsonParser()}
+  """
+
+  name = "json"
+
+  def parse(self, text: str) -> object:
+    # An empty document is an empty configuration, same as in YAML
+    if not text.strip():
+      return None
+    return json.loads(text)
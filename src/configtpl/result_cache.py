@@ -0,0 +1,169 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import threading
+from collections.abc import Mapping
+from copy import deepcopy
+from dataclasses import replace
+from pathlib import Path
+
+from configtpl.manifest import BuildManifest
+from configtpl.utils.cache import CacheStats, LruCache
+from configtpl.utils.fs import fs_write_atomic
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+FILE_SUFFIX = ".pickle"
+
+
+class ResultCache:
+  def __init__(
+    self,
+    *,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    directory: str | None = None,
+    max_size: int = DEFAULT_MAX_SIZE,
+    cache_nondeterministic: bool = False,
+  ):
+    """
+    A cache of built configurations.
+
+    Entries are addressed by a digest of all build inputs which are known in advance
+    (contents of configuration files, defaults, context, overrides, environment variables with configured prefix).
+    Each entry also keeps a manifest of inputs discovered during the build (included templates, files read
+    by `file` global, environment variables read by `env` global). An entry is served only if all of them
+    are unchanged, otherwise the entry is removed.
+
+    Args:
+        max_entries (int): the maximum number of entries in memory
+        directory (str | None): if specified, entries are also stored in this directory as pickle files
+          and can be shared by multiple processes. The directory must not be writable by untrusted users
+        max_size (int): the maximum total size of files in `directory` in bytes. Once it's exceeded,
+          the least recently used files are removed
+        cache_nondeterministic (bool): builds which use nondeterministic globals (`cmd`, `uuid`)
+          are not cached unless this flag is set
+    """
+    self._memory = LruCache(max_entries)
+    self.directory = None if directory is None else Path(directory)
+    if self.directory is not None:
+      self.directory.mkdir(parents=True, exist_ok=True)
+    self.max_size = max_size
+    self.cache_nondeterministic = cache_nondeterministic
+    self._stats = CacheStats()
+    self._lock = threading.Lock()
+
+  @property
+  def stats(self) -> CacheStats:
+    """
+    Returns a snapshot of hit, miss and eviction counters. Evictions from memory and from directory are counted
+    """
+    with self._lock:
+      return replace(self._stats, evictions=self._stats.evictions + self._memory.stats.evictions)
+
+  @staticmethod
+  def make_key(*parts: object) -> str | None:
+    """
+    Makes a cache key from build inputs. Returns None if inputs cannot be serialized,
+    e.g. the context contains lambda functions. Such builds are not cached.
+    """
+    try:
+      data = pickle.dumps(parts, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+      return None
+    return hashlib.sha256(data).hexdigest()
+
+  def get(self, key: str, prefix_environ: Mapping[str, str] | None = None) -> tuple[dict, BuildManifest] | None:
+    """
+    Returns a copy of cached configuration and manifest of its build
+    or None if there is no valid entry for the key.
+    `prefix_environ` is the source of variables injected by prefix, if it's not `os.environ`
+    """
+    entry = self._memory.get(key)
+    if entry is None:
+      entry = self._load_from_dir(key)
+
+    if entry is not None and not entry[1].is_up_to_date(os.environ, prefix_environ):
+      # The entry will never be valid again, since its inputs have changed
+      self._memory.remove(key)
+      if self.directory is not None:
+        self._get_path(key).unlink(missing_ok=True)
+      entry = None
+    if entry is None:
+      self._inc_stats(misses=1)
+      return None
+
+    self._memory.put(key, entry)
+    self._inc_stats(hits=1)
+    return deepcopy(entry[0]), entry[1]
+
+  def put(self, key: str, cfg: dict, manifest: BuildManifest) -> None:
+    """
+    Stores a copy of configuration. Nondeterministic builds are skipped unless caching of them is enabled.
+    """
+    if not manifest.is_deterministic and not self.cache_nondeterministic:
+      return
+
+    entry = (deepcopy(cfg), manifest)
+    self._memory.put(key, entry)
+    if self.directory is not None:
+      fs_write_atomic(self._get_path(key), pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+      self._evict()
+
+  def clear(self) -> None:
+    self._memory.clear()
+    if self.directory is not None:
+      for path in self.directory.glob(f"*{FILE_SUFFIX}"):
+        path.unlink(missing_ok=True)
+
+  def _get_path(self, key: str) -> Path:
+    return self.directory / f"{key}{FILE_SUFFIX}"
+
+  def _load_from_dir(self, key: str) -> tuple[dict, BuildManifest] | None:
+    if self.directory is None:
+      return None
+    path = self._get_path(key)
+    try:
+      data = path.read_bytes()
+    except OSError:
+      # The file is missing or was evicted by another process
+      return None
+    try:
+      # S301: the cache directory is trusted, see the constructor docs
+      entry = pickle.loads(data)  # noqa: S301
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+      return None
+    # The modification time is used as the last access time for eviction
+    with contextlib.suppress(OSError):
+      os.utime(path)
+    return entry
+
+  def _evict(self) -> None:
+    """
+    Removes the least recently used files until the directory fits into the size limit
+    """
+    entries = []
+    for path in self.directory.glob(f"*{FILE_SUFFIX}"):
+      try:
+        st = path.stat()
+      except OSError:
+        continue
+      entries.append((st.st_mtime_ns, st.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    if total_size <= self.max_size:
+      return
+
+    entries.sort()
+    for _, size, path in entries:
+      if total_size <= self.max_size:
+        break
+      path.unlink(missing_ok=True)
+      total_size -= size
+      self._inc_stats(evictions=1)
+
+  def _inc_stats(self, hits: int = 0, misses: int = 0, evictions: int = 0) -> None:
+    with self._lock:
+      self._stats.hits += hits
+      self._stats.misses += misses
+      self._stats.evictions += evictions
@@ -0,0 +1,230 @@
+import dataclasses
+import types
+import typing
+from collections.abc import Callable
+from dataclasses import dataclass
+
+ERR_INVALID_TYPE = "Invalid type of '{path}' in configuration: expected {expected}, got {actual}"
+ERR_INVALID_VALUE = "Invalid value '{value}' of '{path}': expected {expected}"
+ERR_UNSUPPORTED_TYPE = "Unsupported type in schema at '{path}': {tp}"
+
+# Values of environment variables which are converted into Boolean values
+ENV_TRUE_VALUES = ("true", "yes", "on", "1")
+ENV_FALSE_VALUES = ("false", "no", "off", "0")
+
+
+@dataclass
+class _Node:
+  """
+  A compiled type of a configuration value.
+
+  Args:
+      name (str): a readable name of type, for error messages
+      validate (Callable[[object, str], None]): raises an error if a value at the path doesn't match the type
+      convert (Callable[[str], object] | None): converts a value of environment variable into the type.
+        None means that the type is unknown, so the type of value is guessed
+      fields (dict[str, "_Node"] | None): lower-cased keys and types of a section, e.g. of a nested dataclass
+      items (_Node | None): the type of values of a mapping with arbitrary keys
+  """
+
+  name: str
+  validate: Callable[[object, str], None]
+  convert: Callable[[str], object] | None = None
+  fields: dict[str, "_Node"] | None = None
+  items: "_Node | None" = None
+
+
+class Schema:
+  def __init__(self, spec: object):
+    """
+    A schema of configuration. It's compiled once into converters and validators of each key, so
+    environment variables are converted into the types of their keys without guessing,
+    and configurations are validated without inspecting the types again.
+
+    Keys which are missing in configuration are not reported, since configuration is usually split
+    between files. Keys which are not described by schema are not validated.
+
+    Args:
+        spec (object): a dataclass, a TypedDict or a dictionary of keys and types, e.g.
+          {"db": {"host": str, "port": int}, "zip_code": str}. The supported types are str, int, float, bool,
+          list, dict, their parametrized versions (e.g. list[int] or dict[str, int]), unions (e.g. int | None),
+          typing.Any and nested dictionaries, dataclasses and TypedDicts. Other classes are checked with `isinstance`
+    """
+    self.spec = spec
+    self._root = _compile(spec, "")
+
+  def __reduce__(self) -> tuple:
+    # Compiled functions are not picklable, so the schema is compiled again, e.g. in worker processes
+    return (Schema, (self.spec,))
+
+  def validate(self, cfg: dict) -> None:
+    """
+    Raises TypeError if configuration doesn't match the schema
+    """
+    self._root.validate(cfg, "")
+
+  def get_env_converter(self, path: list[str]) -> Callable[[str], object] | None:
+    """
+    Returns a function which converts a value of environment variable into the type of key.
+    The function raises ValueError if value cannot be converted.
+    None is returned if the type of key is unknown, so the type of value should be guessed.
+
+    Args:
+        path (list[str]): lower-cased keys of configuration, e.g. ["db", "port"] for "MY_APP__DB__PORT"
+    """
+    node = self._root
+    for key in path:
+      if node.fields is not None:
+        node = node.fields.get(key)
+      elif node.items is not None:
+        node = node.items
+      else:
+        node = None
+      if node is None:
+        return None
+    if node.convert is None:
+      return None
+    (convert, expected) = (node.convert, node.name)
+
+    def convert_checked(value: str) -> object:
+      try:
+        return convert(value)
+      except ValueError:
+        pass
+      raise ValueError(ERR_INVALID_VALUE.format(value=value, path=".".join(path), expected=expected))
+
+    return convert_checked
+
+
+def _compile(tp: object, path: str) -> _Node:  # noqa: PLR0911 too many return statements
+  if tp is typing.Any or tp is object:
+    return _Node("any", lambda _value, _path: None)
+  if isinstance(tp, dict):
+    return _compile_section("dict", {str(k): _compile(v, _join(path, k)) for k, v in tp.items()})
+  if isinstance(tp, type) and (dataclasses.is_dataclass(tp) or typing.is_typeddict(tp)):
+    hints = typing.get_type_hints(tp)
+    return _compile_section(tp.__name__, {k: _compile(v, _join(path, k)) for k, v in hints.items()})
+
+  origin = typing.get_origin(tp) or tp
+  args = typing.get_args(tp)
+  if origin is typing.Union or origin is types.UnionType:
+    return _compile_union([_compile(arg, path) for arg in args])
+  if origin is list:
+    return _compile_list(_compile(args[0], _join(path, "*")) if args else None)
+  if origin is dict:
+    return _compile_dict(_compile(args[1], _join(path, "*")) if args else None)
+
+  scalar = _SCALARS.get(tp)
+  if scalar is not None:
+    return scalar()
+  if isinstance(tp, type):
+    return _Node(tp.__name__, _make_isinstance_check(tp.__name__, tp))
+  raise TypeError(ERR_UNSUPPORTED_TYPE.format(path=path or "<root>", tp=tp))
+
+
+def _compile_section(name: str, fields: dict[str, _Node]) -> _Node:
+  check = _make_isinstance_check(name, dict)
+
+  def validate(value: object, path: str) -> None:
+    check(value, path)
+    for k, v in value.items():
+      node = fields.get(k)
+      if node is not None:
+        node.validate(v, _join(path, k))
+
+  return _Node(name, validate, fields={k.lower(): v for k, v in fields.items()})
+
+
+def _compile_list(item: _Node | None) -> _Node:
+  name = "list" if item is None else f"list[{item.name}]"
+  check = _make_isinstance_check(name, list)
+
+  def validate(value: object, path: str) -> None:
+    check(value, path)
+    if item is not None:
+      for i, v in enumerate(value):
+        item.validate(v, f"{path}[{i}]")
+
+  return _Node(name, validate)
+
+
+def _compile_dict(item: _Node | None) -> _Node:
+  name = "dict" if item is None else f"dict[str, {item.name}]"
+  check = _make_isinstance_check(name, dict)
+
+  def validate(value: object, path: str) -> None:
+    check(value, path)
+    if item is not None:
+      for k, v in value.items():
+        item.validate(v, _join(path, k))
+
+  return _Node(name, validate, items=item)
+
+
+def _compile_union(options: list[_Node]) -> _Node:
+  name = " | ".join(o.name for o in options)
+  non_null = [o for o in options if o.name != "None"]
+
+  def validate(value: object, path: str) -> None:
+    for option in options:
+      try:
+        option.validate(value, path)
+      except TypeError:
+        continue
+      return
+    raise TypeError(ERR_INVALID_TYPE.format(path=path, expected=name, actual=type(value).__name__))
+
+  # Only optional values like `int | None` have a known type. An empty variable is None for them
+  convert = None
+  if len(non_null) == 1 and len(options) == 2 and non_null[0].convert is not None:  # noqa: PLR2004 a type and None
+    inner = non_null[0].convert
+
+    def convert(value: str) -> object:
+      return None if not value else inner(value)
+
+  fields = non_null[0].fields if len(non_null) == 1 else None
+  items = non_null[0].items if len(non_null) == 1 else None
+  return _Node(name, validate, convert, fields, items)
+
+
+def _make_isinstance_check(
+  name: str,
+  tp: type | tuple[type, ...],
+  excluded: type | None = None,
+) -> Callable[[object, str], None]:
+  def check(value: object, path: str) -> None:
+    if not isinstance(value, tp) or (excluded is not None and isinstance(value, excluded)):
+      raise TypeError(ERR_INVALID_TYPE.format(path=path or "<root>", expected=name, actual=type(value).__name__))
+
+  return check
+
+
+def _convert_bool(value: str) -> bool:
+  lowered = value.lower()
+  if lowered in ENV_TRUE_VALUES:
+    return True
+  if lowered in ENV_FALSE_VALUES:
+    return False
+  raise ValueError(value)
+
+
+def _convert_str(value: str) -> str:
+  # Quotes are removed in the same way as when the type is guessed
+  if len(value) > 1 and value[0] == value[-1] and value[0] in ("'", '"'):
+    return value[1:-1]
+  return value
+
+
+# Factories of nodes for types which are converted from environment variables
+_SCALARS: dict[object, Callable[[], _Node]] = {
+  type(None): lambda: _Node("None", _make_isinstance_check("None", type(None))),
+  bool: lambda: _Node("bool", _make_isinstance_check("bool", bool), _convert_bool),
+  # bool is a subclass of int, but it's not a number in configuration
+  int: lambda: _Node("int", _make_isinstance_check("int", int, bool), int),
+  float: lambda: _Node("float", _make_isinstance_check("float", (int, float), bool), float),
+  str: lambda: _Node("str", _make_isinstance_check("str", str), _convert_str),
+}
+
+
+def _join(path: str, key: object) -> str:
+  return f"{path}.{key}" if path else str(key)
@@ -0,0 +1,165 @@
+import logging
+import mmap
+import os
+import os.path
+import pickle
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+from configtpl.main import ConfigTpl
+from configtpl.manifest import BuildManifest, manifest_record_manifest, manifest_scope
+from configtpl.result_cache import ResultCache
+from configtpl.utils.dicts import dict_thaw
+from configtpl.utils.fs import fs_hash_file, fs_write_atomic
+
+log = logging.getLogger(__name__)
+
+# A snapshot file is the magic bytes, the size of header, the header and the configuration, both pickled
+SNAPSHOT_MAGIC = b"CONFIGTPL-SNAPSHOT-1\n"
+_HEADER_SIZE = struct.Struct("<Q")
+
+ERR_NONDETERMINISTIC = (
+  "The configuration uses nondeterministic globals ({names}), so a snapshot of it might be outdated unnoticed. "
+  "Pass allow_nondeterministic=True to compile it anyway"
+)
+ERR_INVALID_SNAPSHOT = "File '{path}' is not a configuration snapshot"
+
+
+@dataclass
+class _SnapshotHeader:
+  """
+  Args:
+      key (str | None): a digest of builder settings, paths and context, see `_get_key`
+      manifest (BuildManifest): inputs of the build
+      signatures (dict[str, tuple[int, int] | None]): modification times and sizes of templates and files
+        of manifest. If they are unchanged, the digests of files are not computed at startup
+  """
+
+  key: str | None
+  manifest: BuildManifest
+  signatures: dict[str, tuple[int, int] | None]
+
+
+def snapshot_compile(
+  builder: ConfigTpl,
+  paths: list[str],
+  target: str | Path,
+  ctx: dict | None = None,
+  *,
+  allow_nondeterministic: bool = False,
+) -> BuildManifest:
+  """
+  Builds configuration from files and writes it into a snapshot file, which is loaded by `snapshot_load`.
+  The snapshot keeps the configuration without environment variables with prefix and without overrides,
+  since they are applied on load. It also keeps a manifest of inputs to detect outdated snapshots.
+  Returns the manifest.
+
+  Args:
+      builder (ConfigTpl): a builder which renders the files
+      paths (list[str]): paths to configuration files, same as in `ConfigTpl.build_from_files`
+      target (str | Path): a path of snapshot file
+      ctx (dict | None): additional rendering context which is NOT injected into configuration
+      allow_nondeterministic (bool): if False, ValueError is raised for configurations which use
+        nondeterministic globals (`uuid`) or run commands, since their changes cannot be detected
+  """
+  with manifest_scope() as manifest, builder.cmd_runner.build_scope():
+    cfg = dict_thaw(builder._load_files(paths, ctx))  # noqa: SLF001 builder internals
+  nondeterministic = manifest.nondeterministic | ({"cmd"} if manifest.commands else set())
+  if nondeterministic and not allow_nondeterministic:
+    raise ValueError(ERR_NONDETERMINISTIC.format(names=", ".join(sorted(nondeterministic))))
+
+  signatures = {p: _get_signature(p) for p in (*manifest.templates, *manifest.files)}
+  header = pickle.dumps(_SnapshotHeader(_get_key(builder, paths, ctx), manifest, signatures), pickle.HIGHEST_PROTOCOL)
+  data = pickle.dumps(cfg, pickle.HIGHEST_PROTOCOL)
+  fs_write_atomic(target, b"".join((SNAPSHOT_MAGIC, _HEADER_SIZE.pack(len(header)), header, data)))
+  return manifest
+
+
+def snapshot_load(
+  builder: ConfigTpl,
+  paths: list[str],
+  source: str | Path,
+  overrides: dict | None = None,
+  ctx: dict | None = None,
+) -> dict:
+  """
+  Loads configuration from a snapshot written by `snapshot_compile` and applies environment variables
+  with prefix and overrides to it, so the result is the same as of `ConfigTpl.build_from_files`.
+
+  The configuration is built from files instead if the snapshot is missing or invalid, or if it's outdated:
+  the builder settings, paths or context differ from the ones used for compilation, or any template, file
+  or environment variable read by templates has changed.
+
+  Args:
+      builder (ConfigTpl): a builder which renders the files if snapshot cannot be used
+      paths (list[str]): paths to configuration files, same as in `ConfigTpl.build_from_files`
+      source (str | Path): a path of snapshot file
+      overrides (dict | None): Overrides are applied at the very end stage after all templates are rendered
+      ctx (dict | None): additional rendering context which is NOT injected into configuration
+  """
+  try:
+    cfg = _read_snapshot(builder, paths, source, ctx)
+  except (OSError, ValueError, struct.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+    log.warning("Cannot load configuration snapshot '%s': %s", source, e)
+    cfg = None
+
+  if cfg is None:
+    return builder.build_from_files(paths, overrides, ctx)
+  return builder._finalize_cfg(cfg, overrides)  # noqa: SLF001 builder internals
+
+
+def _read_snapshot(builder: ConfigTpl, paths: list[str], source: str | Path, ctx: dict | None) -> dict | None:
+  """
+  Returns the configuration from snapshot or None if the snapshot is outdated
+  """
+  with Path(source).open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+    if m[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+      raise ValueError(ERR_INVALID_SNAPSHOT.format(path=source))
+    offset = len(SNAPSHOT_MAGIC) + _HEADER_SIZE.size
+    (header_size,) = _HEADER_SIZE.unpack_from(m, len(SNAPSHOT_MAGIC))
+    # S301: snapshots are trusted, same as configuration files
+    header: _SnapshotHeader = pickle.loads(m[offset : offset + header_size])  # noqa: S301
+    if not _is_up_to_date(header, builder, paths, ctx):
+      return None
+    with memoryview(m) as data:
+      cfg = pickle.loads(data[offset + header_size :])  # noqa: S301
+  manifest_record_manifest(header.manifest)
+  return cfg
+
+
+def _is_up_to_date(header: _SnapshotHeader, builder: ConfigTpl, paths: list[str], ctx: dict | None) -> bool:
+  if header.key is None or header.key != _get_key(builder, paths, ctx):
+    return False
+  if not header.manifest.is_env_up_to_date(os.environ):
+    return False
+  for path, digest in (*header.manifest.templates.items(), *header.manifest.files.items()):
+    signature = header.signatures.get(path)
+    if (signature is None or signature != _get_signature(path)) and fs_hash_file(path) != digest:
+      return False
+  return True
+
+
+def _get_key(builder: ConfigTpl, paths: list[str], ctx: dict | None) -> str | None:
+  """
+  Returns a digest of inputs which are known before the build, except environment variables with prefix
+  and overrides, which are applied on load
+  """
+  return ResultCache.make_key(
+    builder.jinja_env_factory.get_fingerprint(),
+    builder.parser.name,
+    sorted((ext, p.name) for ext, p in builder.parsers_by_extension.items()),
+    builder.merge_list_strategy,
+    builder.defaults,
+    str(Path.cwd()),
+    [os.path.realpath(p) for p in paths],
+    ctx,
+  )
+
+
+def _get_signature(path: str) -> tuple[int, int] | None:
+  try:
+    stat = Path(path).stat()
+  except OSError:
+    return None
+  return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,175 @@
+import functools
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+from typing import Protocol
+
+STAGE_COMPILE = "compile"
+STAGE_RENDER = "render"
+STAGE_PARSE = "parse"
+STAGE_MERGE = "merge"
+STAGE_ENV = "env"
+STAGE_VALIDATE = "validate"
+
+
+class BuildHooks(Protocol):
+  """
+  Receives measurements of configuration builds. See `BuildStats` for an implementation which aggregates them.
+  Hooks are called from the thread which runs the build.
+  """
+
+  def on_stage(self, stage: str, path: str | None, duration: float) -> None:
+    """
+    Is called after each stage of build.
+
+    Args:
+        stage (str): one of STAGE_* constants
+        path (str | None): a path of configuration file or "<string>" for templates rendered from string.
+          None for the stages which are not related to a single file
+        duration (float): duration of stage in seconds
+    """
+
+  def on_render(self, path: str, size: int) -> None:
+    """
+    Is called after a template is rendered with the size of rendered text in bytes
+    """
+
+  def on_global_call(self, name: str, duration: float) -> None:
+    """
+    Is called after each call of a Jinja global function, e.g. `cmd` or `env`
+    """
+
+
+@dataclass
+class TimingStats:
+  """
+  Aggregated durations of repeated operations.
+
+  Args:
+      count (int): number of operations
+      total (float): total duration in seconds
+      max (float): the longest duration in seconds
+  """
+
+  count: int = 0
+  total: float = 0.0
+  max: float = 0.0
+
+  def add(self, duration: float) -> None:
+    self.count += 1
+    self.total += duration
+    self.max = max(self.max, duration)
+
+
+@dataclass
+class BuildStatsSnapshot:
+  """
+  Measurements collected by `BuildStats`.
+
+  Args:
+      stages (dict[str, TimingStats]): durations of build stages. Number of merge operations is `stages["merge"].count`
+      files (dict[str, dict[str, TimingStats]]): durations of build stages for each configuration file
+      globals (dict[str, TimingStats]): calls of Jinja global functions
+      bytes_rendered (int): total size of rendered templates
+  """
+
+  stages: dict[str, TimingStats] = field(default_factory=dict)
+  files: dict[str, dict[str, TimingStats]] = field(default_factory=dict)
+  globals: dict[str, TimingStats] = field(default_factory=dict)
+  bytes_rendered: int = 0
+
+
+class BuildStats:
+  def __init__(self) -> None:
+    """
+    Build hooks which aggregate the measurements of all builds in memory.
+    Call `snapshot` to read them, e.g. to export them into a metrics system, and `reset` to start over.
+    """
+    self._data = BuildStatsSnapshot()
+    self._lock = threading.Lock()
+
+  def on_stage(self, stage: str, path: str | None, duration: float) -> None:
+    with self._lock:
+      self._data.stages.setdefault(stage, TimingStats()).add(duration)
+      if path is not None:
+        self._data.files.setdefault(path, {}).setdefault(stage, TimingStats()).add(duration)
+
+  def on_render(self, path: str, size: int) -> None:  # noqa: ARG002 the path is a part of interface
+    with self._lock:
+      self._data.bytes_rendered += size
+
+  def on_global_call(self, name: str, duration: float) -> None:
+    with self._lock:
+      self._data.globals.setdefault(name, TimingStats()).add(duration)
+
+  def snapshot(self) -> BuildStatsSnapshot:
+    """
+    Returns a copy of collected measurements
+    """
+    with self._lock:
+      return BuildStatsSnapshot(
+        stages={k: replace(v) for k, v in self._data.stages.items()},
+        files={path: {k: replace(v) for k, v in stages.items()} for path, stages in self._data.files.items()},
+        globals={k: replace(v) for k, v in self._data.globals.items()},
+        bytes_rendered=self._data.bytes_rendered,
+      )
+
+  def reset(self) -> None:
+    with self._lock:
+      self._data = BuildStatsSnapshot()
+
+
+class RecordedHooks:
+  def __init__(self) -> None:
+    """
+    Build hooks which keep the measurements until they are replayed into other hooks.
+    Is used for the work which result might be thrown away, so it's reported only if the result is used.
+    """
+    self._calls: list[tuple[str, tuple]] = []
+
+  def on_stage(self, stage: str, path: str | None, duration: float) -> None:
+    self._calls.append(("on_stage", (stage, path, duration)))
+
+  def on_render(self, path: str, size: int) -> None:
+    self._calls.append(("on_render", (path, size)))
+
+  def on_global_call(self, name: str, duration: float) -> None:
+    self._calls.append(("on_global_call", (name, duration)))
+
+  def replay(self, hooks: BuildHooks) -> None:
+    """
+    Reports the kept measurements into hooks
+    """
+    for name, args in self._calls:
+      getattr(hooks, name)(*args)
+
+
+def stats_instrument_global(name: str, fn: Callable, hooks: BuildHooks) -> Callable:
+  """
+  Wraps a Jinja global function to report the duration of each call into hooks.
+  For coroutine functions, the duration is measured until the coroutine completes.
+  """
+  import inspect  # noqa: PLC0415 imported on first use
+
+  if inspect.iscoroutinefunction(fn):
+
+    @functools.wraps(fn)
+    async def async_wrapper(*args: object, **kwargs: object) -> object:
+      start = time.perf_counter()
+      try:
+        return await fn(*args, **kwargs)
+      finally:
+        hooks.on_global_call(name, time.perf_counter() - start)
+
+    return async_wrapper
+
+  @functools.wraps(fn)
+  def wrapper(*args: object, **kwargs: object) -> object:
+    start = time.perf_counter()
+    try:
+      return fn(*args, **kwargs)
+    finally:
+      hooks.on_global_call(name, time.perf_counter() - start)
+
+  return wrapper
@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass, replace
+
+
+@dataclass
+class CacheStats:
+  """
+  Counters reported by the caches of this library.
+
+  Args:
+      hits (int): number of lookups served from the cache
+      misses (int): number of lookups which were not found in the cache
+      evictions (int): number of entries removed to keep the cache within its limits
+  """
+
+  hits: int = 0
+  misses: int = 0
+  evictions: int = 0
+
+
+class LruCache:
+  def __init__(
+    self,
+    max_entries: int,
+    on_evict: Callable[[Hashable, object], None] | None = None,
+    max_size: int | None = None,
+  ):
+    """
+    A thread-safe in-memory cache which evicts the least recently used entries.
+
+    Args:
+        max_entries (int): the maximum number of entries to keep
+        on_evict (Callable[[Hashable, object], None] | None): is called with the key and value of each evicted entry
+        max_size (int | None): the maximum total size of entries, as it's passed to `put`.
+          Entries larger than this size are not kept. None means that only the number of entries is limited
+    """
+    self.max_entries = max_entries
+    self.max_size = max_size
+    self.on_evict = on_evict
+    self._entries: OrderedDict[Hashable, object] = OrderedDict()
+    self._sizes: dict[Hashable, int] = {}
+    self._size = 0
+    self._stats = CacheStats()
+    self._lock = threading.Lock()
+
+  @property
+  def stats(self) -> CacheStats:
+    """
+    Returns a snapshot of hit, miss and eviction counters
+    """
+    with self._lock:
+      return replace(self._stats)
+
+  def get(self, key: Hashable, default: object = None) -> object:
+    with self._lock:
+      if key not in self._entries:
+        self._stats.misses += 1
+        return default
+      self._entries.move_to_end(key)
+      self._stats.hits += 1
+      return self._entries[key]
+
+  def put(self, key: Hashable, value: object, size: int = 0) -> None:
+    """
+    Adds an entry of given size, e.g. the length of cached text. The size is used only if `max_size` is set
+    """
+    evicted = []
+    with self._lock:
+      self._remove(key)
+      if self.max_size is not None and size > self.max_size:
+        return
+      self._entries[key] = value
+      self._sizes[key] = size
+      self._size += size
+      while len(self._entries) > self.max_entries or (self.max_size is not None and self._size > self.max_size):
+        (k, v) = self._entries.popitem(last=False)
+        self._size -= self._sizes.pop(k)
+        evicted.append((k, v))
+        self._stats.evictions += 1
+    # The callback is called without lock, so it might use the cache
+    if self.on_evict is not None:
+      for k, v in evicted:
+        self.on_evict(k, v)
+
+  def remove(self, key: Hashable) -> None:
+    """
+    Removes the entry of key, if it exists. Removed entries are not counted as evictions
+    """
+    with self._lock:
+      self._remove(key)
+
+  def remove_if(self, predicate: Callable[[Hashable, object], bool]) -> None:
+    """
+    Removes the entries for which predicate returns True. Removed entries are not counted as evictions
+    """
+    with self._lock:
+      for k in [k for k, v in self._entries.items() if predicate(k, v)]:
+        self._remove(k)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self._sizes.clear()
+      self._size = 0
+
+  @property
+  def size(self) -> int:
+    """
+    Returns the total size of entries
+    """
+    return self._size
+
+  def _remove(self, key: Hashable) -> None:
+    if key in self._entries:
+      del self._entries[key]
+      self._size -= self._sizes.pop(key)
+
+  def __len__(self) -> int:
+    return len(self._entries)
@@ -1,26 +1,134 @@
-def dict_deep_merge(*dicts: dict[str, object]) -> dict[str, object]:
+from itertools import chain
+
+LIST_STRATEGY_REPLACE = "replace"
+LIST_STRATEGY_APPEND = "append"
+LIST_STRATEGY_UNIQUE = "unique"
+LIST_STRATEGIES = (LIST_STRATEGY_REPLACE, LIST_STRATEGY_APPEND, LIST_STRATEGY_UNIQUE)
+
+ERR_UNKNOWN_LIST_STRATEGY = "Unknown list strategy '{strategy}'. Supported strategies: {strategies}"
+
+
+class FrozenDict(dict):
+  """
+  A read-only dictionary. All methods which modify the dictionary raise TypeError.
+  """
+
+  __slots__ = ()
+
+  def _readonly(self, *_args: object, **_kwargs: object) -> None:
+    msg = "The configuration is read-only"
+    raise TypeError(msg)
+
+  __setitem__ = __delitem__ = __ior__ = _readonly
+  clear = pop = popitem = setdefault = update = _readonly
+
+  def __reduce__(self) -> tuple:
+    return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+  """
+  A read-only list. All methods which modify the list raise TypeError.
   """
-  Deep merge multiple dictionaries recursively.
+
+  __slots__ = ()
+
+  def _readonly(self, *_args: object, **_kwargs: object) -> None:
+    msg = "The configuration is read-only"
+    raise TypeError(msg)
+
+  __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+  append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+  def __reduce__(self) -> tuple:
+    return (FrozenList, (list(self),))
+
+
+def dict_deep_merge(
+  *dicts: dict[str, object],
+  list_strategy: str = LIST_STRATEGY_REPLACE,
+  frozen: bool = False,
+) -> dict[str, object]:
+  """
+  Deep merge multiple dictionaries.
   Values in later dictionaries overwrite those in earlier ones.
   This function does not update any dictionary by reference.
+
+  All dictionaries are merged in a single pass without recursion, so the depth of dictionaries is not limited.
+  A subtree which comes from a single dictionary is reused in the result as is instead of being copied,
+  unless the lists are merged with "unique" strategy: then the duplicates are removed from all lists,
+  including the ones which come from a single dictionary.
+
+  Args:
+      dicts (dict): dictionaries to merge
+      list_strategy (str): how the lists under the same key are merged:
+        "replace" - the last list is taken (default),
+        "append" - the lists are concatenated,
+        "unique" - the lists are concatenated, duplicated items are skipped
+      frozen (bool): if True, the result is read-only (see `dict_freeze`). Read-only subtrees of inputs are reused,
+        so the result shares structure with inputs safely
   """
+  if list_strategy not in LIST_STRATEGIES:
+    raise ValueError(ERR_UNKNOWN_LIST_STRATEGY.format(strategy=list_strategy, strategies=", ".join(LIST_STRATEGIES)))
+  merge_lists = list_strategy != LIST_STRATEGY_REPLACE
+  # Single dictionaries and lists are copied too, so their lists are deduplicated
+  merge_single = list_strategy == LIST_STRATEGY_UNIQUE
 
-  def merge_two_dicts(d1: dict[str, object], d2: dict[str, object]) -> dict[str, object]:
-    merged = d1.copy()
-    for key, value in d2.items():
-      if key in merged and isinstance(merged[key], dict) and isinstance(value, dict):
-        merged[key] = merge_two_dicts(merged[key], value)
-      else:
-        merged[key] = value
-    return merged
+  result = FrozenDict() if frozen else {}
+  # Each item is a target dictionary and a list of source dictionaries which are merged into it
+  stack: list[tuple[dict, list[dict]]] = [(result, list(dicts))]
+  while stack:
+    target, sources = stack.pop()
+
+    # For each key, collect the trailing values which are merged together: a sequence of dictionaries
+    # (or lists, if they are not replaced). Any other value discards all previous ones.
+    runs: dict[object, list] = {}
+    for source in sources:
+      for key, value in source.items():
+        run = runs.get(key)
+        if run is not None and (
+          (isinstance(value, dict) and isinstance(run[-1], dict))
+          or (merge_lists and isinstance(value, list) and isinstance(run[-1], list))
+        ):
+          run.append(value)
+        else:
+          runs[key] = [value]
 
-  result = {}
-  for d in dicts:
-    result = merge_two_dicts(result, d)
+    for key, run in runs.items():
+      if len(run) == 1 and not (merge_single and isinstance(run[0], (dict, list))):
+        value = dict_freeze(run[0]) if frozen else run[0]
+      elif isinstance(run[0], dict):
+        value = FrozenDict() if frozen else {}
+        stack.append((value, run))
+      else:
+        items = chain.from_iterable(run)
+        if list_strategy == LIST_STRATEGY_UNIQUE:
+          items = _unique(items)
+        value = FrozenList(dict_freeze(item) for item in items) if frozen else list(items)
+      # Bypasses the read-only protection of target which is being built
+      dict.__setitem__(target, key, value)
 
   return result
 
 
+def dict_freeze(value: object) -> object:
+  """
+  Converts dictionaries and lists into read-only ones recursively.
+  Values which are already read-only are returned as is, so the frozen parts of structure are shared, not copied.
+  Subclasses of dictionaries and lists, e.g. `defaultdict` or user classes with methods, are returned as is too,
+  since their behavior would be lost in a copy.
+  """
+  return _convert(value, dict_type=FrozenDict, list_type=FrozenList, keep_frozen=True)
+
+
+def dict_thaw(value: object) -> object:
+  """
+  Converts dictionaries and lists (including read-only ones) into new regular dictionaries and lists recursively.
+  Other subclasses of dictionaries and lists are returned as is, see `dict_freeze`
+  """
+  return _convert(value, dict_type=dict, list_type=list, keep_frozen=False)
+
+
 def dict_init_dicts_from_list(*ds: dict | None) -> tuple[dict]:
   """
   Initializes dictionaries.
@@ -28,3 +136,69 @@ def dict_init_dicts_from_list(*ds: dict | None) -> tuple[dict]:
   Falls back to empty dict if argument is None.
   """
   return tuple(d if d is not None else {} for d in ds)
+
+
+def dict_register_yaml_representers() -> None:
+  """
+  Registers representers of read-only dictionaries and lists in PyYAML dumpers, so they can be dumped
+  like the regular ones, e.g. by `yaml.safe_dump` used as a filter of templates. Imports PyYAML
+  """
+  import yaml  # noqa: PLC0415 imported on first use
+
+  dumpers = [yaml.SafeDumper, yaml.Dumper]
+  dumpers.extend(getattr(yaml, name) for name in ("CSafeDumper", "CDumper") if hasattr(yaml, name))
+  for dumper in dumpers:
+    if FrozenDict not in dumper.yaml_representers:
+      dumper.add_representer(FrozenDict, yaml.representer.SafeRepresenter.represent_dict)
+      dumper.add_representer(FrozenList, yaml.representer.SafeRepresenter.represent_list)
+
+
+def _convert(value: object, *, dict_type: type[dict], list_type: type[list], keep_frozen: bool) -> object:
+  """
+  Copies the nested dictionaries and lists into the given types without recursion.
+  Only the objects of exact types `dict` and `list` (and read-only ones, unless `keep_frozen` is True) are copied.
+  Objects referenced multiple times (including circular references) are copied once.
+  """
+  types = (dict, list) if keep_frozen else (dict, list, FrozenDict, FrozenList)
+
+  def make(v: object) -> object:
+    if type(v) not in types:
+      return v
+    if id(v) in copies:
+      return copies[id(v)]
+    copy = dict_type() if isinstance(v, dict) else list_type()
+    copies[id(v)] = copy
+    stack.append((copy, v))
+    return copy
+
+  copies: dict[int, object] = {}
+  stack: list[tuple[object, object]] = []
+  result = make(value)
+  while stack:
+    target, source = stack.pop()
+    # The containers are filled with base class methods to bypass the read-only protection
+    if isinstance(source, dict):
+      for k, v in source.items():
+        dict.__setitem__(target, k, make(v))
+    else:
+      for v in source:
+        list.append(target, make(v))
+  return result
+
+
+def _unique(items: object) -> list:
+  """
+  Returns items without duplicates, preserving the order. Supports unhashable items.
+  """
+  result = []
+  seen = set()
+  for item in items:
+    try:
+      if item in seen:
+        continue
+      seen.add(item)
+    except TypeError:
+      if item in result:
+        continue
+    result.append(item)
+  return result
@@ -0,0 +1,98 @@
+import hashlib
+import mmap
+import os
+from pathlib import Path
+
+# Size of chunks in which files are read when they are hashed
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def fs_write_atomic(path: str | Path, data: bytes) -> None:
+  """
+  Writes data into file atomically.
+  The data is written into a temporary file in the same directory first and then moved to the target path,
+  so concurrent readers (including other processes) see either the old or the new file, but never a partial one.
+  """
+  import tempfile  # noqa: PLC0415 imported on first use
+
+  path = Path(path)
+  fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+  try:
+    with os.fdopen(fd, "wb") as f:
+      f.write(data)
+    Path(tmp_path).replace(path)
+  except BaseException:
+    Path(tmp_path).unlink(missing_ok=True)
+    raise
+
+
+def fs_hash_text(text: str) -> str:
+  """
+  Returns a SHA-256 digest of text. Used to detect the changes in files and templates.
+  """
+  return hashlib.sha256(text.encode()).hexdigest()
+
+
+def fs_hash_file(path: str | Path) -> str | None:
+  """
+  Returns a SHA-256 digest of text file contents or None if file cannot be read.
+  The file is read in text mode, so digest matches the one of text returned by `fs_hash_text`.
+  Binary files get a digest of their bytes with "bytes:" prefix, so their changes are detected too.
+  The file is read in chunks, so large files are not loaded into memory.
+  """
+  digest = hashlib.sha256()
+  try:
+    with Path(path).open(encoding="utf-8") as f:
+      while chunk := f.read(HASH_CHUNK_SIZE):
+        digest.update(chunk.encode())
+  except UnicodeDecodeError:
+    pass
+  except OSError:
+    return None
+  else:
+    return digest.hexdigest()
+
+  try:
+    return f"bytes:{fs_digest_file(path)}"
+  except OSError:
+    return None
+
+
+def fs_digest_file(path: str | Path, algorithm: str = "sha256", mmap_threshold: int | None = None) -> str:
+  """
+  Returns a digest of file bytes. The file is not loaded into memory: it's read in chunks
+  or, if its size is at least `mmap_threshold` bytes, hashed directly from memory-mapped pages.
+
+  Args:
+      path (str | Path): a path to file
+      algorithm (str): a name of `hashlib` algorithm
+      mmap_threshold (int | None): a minimal size of file to map into memory. Files are never mapped if None
+  """
+  with Path(path).open("rb") as f:
+    size = os.fstat(f.fileno()).st_size
+    if mmap_threshold is None or size == 0 or size < mmap_threshold:
+      return hashlib.file_digest(f, algorithm).hexdigest()
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+      return hashlib.new(algorithm, m).hexdigest()
+
+
+def fs_read_text(path: str | Path, mmap_threshold: int | None = None) -> str:
+  """
+  Reads a UTF-8 text file with universal newlines, same as `Path.read_text`.
+  If file size is at least `mmap_threshold` bytes, the text is decoded directly from memory-mapped pages,
+  which avoids an intermediate copy of file bytes.
+
+  Args:
+      path (str | Path): a path to file
+      mmap_threshold (int | None): a minimal size of file to map into memory. Files are never mapped if None
+  """
+  with Path(path).open("rb") as f:
+    size = os.fstat(f.fileno()).st_size
+    if mmap_threshold is None or size == 0 or size < mmap_threshold:
+      text = f.read().decode("utf-8")
+    else:
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        text = str(m, "utf-8")
+  if "\r" in text:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+  return text
@@ -0,0 +1,57 @@
+from collections.abc import Iterable
+
+
+class ChunkReader:
+  def __init__(self, chunks: Iterable[str], *, count_bytes: bool = False):
+    """
+    A read-only text stream over chunks of text, e.g. the output of `jinja2.Template.generate`.
+    Chunks are taken from the iterable only when the reader needs them, so the whole text is never kept in memory.
+    It's accepted by parsers which read files, e.g. `yaml.load`.
+
+    Args:
+        chunks (Iterable[str]): chunks of text
+        count_bytes (bool): if True, the size of text read so far in UTF-8 is counted into `bytes_read`
+    """
+    self._chunks = iter(chunks)
+    self._count_bytes = count_bytes
+    # The current chunk and the position of its unread part
+    self._chunk = ""
+    self._offset = 0
+    self.bytes_read = 0
+    self.name = "<stream>"
+
+  def readable(self) -> bool:
+    return True
+
+  def read(self, size: int | None = -1) -> str:
+    """
+    Returns up to `size` characters, or the rest of text if `size` is negative or None.
+    An empty string means the end of text.
+    """
+    parts = []
+    remaining = -1 if size is None or size < 0 else size
+    while remaining != 0:
+      if self._offset >= len(self._chunk):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+          break
+        if self._count_bytes:
+          self.bytes_read += len(chunk.encode())
+        (self._chunk, self._offset) = (chunk, 0)
+        continue
+      # Large chunks are sliced from the offset, so they are not copied again for each read
+      end = len(self._chunk) if remaining < 0 else min(len(self._chunk), self._offset + remaining)
+      parts.append(self._chunk[self._offset : end])
+      if remaining > 0:
+        remaining -= end - self._offset
+      self._offset = end
+    return "".join(parts)
+
+  def close(self) -> None:
+    """
+    Stops reading the chunks. Closes the iterable if it's a generator
+    """
+    close = getattr(self._chunks, "close", None)
+    if close is not None:
+      close()
+    (self._chunk, self._offset) = ("", 0)
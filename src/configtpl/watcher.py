@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from types import TracebackType
+
+from .incremental import IncrementalBuilder
+from .main import ConfigTpl
+from .manifest import BuildManifest, manifest_scope
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 0.2
+
+log = logging.getLogger(__name__)
+
+# A signature of file state: modification time, inode and size. None if file doesn't exist
+FileSignature = tuple[int, int, int] | None
+
+
+class ConfigWatcher:
+  def __init__(  # noqa: PLR0913 too many arguments
+    self,
+    builder: ConfigTpl,
+    paths: list[str],
+    overrides: dict | None = None,
+    ctx: dict | None = None,
+    *,
+    interval: float = DEFAULT_INTERVAL,
+    debounce: float = DEFAULT_DEBOUNCE,
+    on_error: Callable[[Exception], None] | None = None,
+  ):
+    """
+    Keeps configuration up to date with the files it's built from.
+
+    The configuration is built in constructor. After `start` is called, a background thread polls
+    all inputs of the build (templates, included templates, files read by `file` global, environment variables)
+    and rebuilds the configuration when they change. The new configuration replaces the current one
+    in a single assignment, so readers of `config` never block and never see a partially built configuration.
+    If rebuild fails, the last successfully built configuration is kept.
+    `check` might be called while the background thread runs: checks and rebuilds are serialized.
+
+    Args:
+        builder (ConfigTpl): a builder which renders the files
+        paths (list[str]): paths to configuration files, same as in `ConfigTpl.build_from_files`
+        overrides (dict | None): Overrides are applied at the very end stage after all templates are rendered
+        ctx (dict | None): additional rendering context which is NOT injected into configuration
+        interval (float): how often the inputs are checked, in seconds
+        debounce (float): the inputs must stay unchanged for this time before rebuild, in seconds.
+          It prevents rebuilds in the middle of a burst of edits
+        on_error (Callable[[Exception], None] | None): is called when rebuild fails
+    """
+    self.interval = interval
+    self.debounce = debounce
+    self.on_error = on_error
+    self._builder = IncrementalBuilder(builder, paths, overrides=overrides, ctx=ctx)
+    self._subscribers: list[Callable[[dict], None]] = []
+    self._subscribers_lock = threading.Lock()
+    # Serializes checks and rebuilds of `check` and the background thread. It's reentrant,
+    # so subscribers might call `check`
+    self._check_lock = threading.RLock()
+    self._stop_event = threading.Event()
+    self._thread: threading.Thread | None = None
+
+    self._config, self._manifest = self._build()
+    self._signatures = self._get_signatures(self._manifest)
+    # Values of environment variables seen by the last build, successful or not, see `_get_env_state`
+    self._env_state = self._manifest
+
+  @property
+  def config(self) -> dict:
+    """
+    Returns the current configuration. It's shared by all readers and must not be modified.
+    """
+    return self._config
+
+  @property
+  def manifest(self) -> BuildManifest:
+    """
+    Returns the manifest of the current configuration
+    """
+    return self._manifest
+
+  def subscribe(self, callback: Callable[[dict], None]) -> Callable[[], None]:
+    """
+    Registers a callback which is called with the new configuration after each successful rebuild.
+    Callbacks are called from the watcher thread.
+
+    Returns:
+        Callable[[], None]: a function which unregisters the callback
+    """
+    with self._subscribers_lock:
+      self._subscribers.append(callback)
+
+    def unsubscribe() -> None:
+      with self._subscribers_lock:
+        self._subscribers.remove(callback)
+
+    return unsubscribe
+
+  def start(self) -> None:
+    """
+    Starts watching in a background thread
+    """
+    if self._thread is not None:
+      return
+    self._stop_event.clear()
+    self._thread = threading.Thread(target=self._run, name="configtpl-watcher", daemon=True)
+    self._thread.start()
+
+  def stop(self) -> None:
+    """
+    Stops watching and waits for the background thread to finish
+    """
+    if self._thread is None:
+      return
+    self._stop_event.set()
+    self._thread.join()
+    self._thread = None
+
+  def check(self) -> bool:
+    """
+    Checks the inputs once and rebuilds the configuration if they changed. Debouncing is not applied.
+
+    Returns:
+        bool: True if the configuration was rebuilt
+    """
+    with self._check_lock:
+      signatures = self._get_signatures(self._manifest)
+      if self._is_up_to_date(signatures):
+        return False
+      return self._rebuild(signatures)
+
+  def __enter__(self) -> "ConfigWatcher":
+    self.start()
+    return self
+
+  def __exit__(
+    self,
+    exc_type: type[BaseException] | None,
+    exc_value: BaseException | None,
+    traceback: TracebackType | None,
+  ) -> None:
+    self.stop()
+
+  def _is_up_to_date(self, signatures: dict[str, FileSignature]) -> bool:
+    environ = self._builder.builder.env_snapshot.environ
+    return signatures == self._signatures and self._env_state.is_env_up_to_date(os.environ, environ)
+
+  def _run(self) -> None:
+    while not self._stop_event.wait(self.interval):
+      signatures = self._get_signatures(self._manifest)
+      if self._is_up_to_date(signatures):
+        continue
+
+      # Wait until the burst of changes is over
+      while not self._stop_event.wait(self.debounce):
+        latest = self._get_signatures(self._manifest)
+        if latest == signatures:
+          break
+        signatures = latest
+      else:
+        return
+
+      # The inputs are checked again: the configuration might be rebuilt by `check` in the meantime
+      self.check()
+
+  def _rebuild(self, signatures: dict[str, FileSignature]) -> bool:
+    try:
+      config, manifest = self._build()
+    except Exception as e:
+      log.exception("Failed to rebuild the configuration. The last built configuration is kept.")
+      # The failed inputs are not rebuilt again until they change
+      self._signatures = signatures
+      self._env_state = self._get_env_state(self._manifest)
+      if self.on_error is not None:
+        self.on_error(e)
+      return False
+
+    self._config, self._manifest = config, manifest
+    self._signatures = self._get_signatures(manifest)
+    self._env_state = manifest
+    with self._subscribers_lock:
+      subscribers = list(self._subscribers)
+    for callback in subscribers:
+      try:
+        callback(config)
+      except Exception:
+        log.exception("Configuration subscriber failed")
+    return True
+
+  def _build(self) -> tuple[dict, BuildManifest]:
+    with manifest_scope() as manifest:
+      config = self._builder.build()
+    return config, manifest
+
+  def _get_env_state(self, manifest: BuildManifest) -> BuildManifest:
+    """
+    Returns a manifest of the current values of environment variables which are recorded in the given manifest
+    """
+    environ = self._builder.builder.env_snapshot.environ
+    return BuildManifest(
+      env_vars={name: os.environ.get(name) for name in manifest.env_vars},
+      env_prefix_vars={
+        prefix: {k: v for k, v in environ.items() if k.startswith(prefix)} for prefix in manifest.env_prefix_vars
+      },
+    )
+
+  def _get_signatures(self, manifest: BuildManifest) -> dict[str, FileSignature]:
+    return {path: _get_file_signature(path) for path in (*manifest.templates, *manifest.files)}
+
+
+def _get_file_signature(path: str) -> FileSignature:
+  try:
+    st = Path(path).stat()
+  except OSError:
+    return None
+  return (st.st_mtime_ns, st.st_ino, st.st_size)
@@ -1,5 +1,7 @@
 import unittest
 
+import pytest
+
 from configtpl.main import ConfigTpl
 
 
@@ -35,6 +37,12 @@ class TestCombinedCfg(unittest.TestCase):
       "test": "test_val",  # from env var because of configured env_var_prefix
     }
 
+  def test_recursion(self) -> None:
+    with pytest.raises(ValueError, match="Recursive loading of configuration files") as exc_info:
+      ConfigTpl().build_from_files(["config_wrong_01_recursion_1.cfg"])
+
+    assert "config_wrong_01_recursion_1.cfg -> " in str(exc_info.value)
+
 
 if __name__ == "__main__":
   unittest.main()
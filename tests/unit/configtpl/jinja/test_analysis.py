@@ -0,0 +1,62 @@
+import jinja2
+from temp_dir_case import TempDirTestCase
+
+from configtpl.jinja.analysis import ReadVarsCache, analysis_find_read_vars, analysis_get_inputs
+from configtpl.jinja.filters import jinja_filter_md5
+from configtpl.jinja.globals import jinja_global_cmd
+
+
+class TestAnalysis(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    (self.tmp_dir / "included.j2").write_text("{{ included_var }}")
+    self.env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.tmp_dir), autoescape=False)  # noqa: S701
+
+  def test_find_read_vars(self) -> None:
+    source = '{% set local = 1 %}{{ a.b }} {{ local }} {{ env("X") }}{% include "included.j2" %}'
+
+    assert analysis_find_read_vars(self.env, source) == {"a", "env", "included_var"}
+    assert analysis_find_read_vars(self.env, "{% include name %}") is None
+    assert analysis_find_read_vars(self.env, '{% include "missing.j2" %}') is None
+
+  def test_find_read_vars_functions(self) -> None:
+    assert analysis_find_read_vars(self.env, "{{ range(a) | map('string') | join }}") == {"a"}
+
+    self.env.globals["lookup"] = jinja2.pass_context(lambda context, name: context[name])
+    self.env.filters["plain"] = lambda v: v
+    self.env.tests["plain"] = lambda v: v
+    # A user filter might be called by `map`
+    assert analysis_find_read_vars(self.env, "{{ range(a) | map('string') | join }}") is None
+    assert analysis_find_read_vars(self.env, "{{ lookup('a') }}") is None
+    assert analysis_find_read_vars(self.env, "{{ a | plain }}") is None
+    assert analysis_find_read_vars(self.env, "{{ a is plain }}") is None
+
+  def test_find_read_vars_configtpl_functions(self) -> None:
+    self.env.globals["cmd"] = jinja_global_cmd
+    self.env.filters["md5"] = jinja_filter_md5
+
+    # The globals of configtpl might have side effects, the filters only read their arguments
+    assert analysis_find_read_vars(self.env, "{{ cmd(a) }}") is None
+    assert analysis_find_read_vars(self.env, "{{ a | md5 }}") == {"a"}
+
+  def test_get_inputs(self) -> None:
+    ctx = {"a": 1, "b": 2}
+
+    assert analysis_get_inputs(ctx, frozenset({"a", "c"})) == {"a": 1}
+    assert analysis_get_inputs(ctx, None) is ctx
+
+  def test_read_vars_cache(self) -> None:
+    (self.tmp_dir / "main.j2").write_text('{{ a }}{% include "included.j2" %}')
+    cache = ReadVarsCache()
+
+    assert cache.get(self.env, "main.j2") == {"a", "included_var"}
+    assert cache.get(self.env, "main.j2") == {"a", "included_var"}
+    assert cache.stats.hits == 1
+
+    (self.tmp_dir / "included.j2").write_text("{{ other_var }}")
+    assert cache.get(self.env, "main.j2") == {"a", "other_var"}
+
+    # The entry is outdated when globals are changed
+    self.env.globals["other_var"] = jinja2.pass_context(lambda context: context["a"])
+    self.env.factory_version = 1
+    assert cache.get(self.env, "main.j2") is None
@@ -0,0 +1,67 @@
+from temp_dir_case import TempDirTestCase
+
+from configtpl.jinja.bytecode_cache import JinjaBytecodeCache
+from configtpl.main import ConfigTpl
+
+CONFIG_CONTENTS = """\
+{% set name = "John" %}
+params:
+  user_name: {{ name }}
+"""
+
+
+class TestJinjaBytecodeCache(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.cfg_path = self.tmp_dir / "config.cfg"
+    self.cfg_path.write_text(CONFIG_CONTENTS)
+    self.cache_dir = self.tmp_dir / "cache"
+
+  def test_hit_after_miss(self) -> None:
+    cache = JinjaBytecodeCache(str(self.cache_dir))
+    expected = {"params": {"user_name": "John"}}
+
+    # A new builder has no in-memory templates, so the compiled template is loaded from disk cache
+    assert ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)]) == expected
+    assert ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)]) == expected
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+  def test_source_change_is_miss(self) -> None:
+    cache = JinjaBytecodeCache(str(self.cache_dir))
+    ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)])
+    self.cfg_path.write_text("params: {user_name: Jane}")
+
+    assert ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)]) == {
+      "params": {"user_name": "Jane"},
+    }
+    assert cache.stats.misses == 2
+    assert cache.stats.hits == 0
+
+  def test_env_options_are_part_of_key(self) -> None:
+    cache = JinjaBytecodeCache(str(self.cache_dir))
+    ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)])
+    ConfigTpl(
+      jinja_bytecode_cache=cache,
+      jinja_constructor_args={"trim_blocks": True},
+    ).build_from_files([str(self.cfg_path)])
+
+    assert cache.stats.misses == 2
+    assert len(list(self.cache_dir.iterdir())) == 2
+
+  def test_eviction(self) -> None:
+    cache = JinjaBytecodeCache(str(self.cache_dir), max_size=1)
+    for i in range(3):
+      path = self.tmp_dir / f"config_{i}.cfg"
+      path.write_text(f"value: {i}")
+      ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(path)])
+
+    assert cache.stats.evictions == 3
+    assert list(self.cache_dir.iterdir()) == []
+
+  def test_clear(self) -> None:
+    cache = JinjaBytecodeCache(str(self.cache_dir))
+    ConfigTpl(jinja_bytecode_cache=cache).build_from_files([str(self.cfg_path)])
+    cache.clear()
+
+    assert list(self.cache_dir.iterdir()) == []
@@ -0,0 +1,101 @@
+import subprocess
+from unittest.mock import patch
+
+import jinja2
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.jinja.commands import CommandRunner, commands_find_calls
+from configtpl.main import ConfigTpl
+
+
+class TestCommandRunner(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.counter = self.tmp_dir / "counter"
+    # The command appends a line to the counter file on each run
+    self.cmd = f"echo run >> {self.counter}; echo output"
+
+  def get_runs(self) -> int:
+    return len(self.counter.read_text().splitlines()) if self.counter.exists() else 0
+
+  def write_cmd_layers(self, n: int) -> list[str]:
+    return self.write_layers(*(f'value_{i}: {{{{ cmd("{self.cmd}") | trim }}}}' for i in range(n)))
+
+  def test_run_once_per_build(self) -> None:
+    builder = ConfigTpl()
+    paths = self.write_cmd_layers(3)
+
+    assert builder.build_from_files(paths) == {"value_0": "output", "value_1": "output", "value_2": "output"}
+    assert self.get_runs() == 1
+    builder.build_from_files(paths)
+    assert self.get_runs() == 2
+
+  def test_run_without_scope(self) -> None:
+    runner = CommandRunner()
+
+    assert runner.run(self.cmd) == "output\n"
+    assert runner.run(self.cmd) == "output\n"
+    assert self.get_runs() == 2
+
+  def test_ttl(self) -> None:
+    runner = CommandRunner(ttl=60)
+    builder = ConfigTpl(cmd_runner=runner)
+    paths = self.write_cmd_layers(2)
+
+    builder.build_from_files(paths)
+    builder.build_from_files(paths)
+    assert self.get_runs() == 1
+    assert runner.stats.hits == 1
+
+    runner.clear()
+    builder.build_from_files(paths)
+    assert self.get_runs() == 2
+
+  def test_ttl_expired(self) -> None:
+    runner = CommandRunner(ttl=60)
+    with patch("time.monotonic", return_value=0):
+      runner.run(self.cmd)
+    with patch("time.monotonic", return_value=61):
+      runner.run(self.cmd)
+
+    assert self.get_runs() == 2
+
+  def test_timeout(self) -> None:
+    runner = CommandRunner(timeout=0.1)
+
+    with pytest.raises(subprocess.TimeoutExpired):
+      runner.run("sleep 5")
+
+  def test_error(self) -> None:
+    runner = CommandRunner()
+    with runner.build_scope():
+      runner.start(["exit 1"])
+      with pytest.raises(subprocess.CalledProcessError):
+        runner.run("exit 1")
+    runner.close()
+
+  def test_prefetch(self) -> None:
+    runner = CommandRunner(prefetch=True)
+    builder = ConfigTpl(cmd_runner=runner)
+    paths = self.write_cmd_layers(2)
+
+    with patch.object(runner, "start", wraps=runner.start) as mock_start:
+      cfg = builder.build_from_files(paths)
+
+    mock_start.assert_called_once_with([self.cmd])
+    assert cfg == {"value_0": "output", "value_1": "output"}
+    assert self.get_runs() == 1
+    runner.close()
+
+  def test_find_calls(self) -> None:
+    (self.tmp_dir / "included.j2").write_text('{{ cmd("echo included") }}')
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.tmp_dir), autoescape=False)  # noqa: S701
+    source = """
+a: {{ cmd("echo a") }}
+b: {{ cmd("echo " ~ a) }}
+{% include "included.j2" %}
+{% include "missing.j2" ignore missing %}
+"""
+
+    assert commands_find_calls(env, source) == {"echo a", "echo included"}
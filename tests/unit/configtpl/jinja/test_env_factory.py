@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from temp_dir_case import TempDirTestCase
+
+from configtpl.jinja.env_factory import JinjaEnvFactory
+
+
+class TestJinjaEnvFactory(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    for name in ("a", "b"):
+      (self.tmp_dir / name).mkdir()
+      (self.tmp_dir / name / "main.j2").write_text(f"{name}: {{{{ greet() }}}}")
+
+  def test_reuse(self) -> None:
+    factory = JinjaEnvFactory()
+    d = str(self.tmp_dir / "a")
+    with ThreadPoolExecutor(8) as pool:
+      envs = list(pool.map(lambda _: factory.get_fs_jinja_environment(d), range(32)))
+    assert all(env is envs[0] for env in envs)
+    assert factory.get_fs_jinja_environment(d, is_async=True) is not envs[0]
+    assert factory.environment_stats.misses == 2
+
+  def test_shared_template_cache(self) -> None:
+    factory = JinjaEnvFactory(constructor_args={"cache_size": 1}, globs={"greet": lambda: "hi"})
+    env_a = factory.get_fs_jinja_environment(str(self.tmp_dir / "a"))
+    env_b = factory.get_fs_jinja_environment(str(self.tmp_dir / "b"))
+    assert env_a.cache is env_b.cache
+
+    # Templates with the same name in different directories don't collide
+    assert env_a.get_template("main.j2").render() == "a: hi"
+    assert env_b.get_template("main.j2").render() == "b: hi"
+    assert len(env_a.cache) == 1
+
+  def test_eviction(self) -> None:
+    factory = JinjaEnvFactory(max_environments=1)
+    env_a = factory.get_fs_jinja_environment(str(self.tmp_dir / "a"))
+    factory.get_fs_jinja_environment(str(self.tmp_dir / "b"))
+    assert factory.get_fs_jinja_environment(str(self.tmp_dir / "a")) is not env_a
+    assert factory.environment_stats.evictions == 2
+
+  def test_eviction_removes_str_templates(self) -> None:
+    factory = JinjaEnvFactory(max_environments=1)
+    tpl = factory.get_str_template("x", str(self.tmp_dir / "a"))
+    factory.get_str_template("y", str(self.tmp_dir / "b"))
+    assert len(factory._str_templates) == 1  # noqa: SLF001 the entries of evicted environment are removed
+
+    # A template is compiled again by the new environment of directory
+    assert factory.get_str_template("x", str(self.tmp_dir / "a")) is not tpl
+
+  def test_eviction_removes_templates(self) -> None:
+    factory = JinjaEnvFactory(max_environments=1, globs={"greet": lambda: "hi"})
+    factory.get_fs_jinja_environment(str(self.tmp_dir / "a")).get_template("main.j2")
+    factory.get_fs_jinja_environment(str(self.tmp_dir / "b")).get_template("main.j2")
+    assert len(factory._template_cache) == 1  # noqa: SLF001 the templates of evicted environment are removed
+
+  def test_template_cache_max_size(self) -> None:
+    (self.tmp_dir / "a" / "large.j2").write_text("x" * 100)
+    factory = JinjaEnvFactory(template_cache_max_size=50, globs={"greet": lambda: "hi"})
+    env = factory.get_fs_jinja_environment(str(self.tmp_dir / "a"))
+
+    env.get_template("main.j2")
+    # The source of template is larger than the limit, so it's not kept
+    env.get_template("large.j2")
+    assert len(env.cache) == 1
+    assert env.cache.size == len("a: {{ greet() }}")
+
+  def test_str_template_cache_max_size(self) -> None:
+    factory = JinjaEnvFactory(str_template_cache_max_size=10)
+    d = str(self.tmp_dir / "a")
+    factory.get_str_template("a: 123", d)
+    factory.get_str_template("b: 123", d)
+    assert factory.str_template_stats.evictions == 1
+
+  def test_set_global_and_filter(self) -> None:
+    factory = JinjaEnvFactory(globs={"greet": lambda: "hi"})
+    env = factory.get_fs_jinja_environment(str(self.tmp_dir / "a"))
+    tpl = env.get_template("main.j2")
+    assert tpl.render() == "a: hi"
+
+    factory.set_global("greet", lambda: "hello")
+    factory.set_filter("shout", str.upper)
+    # The environment is updated in place, so the compiled templates see the changes
+    assert factory.get_fs_jinja_environment(str(self.tmp_dir / "a")) is env
+    assert tpl.render() == "a: hello"
+    assert env.from_string("{{ 'x' | shout }}").render() == "X"
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.jinja.files import FileReader
+from configtpl.main import ConfigTpl
+from configtpl.manifest import manifest_scope
+from configtpl.utils.fs import fs_hash_file, fs_hash_text
+
+
+class TestFileReader(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.data_path = self.tmp_dir / "data.txt"
+    self.data_path.write_text("abc")
+
+  def touch(self, path: Path, contents: str) -> None:
+    # Make sure that modification time differs from the previous one
+    stat = path.stat()
+    path.write_text(contents)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+  def test_read_cached(self) -> None:
+    reader = FileReader()
+
+    assert reader.read(str(self.data_path)) == "abc"
+    assert reader.read(str(self.data_path)) == "abc"
+    assert reader.stats.hits == 1
+    assert reader.stats.misses == 1
+
+    self.touch(self.data_path, "abcd")
+    assert reader.read(str(self.data_path)) == "abcd"
+    assert reader.stats.misses == 2
+
+    reader.clear()
+    assert reader.read(str(self.data_path)) == "abcd"
+    assert reader.stats.misses == 3
+
+  def test_cache_max_total_size(self) -> None:
+    other_path = self.tmp_dir / "other.txt"
+    other_path.write_text("defg")
+    reader = FileReader(cache_max_total_size=5)
+
+    reader.read(str(self.data_path))
+    reader.read(str(other_path))
+    # The first file is evicted, since both files don't fit into 5 bytes
+    assert reader.stats.evictions == 1
+    reader.read(str(other_path))
+    assert reader.stats.hits == 1
+    reader.read(str(self.data_path))
+    assert reader.stats.misses == 3
+
+  def test_read_mmap(self) -> None:
+    self.data_path.write_bytes(b"line 1\r\nline 2\rline 3\n" * 100)
+    reader = FileReader(mmap_threshold=16)
+    assert reader.read(str(self.data_path)) == self.data_path.read_text()
+
+  def test_max_size(self) -> None:
+    reader = FileReader(max_size=2)
+    with pytest.raises(ValueError, match="is too large: 3 bytes, the limit is 2 bytes"):
+      reader.read(str(self.data_path))
+    # Digests are computed for files of any size
+    assert reader.file_sha256(str(self.data_path)) == hashlib.sha256(b"abc").hexdigest()
+
+  def test_digests(self) -> None:
+    bin_path = self.tmp_dir / "data.bin"
+    data = bytes(range(256)) * 100
+    bin_path.write_bytes(data)
+
+    for mmap_threshold in (None, 1024):
+      reader = FileReader(mmap_threshold=mmap_threshold)
+      assert reader.file_md5(str(bin_path)) == hashlib.md5(data).hexdigest()
+      assert reader.file_sha256(str(bin_path)) == hashlib.sha256(data).hexdigest()
+      assert reader.file_sha512(str(bin_path)) == hashlib.sha512(data).hexdigest()
+      assert reader.file_sha256(str(bin_path)) == hashlib.sha256(data).hexdigest()
+      assert reader.digest_stats.hits == 1
+
+  def test_manifest(self) -> None:
+    bin_path = self.tmp_dir / "data.bin"
+    bin_path.write_bytes(b"\xff\xfe")
+    reader = FileReader()
+
+    with manifest_scope() as manifest:
+      reader.read(str(self.data_path))
+      reader.file_sha256(str(bin_path))
+
+    assert manifest.files == {str(self.data_path): fs_hash_text("abc"), str(bin_path): fs_hash_file(bin_path)}
+    assert manifest.is_up_to_date(os.environ)
+    bin_path.write_bytes(b"\xff\xfd")
+    assert not manifest.is_up_to_date(os.environ)
+
+  def test_templates(self) -> None:
+    builder = ConfigTpl(jinja_globals={"data_path": str(self.data_path)})
+    cfg = builder.build_from_str(
+      "data: {{ file(data_path) }}\nglobal: {{ file_sha256(data_path) }}\nfilter: {{ data_path | file_md5 }}\n",
+    )
+    assert cfg == {
+      "data": "abc",
+      "global": hashlib.sha256(b"abc").hexdigest(),
+      "filter": hashlib.md5(b"abc").hexdigest(),
+    }
+
+  def test_pickle(self) -> None:
+    reader = pickle.loads(pickle.dumps(FileReader(max_size=10, cache_max_total_size=100)))  # noqa: S301 trusted data
+    assert reader.max_size == 10
+    assert reader._contents.max_size == 100  # noqa: SLF001
@@ -1,7 +1,11 @@
+import asyncio
+import subprocess
 import unittest
 from unittest.mock import MagicMock, patch
 
-from configtpl.jinja.globals import jinja_global_cmd, jinja_global_env
+import pytest
+
+from configtpl.jinja.globals import jinja_global_cmd, jinja_global_cmd_async, jinja_global_env
 
 
 class TestJinjaGlobals(unittest.TestCase):
@@ -17,6 +21,11 @@ class TestJinjaGlobals(unittest.TestCase):
     # Ensure subprocess.run was called with the correct arguments
     mock_run.assert_called_once_with("echo Hello", shell=True, check=True, capture_output=True, text=True)  # noqa: S604
 
+  def test_jinja_global_cmd_async(self) -> None:
+    assert asyncio.run(jinja_global_cmd_async("echo Hello")) == "Hello\n"
+    with pytest.raises(subprocess.CalledProcessError):
+      asyncio.run(jinja_global_cmd_async("exit 3"))
+
   @patch("os.getenv")
   def test_jinja_global_env_with_value(self, mock_getenv: MagicMock) -> None:
     mock_getenv.return_value = "mocked_value"
@@ -0,0 +1,75 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.batch import EXECUTOR_PROCESS, EXECUTOR_THREAD, BatchJob
+from configtpl.jinja.bytecode_cache import JinjaBytecodeCache
+from configtpl.main import ConfigTpl
+
+
+class TestBuildBatch(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    base_path = self.tmp_dir / "base.cfg"
+    base_path.write_text("tenant: {{ tenant }}\nport: {{ 8000 + index }}")
+    tenant_path = self.tmp_dir / "tenant.cfg"
+    tenant_path.write_text("url: http://{{ tenant }}:{{ port }}")
+    self.paths = [str(base_path), str(tenant_path)]
+
+  def get_jobs(self, n: int) -> list[BatchJob]:
+    return [BatchJob(self.paths, ctx={"tenant": f"t{i}", "index": i}, overrides={"id": i}) for i in range(n)]
+
+  def check_results(self, builder: ConfigTpl, executor: str) -> None:
+    results = sorted(builder.build_batch(self.get_jobs(5), executor=executor, max_workers=2), key=lambda r: r.index)
+
+    assert [r.index for r in results] == list(range(5))
+    assert all(r.ok for r in results)
+    assert results[3].cfg == {"tenant": "t3", "port": 8003, "url": "http://t3:8003", "id": 3}
+
+  def test_thread(self) -> None:
+    self.check_results(ConfigTpl(), EXECUTOR_THREAD)
+
+  def test_process(self) -> None:
+    builder = ConfigTpl(jinja_bytecode_cache=JinjaBytecodeCache(str(self.tmp_dir / "cache")))
+    self.check_results(builder, EXECUTOR_PROCESS)
+
+  def test_failed_job(self) -> None:
+    jobs = [*self.get_jobs(2), BatchJob(self.paths, ctx={"index": 2})]
+
+    results = sorted(ConfigTpl().build_batch(jobs), key=lambda r: r.index)
+
+    assert [r.ok for r in results] == [True, True, False]
+    assert results[2].cfg is None
+    assert "tenant" in str(results[2].error)
+
+  def test_unpicklable_builder(self) -> None:
+    builder = ConfigTpl(jinja_globals={"double": lambda x: x * 2})
+
+    with pytest.raises(ValueError, match="cannot be sent to worker processes"):
+      builder.build_batch(self.get_jobs(1), executor=EXECUTOR_PROCESS)
+
+  def test_invalid_arguments(self) -> None:
+    # Errors are raised by the call, not when the results are iterated
+    with pytest.raises(ValueError, match="Unknown executor"):
+      ConfigTpl().build_batch([], executor="cluster")
+    with pytest.raises(ValueError, match="max_workers"):
+      ConfigTpl().build_batch(self.get_jobs(1), max_workers=0)
+    with pytest.raises(TypeError, match="must be an instance of BatchJob"):
+      ConfigTpl().build_batch([self.paths])
+
+  def test_jobs_submitted_on_call(self) -> None:
+    builder = ConfigTpl()
+    started = threading.Event()
+    build = builder.build_from_files
+
+    def build_from_files(*args: object) -> dict:
+      started.set()
+      return build(*args)
+
+    with patch.object(builder, "build_from_files", side_effect=build_from_files):
+      results = builder.build_batch(self.get_jobs(1))
+      # The job runs before the results are iterated
+      assert started.wait(5)
+      assert [r.ok for r in results] == [True]
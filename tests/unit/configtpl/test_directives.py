@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.incremental import IncrementalBuilder
+from configtpl.main import ConfigTpl
+
+
+class TestDirectives(TempDirTestCase):
+  def write_tree(self) -> list[str]:
+    """
+    main.cfg requests a.cfg and b.cfg, both of them request common.cfg
+    """
+    self.write("a.cfg", 'order: {{ order + ["a"] }}\n"@configtpl":\n  load_next_defer: [common.cfg]')
+    self.write("b.cfg", 'order: {{ order + ["b"] }}\n"@configtpl":\n  load_next_defer: [common.cfg]')
+    self.write("common.cfg", 'order: {{ order + ["common"] }}')
+    main_path = self.write("main.cfg", 'order: ["main"]\n"@configtpl":\n  load_next_defer: [a.cfg, b.cfg]')
+    last_path = self.write("last.cfg", 'order: {{ order + ["last"] }}')
+    return [main_path, last_path]
+
+  def test_load_next_defer(self) -> None:
+    cfg, manifest = ConfigTpl().build_from_files_with_manifest(self.write_tree())
+
+    # Requested files are loaded right after the file which requests them, each file is loaded once
+    assert cfg == {"order": ["main", "a", "common", "b", "last"]}
+    assert len(manifest.templates) == 5
+
+  def test_parallel(self) -> None:
+    cfg = ConfigTpl(layer_workers=4).build_from_files(self.write_tree())
+
+    assert cfg == {"order": ["main", "a", "common", "b", "last"]}
+
+  def test_async(self) -> None:
+    cfg = asyncio.run(ConfigTpl().build_from_files_async(self.write_tree()))
+
+    assert cfg == {"order": ["main", "a", "common", "b", "last"]}
+
+  def test_build_from_str(self) -> None:
+    self.write_tree()
+    s = 'order: ["str"]\n"@configtpl":\n  load_next_defer: b.cfg'
+
+    assert ConfigTpl().build_from_str(s, work_dir=str(self.tmp_dir)) == {"order": ["str", "b", "common"]}
+
+  def test_incremental(self) -> None:
+    builder = IncrementalBuilder(ConfigTpl(), self.write_tree())
+    assert builder.build() == {"order": ["main", "a", "common", "b", "last"]}
+
+    self.write("b.cfg", 'order: {{ order + ["b2"] }}')
+    assert builder.build() == {"order": ["main", "a", "common", "b2", "last"]}
+
+  def test_requested_file_in_paths(self) -> None:
+    a_path = self.write("a.cfg", 'a: 1\n"@configtpl":\n  load_next_defer: [b.cfg]')
+    b_path = self.write("b.cfg", "counter: {{ (counter | default(0)) + 1 }}")
+
+    # The file is loaded once, regardless of the order of paths
+    assert ConfigTpl().build_from_files([a_path, b_path]) == {"a": 1, "counter": 1}
+    assert ConfigTpl().build_from_files([b_path, a_path]) == {"a": 1, "counter": 1}
+    assert ConfigTpl(layer_workers=2).build_from_files([a_path, b_path]) == {"a": 1, "counter": 1}
+    assert ConfigTpl().build_from_files([b_path, b_path]) == {"counter": 1}
+
+  def test_recursion(self) -> None:
+    self.write("a.cfg", '"@configtpl":\n  load_next_defer: [b.cfg]')
+    self.write("b.cfg", '"@configtpl":\n  load_next_defer: [a.cfg]')
+
+    with pytest.raises(ValueError, match=r"Recursive loading of configuration files: .*a\.cfg -> .*b\.cfg -> .*a\.cfg"):
+      ConfigTpl().build_from_files([str(self.tmp_dir / "a.cfg")])
+
+  def test_invalid_directive(self) -> None:
+    path = self.write("a.cfg", '"@configtpl":\n  load_first: [b.cfg]')
+    with pytest.raises(ValueError, match="unknown keys load_first"):
+      ConfigTpl().build_from_files([path])
+
+    path = self.write("a.cfg", '"@configtpl":\n  load_next_defer: {b: c}')
+    with pytest.raises(TypeError, match="must be a path or a list of paths"):
+      ConfigTpl().build_from_files([path])
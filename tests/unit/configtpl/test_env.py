@@ -2,7 +2,7 @@ import os
 import unittest
 from unittest.mock import patch
 
-from configtpl.env import _parse_env_var_value, get_config_from_env
+from configtpl.env import EnvSnapshot, _parse_env, _parse_env_var_value, get_config_from_env
 
 
 class TestEnv(unittest.TestCase):
@@ -64,3 +64,45 @@ class TestEnv(unittest.TestCase):
       },
     }
     assert get_config_from_env(env_prefix="TEST_APP") == expected_config
+
+
+class TestEnvSnapshot(unittest.TestCase):
+  def test_explicit_mapping(self) -> None:
+    snapshot = EnvSnapshot({"APP__DB__HOST": "localhost", "APP__DB__PORT": "5432", "OTHER__KEY": "value"})
+    assert snapshot.get_config("APP") == {"db": {"host": "localhost", "port": 5432}}
+    assert snapshot.get_config("OTHER") == {"key": "value"}
+    assert snapshot.get_config(None) == {}
+    assert snapshot.get_vars("APP") == {"APP__DB__HOST": "localhost", "APP__DB__PORT": "5432"}
+
+  def test_reuse(self) -> None:
+    environ = {"APP__KEY": "1", "OTHER__KEY": "2"}
+    snapshot = EnvSnapshot(environ)
+    with patch("configtpl.env._parse_env", wraps=_parse_env) as parse:
+      assert snapshot.get_config("APP") == {"key": 1}
+      assert snapshot.get_config("APP") == {"key": 1}
+      assert snapshot.get_config("OTHER") == {"key": 2}
+      assert parse.call_count == 2
+
+      # Only the prefix with changed variables is parsed again
+      environ["APP__KEY"] = "3"
+      assert snapshot.get_config("APP") == {"key": 3}
+      assert snapshot.get_config("OTHER") == {"key": 2}
+      assert parse.call_count == 3
+
+      environ["APP__NEW"] = "true"
+      del environ["APP__KEY"]
+      assert snapshot.get_config("APP") == {"new": True}
+      assert parse.call_count == 4
+
+  def test_result_is_copy(self) -> None:
+    snapshot = EnvSnapshot({"APP__DB__HOST": "localhost"})
+    cfg = snapshot.get_config("APP")
+    cfg["db"]["host"] = "changed"
+    assert snapshot.get_config("APP") == {"db": {"host": "localhost"}}
+
+  @patch.dict(os.environ, {"TEST_APP__KEY": "value"}, clear=True)
+  def test_os_environ(self) -> None:
+    snapshot = EnvSnapshot()
+    assert snapshot.get_config("TEST_APP") == {"key": "value"}
+    os.environ["TEST_APP__KEY"] = "new_value"
+    assert snapshot.get_config("TEST_APP") == {"key": "new_value"}
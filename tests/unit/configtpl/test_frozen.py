@@ -0,0 +1,111 @@
+import pickle
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from configtpl.frozen import FrozenConfig
+from configtpl.main import ConfigTpl
+
+CFG = {
+  "db": {
+    "host": "localhost",
+    "port": 5432,
+    "replicas": [{"host": "replica-0"}, {"host": "replica-1"}],
+  },
+  "feature.flags": {"beta": True},
+  1: "int key",
+  "empty": {},
+}
+
+
+class TestFrozenConfig(unittest.TestCase):
+  def test_get_path(self) -> None:
+    for index in (False, True):
+      with self.subTest(index=index):
+        self.check_get_path(FrozenConfig(CFG, index=index))
+
+  def check_get_path(self, cfg: FrozenConfig) -> None:
+    assert cfg.get_path("db.host") == "localhost"
+    assert cfg.get_path("db.replicas.1.host") == "replica-1"
+    assert cfg.get_path("db.replicas") == ({"host": "replica-0"}, {"host": "replica-1"})
+    assert cfg["db"].get_path("replicas.0.host") == "replica-0"
+    assert cfg["db"]["replicas"][0].get_path("host") == "replica-0"
+    assert cfg.get_path("empty") == {}
+
+    # Keys with dots and keys of other types are reachable by sequences of keys
+    assert cfg.get_path(["feature.flags", "beta"]) is True
+    assert cfg["feature.flags"].get_path("beta") is True
+    assert cfg.get_path([1]) == "int key"
+    assert cfg.get_path(["db", "replicas", 1, "host"]) == "replica-1"
+
+    assert cfg.get_path("feature.flags.beta", None) is None
+    assert cfg.get_path("db.replicas.2.host", "default") == "default"
+    with pytest.raises(KeyError):
+      cfg.get_path("db.missing")
+    with pytest.raises(KeyError):
+      cfg.get_path(["db", "host", "missing"])
+
+  def test_immutable(self) -> None:
+    cfg = FrozenConfig(CFG)
+    with pytest.raises(TypeError):
+      cfg["db"] = {}  # type: ignore[index]
+    with pytest.raises(AttributeError):
+      cfg.extra = 1  # type: ignore[attr-defined]
+    assert isinstance(cfg["db"]["replicas"], tuple)
+
+  def test_equality_and_hash(self) -> None:
+    cfg = FrozenConfig(CFG)
+    same = FrozenConfig({**CFG, "db": {**CFG["db"]}})
+    changed = FrozenConfig({**CFG, "db": {**CFG["db"], "port": 6543}})
+
+    assert cfg == same
+    assert hash(cfg) == hash(same)
+    assert cfg != changed
+    assert hash(cfg) != hash(changed)
+    assert cfg == CFG
+    assert cfg.to_dict() == CFG
+    assert {cfg: 1}[same] == 1
+
+    unhashable = FrozenConfig({"value": {1, 2}})
+    assert unhashable == {"value": {1, 2}}
+    with pytest.raises(TypeError, match="unhashable"):
+      hash(unhashable)
+
+  def test_to_dict(self) -> None:
+    cfg = FrozenConfig(CFG)
+    plain = cfg.to_dict()
+    assert plain == CFG
+    assert isinstance(plain["db"]["replicas"], list)
+    plain["db"]["host"] = "changed"
+    assert cfg.get_path("db.host") == "localhost"
+
+  def test_deep_nesting(self) -> None:
+    nested = {"leaf": 1}
+    for _ in range(5000):
+      nested = {"level": nested}
+    cfg = FrozenConfig(nested)
+    assert cfg.get_path(".".join(["level"] * 5000 + ["leaf"])) == 1
+
+  def test_pickle(self) -> None:
+    for index in (False, True):
+      cfg = FrozenConfig(CFG, index=index)
+      restored = pickle.loads(pickle.dumps(cfg))  # noqa: S301 the data is trusted
+      assert restored == cfg
+      assert (restored._index is not None) is index  # noqa: SLF001 checks the index is kept
+
+  def test_build_from_files_frozen(self) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = Path(tmp_dir) / "app.cfg"
+      path.write_text("db:\n  host: {{ host }}\n  ports: [1, 2]\n")
+      builder = ConfigTpl(defaults={"debug": False})
+      cfg = builder.build_from_files_frozen([str(path)], overrides={"debug": True}, ctx={"host": "db.local"})
+      indexed = builder.build_from_files_frozen([str(path)], ctx={"host": "db.local"}, index=True)
+
+    assert isinstance(cfg, FrozenConfig)
+    assert cfg == {"debug": True, "db": {"host": "db.local", "ports": [1, 2]}}
+    with ThreadPoolExecutor(4) as pool:
+      assert set(pool.map(lambda _: cfg.get_path("db.ports.1"), range(8))) == {2}
+    assert indexed.get_path("db.host") == "db.local"
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+import unittest
+
+# The modules which must be imported only when the code which needs them runs, e.g. when the first template is rendered.
+# The import time itself is measured by `benchmarks/imports.py`
+LAZY_MODULES = (
+  "asyncio",
+  "base64",
+  "concurrent.futures",
+  "jinja2",
+  "subprocess",
+  "tempfile",
+  "uuid",
+  "yaml",
+)
+
+
+def _get_lazy_modules(code: str) -> list[str]:
+  """
+  Runs the code in a new interpreter and returns the lazy modules which it imported
+  """
+  code = f"import sys\n{code}\nprint(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+  result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)  # noqa: S603 trusted args
+  return [m for m in result.stdout.strip().split(",") if m]
+
+
+class TestImports(unittest.TestCase):
+  def test_import_package(self) -> None:
+    assert _get_lazy_modules("import configtpl") == []
+
+  def test_create_builder(self) -> None:
+    code = "import configtpl.main, configtpl.snapshot\nconfigtpl.main.ConfigTpl(env_var_prefix='APP')"
+    assert _get_lazy_modules(code) == []
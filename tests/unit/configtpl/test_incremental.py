@@ -0,0 +1,79 @@
+import jinja2
+from temp_dir_case import TempDirTestCase
+
+from configtpl.incremental import IncrementalBuilder
+from configtpl.main import ConfigTpl
+
+
+class TestIncrementalBuilder(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.write("layer_1.cfg", "a: 1")
+    self.write("layer_2.cfg", "b: 2")
+    self.write("layer_3.cfg", "c: {{ a + 10 }}")
+    self.builder = IncrementalBuilder(
+      ConfigTpl(defaults={"default": 0}),
+      [str(self.tmp_dir / f"layer_{i}.cfg") for i in range(1, 4)],
+      overrides={"b": 20},
+    )
+
+  def test_no_changes(self) -> None:
+    expected = {"default": 0, "a": 1, "b": 20, "c": 11}
+    assert self.builder.build() == expected
+    assert self.builder.layers_rendered == 3
+
+    assert self.builder.build() == expected
+    assert self.builder.layers_rendered == 0
+
+  def test_last_layer_changed(self) -> None:
+    self.builder.build()
+    self.write("layer_3.cfg", "c: {{ a + 100 }}")
+
+    assert self.builder.build() == {"default": 0, "a": 1, "b": 20, "c": 101}
+    assert self.builder.layers_rendered == 1
+
+  def test_first_layer_changed(self) -> None:
+    self.builder.build()
+    self.write("layer_1.cfg", "a: 2")
+
+    assert self.builder.build() == {"default": 0, "a": 2, "b": 20, "c": 12}
+    # The second layer doesn't read `a`, so it's not rendered
+    assert self.builder.layers_rendered == 2
+
+  def test_included_template_changed(self) -> None:
+    self.write("layer_2.cfg", '{% include "included.cfg" %}')
+    self.write("included.cfg", "b: 2")
+    self.builder.build()
+    self.write("included.cfg", "d: 4")
+
+    assert self.builder.build() == {"default": 0, "a": 1, "b": 20, "c": 11, "d": 4}
+    assert self.builder.layers_rendered == 1
+
+  def test_result_is_a_copy(self) -> None:
+    self.builder.build()["a"] = 100
+
+    assert self.builder.build()["a"] == 1
+
+  def test_nondeterministic_layer(self) -> None:
+    self.write("layer_2.cfg", "b: {{ uuid() }}")
+    self.builder.build()
+    self.builder.build()
+
+    assert self.builder.layers_rendered == 1
+
+  def test_global_reads_context(self) -> None:
+    @jinja2.pass_context
+    def lookup(context: jinja2.runtime.Context, name: str) -> int:
+      return context.get(name, {}).get("x", 0)
+
+    self.write("layer_1.cfg", "a:\n  x: 1")
+    self.write("layer_2.cfg", "a:\n  x: 2")
+    self.write("layer_4.cfg", "c: {{ lookup('a') }}")
+    config_builder = ConfigTpl()
+    config_builder.set_global("lookup", lookup)
+    builder = IncrementalBuilder(config_builder, [str(self.tmp_dir / f"layer_{i}.cfg") for i in (1, 2, 4)])
+    assert builder.build() == {"a": {"x": 2}, "c": 2}
+
+    self.write("layer_2.cfg", "a:\n  x: 5")
+    assert builder.build() == {"a": {"x": 5}, "c": 5}
+    assert builder.layers_rendered == 2
@@ -0,0 +1,91 @@
+import os
+import unittest
+from unittest.mock import patch
+
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.lazy import LazyConfig
+from configtpl.main import ConfigTpl
+from configtpl.utils.dicts import LIST_STRATEGIES, dict_deep_merge, dict_freeze
+
+LAYERS = [
+  {
+    "db": {"host": "localhost", "port": 5432, "options": {"ssl": False}},
+    "tags": ["a"],
+    "name": "first",
+    "hosts": ["x", "x"],
+    "log": {"levels": ["info", "info"]},
+  },
+  {"db": {"port": 6543, "options": {"timeout": 10}}, "tags": ["b", "a"], "cache": {"ttl": 60}},
+  {"db": {"options": {"ssl": True}}, "tags": [{"c": 1}], "cache": None},
+]
+
+
+class TestLazyConfig(unittest.TestCase):
+  def test_same_as_deep_merge(self) -> None:
+    for strategy in LIST_STRATEGIES:
+      lazy = LazyConfig([dict_freeze(layer) for layer in LAYERS], strategy)
+      expected = dict_deep_merge(*LAYERS, list_strategy=strategy)
+      assert lazy == expected
+      assert lazy.to_dict() == expected
+      assert list(lazy) == list(expected)
+      assert len(lazy) == len(expected)
+
+    lazy = LazyConfig([dict_freeze(layer) for layer in LAYERS], "unique")
+    assert lazy["hosts"] == ["x"]
+    assert lazy["log"]["levels"] == ["info"]
+
+  def test_lazy_merge(self) -> None:
+    lazy = LazyConfig([dict_freeze(layer) for layer in LAYERS])
+    with patch.object(LazyConfig, "_merge", autospec=True, side_effect=LazyConfig._merge) as mock_merge:  # noqa: SLF001
+      assert lazy["db"]["port"] == 6543
+      assert lazy["db"]["port"] == 6543
+      # Only the accessed keys are merged, and only once
+      assert [c.args[1] for c in mock_merge.call_args_list] == ["db", "port"]
+
+    assert "cache" in lazy
+    assert "missing" not in lazy
+    assert lazy.get("missing") is None
+    with pytest.raises(KeyError):
+      lazy["missing"]
+
+  def test_read_only(self) -> None:
+    lazy = LazyConfig([dict_freeze(layer) for layer in LAYERS], "append")
+    with pytest.raises(TypeError):
+      lazy["name"] = "changed"  # type: ignore[index]
+    with pytest.raises(TypeError):
+      lazy["tags"].append("d")
+
+    cfg = lazy.to_dict()
+    cfg["db"]["options"]["ssl"] = "changed"
+    assert lazy["db"]["options"]["ssl"] is True
+
+  def test_unknown_list_strategy(self) -> None:
+    with pytest.raises(ValueError, match="Unknown list strategy"):
+      LazyConfig([], "unknown")
+
+
+@patch.dict(os.environ, {"LAZY_TEST__DB__HOST": "env-host"})
+class TestConfigTplLazy(TempDirTestCase):
+  def test_build_from_files_lazy(self) -> None:
+    paths = self.write_layers("db: {host: localhost, port: 5432}\nname: app", "db: {port: {{ db.port + 1 }}}")
+
+    builder = ConfigTpl(defaults={"debug": False}, env_var_prefix="LAZY_TEST")
+    lazy = builder.build_from_files_lazy(paths, overrides={"debug": True})
+
+    assert isinstance(lazy, LazyConfig)
+    assert lazy["db"] == {"host": "env-host", "port": 5433}
+    assert lazy.to_dict() == builder.build_from_files(paths, overrides={"debug": True})
+
+  def test_outputs_not_merged(self) -> None:
+    paths = self.write_layers("db: {host: localhost, port: 5432}", "db: {port: {{ db.port + 1 }}}", "cache: {ttl: 60}")
+
+    builder = ConfigTpl()
+    with patch("configtpl.main.dict_deep_merge", wraps=dict_deep_merge) as mock_merge:
+      lazy = builder.build_from_files_lazy(paths)
+      mock_merge.assert_not_called()
+
+    # Defaults, outputs of files, environment variables and overrides
+    assert len(lazy.layers) == 6
+    assert lazy == {"db": {"host": "localhost", "port": 5433}, "cache": {"ttl": 60}}
@@ -1,9 +1,24 @@
+import asyncio
 import os
+import threading
+from collections import defaultdict
 from copy import deepcopy
-from unittest import TestCase
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
 from unittest.mock import mock_open, patch
 
+import jinja2
+import pytest
+import yaml
+from jinja2 import UndefinedError
+from temp_dir_case import TempDirTestCase
+
+from configtpl.env import EnvSnapshot
 from configtpl.main import ConfigTpl
+from configtpl.manifest import manifest_scope
+from configtpl.parsers import JsonParser
+from configtpl.result_cache import ResultCache
+from configtpl.stats import BuildStats
 
 FILE_CONFIG_CONTENTS_SIMPLE = """\
 {% set name = "John" %}
@@ -19,6 +34,11 @@ params:
   greeting: "Hello, {{ name }}!"
 """
 
+FILE_CONFIG_CONTENTS_MODIFY_CTX = """\
+params:
+  modified: {{ my_ctx.update({"changed": True}) }}
+"""
+
 CONFIG_COMPILED_SIMPLE = {
   "params": {
     "user_name": "John",
@@ -67,6 +87,17 @@ class ConfigTplSimpleTest(TestCase):
       },
     }
 
+  @patch("builtins.open", new_callable=mock_open, read_data=FILE_CONFIG_CONTENTS_MODIFY_CTX)
+  def test_compile_modify_ctx(self, _a: object, _b: object, _c: object, _d: object, _e: object) -> None:
+    ctx = {"my_ctx": {"value": 1}}
+    with pytest.raises(TypeError):
+      self.get_instance().build_from_files(["/test/sample.cfg"], ctx=ctx)
+    assert ctx == {"my_ctx": {"value": 1}}
+
+  def test_merge_list_strategy(self, _a: object, _b: object, _c: object, _d: object) -> None:
+    builder = ConfigTpl(merge_list_strategy="append")
+    assert builder.build_from_str("items: [1, 2]", overrides={"items": [3]}) == {"items": [1, 2, 3]}
+
   def get_instance(self) -> ConfigTpl:
     return ConfigTpl()
 
@@ -132,5 +163,257 @@ class ConfigTplEnvVarsTest(TestCase):
       },
     }
 
+  def test_env_snapshot(self, _a: object, _b: object, _c: object, _d: object) -> None:
+    environ = {"TEST_APP__PARAMS__TENANT": "first"}
+    builder = ConfigTpl(env_var_prefix="TEST_APP", env_snapshot=EnvSnapshot(environ))
+    # Variables of `os.environ` are not read
+    assert builder.build_from_str("") == {"params": {"tenant": "first"}}
+    environ["TEST_APP__PARAMS__TENANT"] = "second"
+    assert builder.build_from_str("") == {"params": {"tenant": "second"}}
+
+  @patch.dict(os.environ, {"TEST_APP__PARAMS__ZIP_CODE": "01234"})
+  def test_schema(self, _a: object, _b: object, _c: object, _d: object) -> None:
+    builder = ConfigTpl(env_var_prefix="TEST_APP", schema={"params": {"zip_code": str, "count": int}})
+    assert builder.build_from_str("params: {count: 1}") == {
+      "params": {"count": 1, "zip_code": "01234", "simple_env_var": "simple_env_var_val"},
+    }
+    with pytest.raises(TypeError, match=r"'params\.count' .* expected int, got str"):
+      builder.build_from_str("params: {count: one}")
+
   def get_instance(self) -> ConfigTpl:
     return ConfigTpl(env_var_prefix="TEST_APP")
+
+
+class Catalog(dict):
+  def host(self, name: str) -> str:
+    return f"{name}.{self['domain']}"
+
+
+class TestConfigTplUserValues(TempDirTestCase):
+  def test_dict_subclasses_in_ctx(self) -> None:
+    path = self.write("config.cfg", 'host: {{ catalog.host("db") }}\ncount: {{ counts["missing"] }}')
+    ctx = {"catalog": Catalog(domain="internal"), "counts": defaultdict(int)}
+
+    assert ConfigTpl().build_from_files([path], ctx=ctx) == {"host": "db.internal", "count": 0}
+
+  def test_safe_dump_filter(self) -> None:
+    paths = [
+      self.write("first.cfg", "db:\n  hosts: [a, b]"),
+      self.write("second.cfg", "dump: {{ db | to_yaml | tojson }}"),
+    ]
+    builder = ConfigTpl(jinja_filters={"to_yaml": yaml.safe_dump})
+
+    assert builder.build_from_files(paths)["dump"] == "hosts:\n- a\n- b\n"
+
+
+class TestConfigTplAsync(TempDirTestCase, IsolatedAsyncioTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    (self.tmp_dir / "data.txt").write_text("data")
+    (self.tmp_dir / "included.j2").write_text("included: {{ name }}")
+    self.paths = [self.tmp_dir / "first.cfg", self.tmp_dir / "second.cfg"]
+    self.paths[0].write_text('name: {{ tenant }}\noutput: {{ cmd("echo hello") | trim }}')
+    data_path = self.tmp_dir / "data.txt"
+    self.paths[1].write_text(f'{{% include "included.j2" %}}\ndata: {{{{ file("{data_path}") }}}}')
+
+  async def test_build_from_files_async(self) -> None:
+    builder = ConfigTpl()
+    paths = [str(p) for p in self.paths]
+
+    with manifest_scope() as manifest:
+      cfg = await builder.build_from_files_async(paths, ctx={"tenant": "a"}, overrides={"extra": 1})
+
+    assert cfg == {"name": "a", "output": "hello", "included": "a", "data": "data", "extra": 1}
+    assert cfg == builder.build_from_files(paths, ctx={"tenant": "a"}, overrides={"extra": 1})
+    assert set(manifest.templates) == {*paths, str(self.tmp_dir / "included.j2")}
+    assert manifest.files == {str(self.tmp_dir / "data.txt"): manifest.files[str(self.tmp_dir / "data.txt")]}
+    assert set(manifest.commands) == {"echo hello"}
+
+  async def test_concurrent_builds(self) -> None:
+    builder = ConfigTpl()
+    paths = [str(p) for p in self.paths]
+
+    cfgs = await asyncio.gather(*(builder.build_from_files_async(paths, ctx={"tenant": t}) for t in "abc"))
+
+    assert [cfg["included"] for cfg in cfgs] == ["a", "b", "c"]
+
+  async def test_build_from_str_async(self) -> None:
+    builder = ConfigTpl(defaults={"name": "default"}, result_cache=ResultCache())
+
+    cfg = await builder.build_from_str_async('{% include "included.j2" %}', work_dir=str(self.tmp_dir))
+    cached = await builder.build_from_str_async('{% include "included.j2" %}', work_dir=str(self.tmp_dir))
+
+    assert cfg == cached == {"included": "default"}
+    assert builder.result_cache.stats.hits == 1
+
+
+class TestConfigTplParallelLayers(TempDirTestCase):
+  def test_same_result_as_sequential(self) -> None:
+    (self.tmp_dir / "included.j2").write_text("included: {{ x }}")
+    paths = self.write_layers(
+      "a: 1\nx: 2",
+      "b: {{ a + 1 }}",
+      "c: {{ name }}",
+      "d: {{ x }}",
+      '{% include "included.j2" %}',
+      "x: 3\ne: {{ x }}",
+    )
+    kwargs = {"defaults": {"x": 1}, "merge_list_strategy": "append"}
+
+    builder = ConfigTpl(layer_workers=4, **kwargs)
+    with patch.object(builder, "_render_layer", wraps=builder._render_layer) as mock_render:  # noqa: SLF001
+      cfg = builder.build_from_files(paths, ctx={"name": "test"})
+
+    assert cfg == ConfigTpl(**kwargs).build_from_files(paths, ctx={"name": "test"})
+    assert cfg == {"a": 1, "x": 3, "b": 2, "c": "test", "d": 2, "included": 2, "e": 2}
+    # Only the files which read the variables set by previous files are rendered again
+    assert [Path(c.args[0]).name for c in mock_render.call_args_list] == [
+      "layer_1.cfg",
+      "layer_3.cfg",
+      "layer_4.cfg",
+      "layer_5.cfg",
+    ]
+
+  def test_error(self) -> None:
+    paths = self.write_layers("a: 1", "b: {{ undefined }}")
+
+    with pytest.raises(UndefinedError):
+      ConfigTpl(layer_workers=2).build_from_files(paths)
+
+  def test_global_reads_context(self) -> None:
+    @jinja2.pass_context
+    def lookup(context: jinja2.runtime.Context, name: str) -> int:
+      return context.get(name, {}).get("x", 0)
+
+    paths = self.write_layers("a:\n  x: 1", "a:\n  x: 2", "b: 3", "c: {{ lookup('a') }}")
+    results = []
+    for layer_workers in (1, 4):
+      builder = ConfigTpl(layer_workers=layer_workers)
+      builder.set_global("lookup", lookup)
+      results.append(builder.build_from_files(paths))
+
+    assert results[0] == results[1] == {"a": {"x": 2}, "b": 3, "c": 2}
+
+  def test_commands_run_once(self) -> None:
+    log = self.tmp_dir / "log"
+    paths = self.write_layers(
+      "name: prod",
+      f"out: \"{{{{ cmd('echo ' ~ (name | default('UNSET')) ~ ' >> {log}') }}}}\"",
+    )
+
+    assert ConfigTpl(layer_workers=4).build_from_files(paths) == {"name": "prod", "out": ""}
+    assert log.read_text() == "prod\n"
+
+  def test_hooks_report_used_renders(self) -> None:
+    paths = self.write_layers("a: 1", "b: {{ a }}", "c: 2")
+    stats = BuildStats()
+
+    ConfigTpl(layer_workers=4, hooks=stats).build_from_files(paths)
+
+    snapshot = stats.snapshot()
+    assert snapshot.stages["render"].count == 3
+    assert all(s["render"].count == 1 for s in snapshot.files.values())
+
+  def test_unpicklable_context(self) -> None:
+    paths = self.write_layers("a: 1", "b: {{ lock is none }}")
+    builder = ConfigTpl(layer_workers=2)
+
+    # The inputs of speculative rendering cannot be sent to worker process, so the file is rendered again
+    assert builder.build_from_files(paths, ctx={"lock": threading.Lock()}) == {"a": 1, "b": False}
+
+  def test_close(self) -> None:
+    paths = self.write_layers("a: 1", "b: 2")
+    builder = ConfigTpl(layer_workers=2)
+    assert builder.build_from_files(paths) == {"a": 1, "b": 2}
+
+    builder.close()
+    builder.close()
+    # Worker processes are started again
+    assert builder.build_from_files(paths) == {"a": 1, "b": 2}
+    builder.close()
+
+
+class TestConfigTplStrTemplateCache(TestCase):
+  def test_compile_once(self) -> None:
+    builder = ConfigTpl(str_template_cache_max_entries=2)
+    factory = builder.jinja_env_factory
+    with patch("jinja2.Environment.from_string", autospec=True, side_effect=jinja2.Environment.from_string) as mock:
+      assert builder.build_from_str("name: {{ name }}", ctx={"name": "first"}) == {"name": "first"}
+      assert builder.build_from_str("name: {{ name }}", ctx={"name": "second"}) == {"name": "second"}
+      assert mock.call_count == 1
+      assert factory.str_template_stats.hits == 1
+
+      # Templates are compiled by environment of working directory
+      builder.build_from_str("name: {{ name }}", work_dir="/", ctx={"name": "third"})
+      assert mock.call_count == 2
+
+      factory.clear_str_templates()
+      builder.build_from_str("name: {{ name }}", ctx={"name": "fourth"})
+      assert mock.call_count == 3
+
+  def test_eviction(self) -> None:
+    builder = ConfigTpl(str_template_cache_max_entries=1)
+    builder.build_from_str("a: 1")
+    builder.build_from_str("b: 1")
+    builder.build_from_str("a: 1")
+    assert builder.jinja_env_factory.str_template_stats.evictions == 2
+
+  def test_set_global(self) -> None:
+    builder = ConfigTpl()
+    builder.set_global("g", lambda: "old")
+    assert builder.build_from_str('v: "{{ g() }}"') == {"v": "old"}
+
+    builder.set_global("g", lambda: "new")
+    assert builder.build_from_str('v: "{{ g() }}"') == {"v": "new"}
+
+
+class TestConfigTplStreamRender(TempDirTestCase):
+  def test_same_result(self) -> None:
+    paths = [
+      self.write("routes.cfg", "routes:\n{% for i in range(1000) %}  - {path: /r{{ i }}, port: {{ i }}}\n{% endfor %}"),
+      self.write("extra.json", '{"count": {{ routes | length }}}'),
+      self.write("empty.cfg", "{# nothing #}"),
+    ]
+    stats = BuildStats()
+    parsers = {".json": JsonParser()}
+    builder = ConfigTpl(stream_render=True, hooks=stats, parsers_by_extension=parsers)
+    with patch("jinja2.Template.render", autospec=True, side_effect=jinja2.Template.render) as mock_render:
+      cfg = builder.build_from_files(paths)
+    # JSON parser doesn't support streams, so only the JSON file is rendered into a string
+    assert mock_render.call_count == 1
+
+    expected_stats = BuildStats()
+    assert cfg == ConfigTpl(hooks=expected_stats, parsers_by_extension=parsers).build_from_files(paths)
+    assert cfg["count"] == 1000
+    assert cfg["routes"][999] == {"path": "/r999", "port": 999}
+    assert stats.snapshot().bytes_rendered == expected_stats.snapshot().bytes_rendered
+
+  def test_error(self) -> None:
+    path = self.write("broken.cfg", "a: 1\nb: {{ undefined }}")
+    with pytest.raises(UndefinedError):
+      ConfigTpl(stream_render=True).build_from_files([path])
+
+  def test_documents(self) -> None:
+    rendered = []
+
+    def track(i: int) -> int:
+      rendered.append(i)
+      return i
+
+    # The documents are larger than the buffers of YAML parser
+    path = self.write(
+      "docs.cfg",
+      '{% for i in range(3) %}---\nid: {{ track(i) }}\nname: {{ name }}\npad: {{ "x" * 100000 }}\n{% endfor %}',
+    )
+    builder = ConfigTpl(defaults={"name": "default"}, jinja_globals={"track": track})
+    documents = builder.build_documents_from_file(path, ctx={"name": "doc"})
+
+    assert next(documents) == {"id": 0, "name": "doc", "pad": "x" * 100000}
+    # The last document is not rendered yet
+    assert rendered == [0, 1]
+    assert [d["id"] for d in documents] == [1, 2]
+
+  def test_documents_unsupported_parser(self) -> None:
+    path = self.write("docs.json", "{}")
+    with pytest.raises(TypeError, match="parser 'json' doesn't support streams"):
+      ConfigTpl(parsers_by_extension={".json": JsonParser()}).build_documents_from_file(path)
@@ -0,0 +1,81 @@
+import os
+from unittest.mock import patch
+
+from temp_dir_case import TempDirTestCase
+
+from configtpl.main import ConfigTpl
+from configtpl.manifest import BuildManifest, manifest_record_env_var, manifest_scope
+from configtpl.result_cache import ResultCache
+from configtpl.utils.fs import fs_hash_text
+
+MAIN_CONTENTS = """\
+name: {{ env("MANIFEST_TEST_NAME", "none") }}
+data: {{ file(data_path) }}
+output: {{ cmd("echo hello") | trim }}
+{% include "included.cfg" %}
+"""
+
+
+@patch.dict(os.environ, {"MANIFEST_TEST__VALUE": "1"})
+class TestBuildManifest(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.main_path = self.tmp_dir / "main.cfg"
+    self.included_path = self.tmp_dir / "included.cfg"
+    self.data_path = self.tmp_dir / "data.txt"
+    self.main_path.write_text(MAIN_CONTENTS)
+    self.included_path.write_text("included: 1\n")
+    self.data_path.write_text("abc")
+
+  def build(self, builder: ConfigTpl) -> tuple[dict, BuildManifest]:
+    return builder.build_from_files_with_manifest([str(self.main_path)], ctx={"data_path": str(self.data_path)})
+
+  def test_build_from_files(self) -> None:
+    cfg, manifest = self.build(ConfigTpl(env_var_prefix="MANIFEST_TEST"))
+
+    assert cfg == {"name": "none", "data": "abc", "output": "hello", "included": 1, "value": 1}
+    assert manifest.templates == {
+      str(self.main_path): fs_hash_text(MAIN_CONTENTS),
+      str(self.included_path): fs_hash_text("included: 1\n"),
+    }
+    assert manifest.files == {str(self.data_path): fs_hash_text("abc")}
+    assert manifest.env_vars == {"MANIFEST_TEST_NAME": None}
+    assert manifest.env_prefix_vars == {"MANIFEST_TEST__": {"MANIFEST_TEST__VALUE": "1"}}
+    assert manifest.commands == {"echo hello": fs_hash_text("hello\n")}
+    assert manifest.nondeterministic == {"cmd"}
+    assert manifest.is_up_to_date(os.environ)
+
+  def test_build_from_str(self) -> None:
+    cfg, manifest = ConfigTpl().build_from_str_with_manifest(
+      '{% include "included.cfg" %}',
+      work_dir=str(self.tmp_dir),
+    )
+
+    assert cfg == {"included": 1}
+    assert manifest.templates == {str(self.included_path): fs_hash_text("included: 1\n")}
+    assert manifest.is_deterministic
+
+  def test_cached_build(self) -> None:
+    builder = ConfigTpl(result_cache=ResultCache(cache_nondeterministic=True))
+    _, manifest_1 = self.build(builder)
+    _, manifest_2 = self.build(builder)
+
+    assert manifest_1 == manifest_2
+
+  def test_is_up_to_date(self) -> None:
+    _, manifest = self.build(ConfigTpl(env_var_prefix="MANIFEST_TEST"))
+
+    assert not manifest.is_up_to_date({**os.environ, "MANIFEST_TEST_NAME": "abc"})
+    assert not manifest.is_up_to_date({**os.environ, "MANIFEST_TEST__OTHER": "abc"})
+
+    self.data_path.write_text("def")
+    assert not manifest.is_up_to_date(os.environ)
+
+  def test_nested_scopes(self) -> None:
+    with manifest_scope() as outer:
+      with manifest_scope() as inner:
+        manifest_record_env_var("A", "1")
+      manifest_record_env_var("B", None)
+
+    assert inner.env_vars == {"A": "1"}
+    assert outer.env_vars == {"A": "1", "B": None}
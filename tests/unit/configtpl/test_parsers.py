@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+
+from configtpl.main import STR_TEMPLATE_NAME, ConfigTpl
+from configtpl.parsers import JsonParser, YamlParser
+
+
+class TestParsers(unittest.TestCase):
+  def test_yaml_parser(self) -> None:
+    parser = YamlParser()
+
+    assert parser.loader is getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    assert parser.name == f"yaml:{parser.loader.__name__}"
+    assert parser.parse("a: [1, 2]") == {"a": [1, 2]}
+    assert parser.parse("") is None
+
+    parser = YamlParser(yaml.SafeLoader)
+    assert parser.name == "yaml:SafeLoader"
+    assert parser.parse("a: 1") == {"a": 1}
+
+  def test_json_parser(self) -> None:
+    parser = JsonParser()
+
+    assert parser.parse('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert parser.parse(" \n") is None
+
+  def test_parser_by_extension(self) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      json_path = Path(tmp_dir, "config.json").resolve()
+      json_path.write_text('{"a": {{ 1 + 1 }}}')
+      yaml_path = Path(tmp_dir, "config.cfg").resolve()
+      yaml_path.write_text("b: {{ a }}")
+
+      builder = ConfigTpl(parsers_by_extension={".json": JsonParser()})
+      cfg, manifest = builder.build_from_files_with_manifest([str(json_path), str(yaml_path)])
+
+    assert cfg == {"a": 2, "b": 2}
+    assert manifest.parsers == {
+      str(json_path): "json",
+      str(yaml_path): YamlParser().name,
+    }
+
+  def test_json_files_parsed_as_yaml_by_default(self) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = Path(tmp_dir, "config.json").resolve()
+      path.write_text('# a comment\n{"a": 1e3, "b": unquoted}')
+
+      assert ConfigTpl().build_from_files([str(path)]) == {"a": "1e3", "b": "unquoted"}
+
+  def test_custom_parser(self) -> None:
+    builder = ConfigTpl(parser=YamlParser(yaml.SafeLoader))
+    cfg, manifest = builder.build_from_str_with_manifest("a: 1")
+
+    assert cfg == {"a": 1}
+    assert manifest.parsers == {STR_TEMPLATE_NAME: "yaml:SafeLoader"}
@@ -0,0 +1,146 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+from temp_dir_case import TempDirTestCase
+
+from configtpl.main import ConfigTpl
+from configtpl.manifest import BuildManifest
+from configtpl.result_cache import ResultCache
+
+
+class TestResultCache(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.main_path = self.tmp_dir / "main.cfg"
+    self.included_path = self.tmp_dir / "included.cfg"
+    self.main_path.write_text('name: {{ env("RESULT_CACHE_TEST_NAME", "none") }}\n{% include "included.cfg" %}\n')
+    self.included_path.write_text("included: 1\n")
+
+  def build(self, builder: ConfigTpl) -> dict:
+    return builder.build_from_files([str(self.main_path)])
+
+  def test_hit(self) -> None:
+    cache = ResultCache()
+    builder = ConfigTpl(result_cache=cache)
+
+    assert self.build(builder) == {"name": "none", "included": 1}
+    assert self.build(builder) == {"name": "none", "included": 1}
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+  def test_result_is_a_copy(self) -> None:
+    builder = ConfigTpl(result_cache=ResultCache())
+    self.build(builder)["name"] = "changed"
+
+    assert self.build(builder)["name"] == "none"
+
+  def test_inputs_are_part_of_key(self) -> None:
+    cache = ResultCache()
+    builder = ConfigTpl(result_cache=cache)
+    builder.build_from_files([str(self.main_path)])
+    builder.build_from_files([str(self.main_path)], overrides={"a": 1})
+    builder.build_from_files([str(self.main_path)], ctx={"a": 1})
+    builder.build_from_str("a: 1")
+
+    assert cache.stats.misses == 4
+    assert cache.stats.hits == 0
+
+  def test_lambdas_are_part_of_key(self) -> None:
+    def make_global(value: str) -> object:
+      def g() -> str:
+        return value
+
+      return g
+
+    cache = ResultCache()
+    results = []
+    for g in (lambda: "first", lambda: "second", make_global("third"), make_global("fourth")):
+      builder = ConfigTpl(result_cache=cache)
+      builder.set_global("g", g)
+      results.append(builder.build_from_str("v: {{ g() }}"))
+
+    assert results == [{"v": "first"}, {"v": "second"}, {"v": "third"}, {"v": "fourth"}]
+    assert cache.stats.hits == 0
+
+  @patch.dict(os.environ, {"RESULT_CACHE_TEST__ZIP": "01234"})
+  def test_schema_is_part_of_key(self) -> None:
+    cache = ResultCache()
+    builder = ConfigTpl(env_var_prefix="RESULT_CACHE_TEST", result_cache=cache)
+    builder_with_schema = ConfigTpl(env_var_prefix="RESULT_CACHE_TEST", schema={"zip": str}, result_cache=cache)
+
+    assert builder.build_from_str("a: 1") == {"a": 1, "zip": 1234}
+    assert builder_with_schema.build_from_str("a: 1") == {"a": 1, "zip": "01234"}
+    assert cache.stats.hits == 0
+
+  def test_included_template_change(self) -> None:
+    builder = ConfigTpl(result_cache=ResultCache())
+    self.build(builder)
+    self.included_path.write_text("included: 2\n")
+
+    assert self.build(builder) == {"name": "none", "included": 2}
+
+  def test_env_var_change(self) -> None:
+    builder = ConfigTpl(result_cache=ResultCache())
+    self.build(builder)
+    with patch.dict(os.environ, {"RESULT_CACHE_TEST_NAME": "test"}):
+      assert self.build(builder) == {"name": "test", "included": 1}
+
+  def test_env_var_prefix_change(self) -> None:
+    builder = ConfigTpl(env_var_prefix="RESULT_CACHE_TEST", result_cache=ResultCache())
+    self.build(builder)
+    with patch.dict(os.environ, {"RESULT_CACHE_TEST__INCLUDED": "3"}):
+      assert self.build(builder) == {"name": "none", "included": 3}
+
+  def test_nondeterministic_build(self) -> None:
+    cache = ResultCache()
+    builder = ConfigTpl(result_cache=cache)
+    cfg_1 = builder.build_from_str("id: {{ uuid() }}")
+    cfg_2 = builder.build_from_str("id: {{ uuid() }}")
+
+    assert cfg_1 != cfg_2
+    assert cache.stats.hits == 0
+
+    cache = ResultCache(cache_nondeterministic=True)
+    builder = ConfigTpl(result_cache=cache)
+    cfg_1 = builder.build_from_str("id: {{ uuid() }}")
+    cfg_2 = builder.build_from_str("id: {{ uuid() }}")
+
+    assert cfg_1 == cfg_2
+    assert cache.stats.hits == 1
+
+  def test_directory(self) -> None:
+    cache_dir = str(self.tmp_dir / "cache")
+    self.build(ConfigTpl(result_cache=ResultCache(directory=cache_dir)))
+    cache = ResultCache(directory=cache_dir)
+
+    assert self.build(ConfigTpl(result_cache=cache)) == {"name": "none", "included": 1}
+    assert cache.stats.hits == 1
+
+    cache.clear()
+    assert list(Path(cache_dir).iterdir()) == []
+
+  def test_directory_max_size(self) -> None:
+    cache_dir = self.tmp_dir / "cache"
+    cache = ResultCache(directory=str(cache_dir))
+    cache.put("a", {"name": "a"}, BuildManifest())
+    cache.max_size = (cache_dir / "a.pickle").stat().st_size * 2
+    os.utime(cache_dir / "a.pickle", ns=(0, 0))
+    cache.put("b", {"name": "b"}, BuildManifest())
+    assert cache.stats.evictions == 0
+
+    # The least recently used file is removed
+    cache.put("c", {"name": "c"}, BuildManifest())
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["b.pickle", "c.pickle"]
+    assert cache.stats.evictions == 1
+
+  def test_outdated_entry_removed(self) -> None:
+    cache_dir = self.tmp_dir / "cache"
+    cache = ResultCache(directory=str(cache_dir))
+    self.build(ConfigTpl(result_cache=cache))
+    [path] = cache_dir.iterdir()
+    self.included_path.write_text("included: 2\n")
+
+    assert cache.get(path.stem) is None
+    assert len(cache._memory) == 0  # noqa: SLF001
+    assert not path.exists()
@@ -0,0 +1,103 @@
+import pickle
+import unittest
+from dataclasses import dataclass, field
+from typing import Any, TypedDict
+
+import pytest
+
+from configtpl.env import get_config_from_env
+from configtpl.schema import Schema
+
+
+@dataclass
+class DbSchema:
+  host: str
+  port: int = 5432
+  replicas: list[str] = field(default_factory=list)
+
+
+@dataclass
+class AppSchema:
+  db: DbSchema
+  zip_code: str
+  debug: bool = False
+  ratio: float | None = None
+  labels: dict[str, int] = field(default_factory=dict)
+  extra: Any = None
+
+
+class LimitsSchema(TypedDict):
+  cpu: float
+  memory: int
+
+
+class TestSchema(unittest.TestCase):
+  def test_validate(self) -> None:
+    schema = Schema(AppSchema)
+    schema.validate(
+      {
+        "db": {"host": "localhost", "port": 5432, "replicas": ["a", "b"]},
+        "zip_code": "01234",
+        "ratio": 1,
+        "labels": {"a": 1},
+        "extra": [{"anything": True}],
+        "unknown": object(),
+      },
+    )
+    # Missing keys are not reported
+    schema.validate({})
+
+    with pytest.raises(TypeError, match=r"'db\.port' .* expected int, got str"):
+      schema.validate({"db": {"port": "5432"}})
+    with pytest.raises(TypeError, match=r"'db\.port' .* expected int, got bool"):
+      schema.validate({"db": {"port": True}})
+    with pytest.raises(TypeError, match=r"'db\.replicas\[1\]' .* expected str, got int"):
+      schema.validate({"db": {"replicas": ["a", 1]}})
+    with pytest.raises(TypeError, match=r"'labels\.b' .* expected int, got str"):
+      schema.validate({"labels": {"a": 1, "b": "2"}})
+    with pytest.raises(TypeError, match=r"'ratio' .* expected float \| None, got str"):
+      schema.validate({"ratio": "0.5"})
+    with pytest.raises(TypeError, match=r"'db' .* expected DbSchema, got list"):
+      schema.validate({"db": []})
+
+  def test_dict_spec(self) -> None:
+    schema = Schema({"service": {"name": str, "limits": LimitsSchema}, "tags": list})
+    schema.validate({"service": {"name": "app", "limits": {"cpu": 0.5, "memory": 512}}, "tags": [1, "a"]})
+    with pytest.raises(TypeError, match=r"'service\.limits\.memory' .* expected int, got float"):
+      schema.validate({"service": {"limits": {"memory": 0.5}}})
+
+  def test_unsupported_type(self) -> None:
+    with pytest.raises(TypeError, match=r"Unsupported type in schema at 'a\.b'"):
+      Schema({"a": {"b": 1}})
+
+  def test_env_converters(self) -> None:
+    environ = {
+      "APP__ZIP_CODE": "01234",
+      "APP__DEBUG": "Yes",
+      "APP__RATIO": "",
+      "APP__DB__HOST": "'10.0.0.1'",
+      "APP__DB__PORT": "6543",
+      "APP__LABELS__TEAM": "7",
+      "APP__EXTRA": "123",
+      "APP__UNKNOWN__KEY": "true",
+    }
+    assert get_config_from_env("APP", environ, Schema(AppSchema)) == {
+      "zip_code": "01234",
+      "debug": True,
+      "ratio": None,
+      "db": {"host": "10.0.0.1", "port": 6543},
+      "labels": {"team": 7},
+      # Types of values are guessed for keys with unknown types
+      "extra": 123,
+      "unknown": {"key": True},
+    }
+
+    with pytest.raises(ValueError, match=r"'APP__DB__PORT': Invalid value 'abc' of 'db\.port': expected int"):
+      get_config_from_env("APP", {"APP__DB__PORT": "abc"}, Schema(AppSchema))
+    with pytest.raises(ValueError, match=r"'APP__DEBUG': Invalid value 'maybe' of 'debug': expected bool"):
+      get_config_from_env("APP", {"APP__DEBUG": "maybe"}, Schema(AppSchema))
+
+  def test_pickle(self) -> None:
+    schema = pickle.loads(pickle.dumps(Schema(AppSchema)))  # noqa: S301 the data is trusted
+    with pytest.raises(TypeError):
+      schema.validate({"zip_code": 1234})
@@ -0,0 +1,100 @@
+import os
+from unittest import mock
+
+import pytest
+from temp_dir_case import TempDirTestCase
+
+from configtpl.main import ConfigTpl
+from configtpl.snapshot import snapshot_compile, snapshot_load
+
+
+class TestSnapshot(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.write("layer_1.cfg", "a: 1\nhome: {{ env('SNAPSHOT_TEST_HOME') }}")
+    self.write("layer_2.cfg", f"b: {{{{ a + 1 }}}}\nc: {{{{ file('{self.tmp_dir / 'data.txt'}') }}}}")
+    self.write("data.txt", "data")
+    self.paths = [str(self.tmp_dir / "layer_1.cfg"), str(self.tmp_dir / "layer_2.cfg")]
+    self.snapshot_path = self.tmp_dir / "config.snapshot"
+    self.builder = ConfigTpl(defaults={"default": 0}, env_var_prefix="SNAPSHOT_TEST_CFG")
+    environ = {"SNAPSHOT_TEST_HOME": "/home/user", "SNAPSHOT_TEST_CFG__B": "20"}
+    self.environ = mock.patch.dict(os.environ, environ)
+    self.environ.start()
+
+  def tearDown(self) -> None:
+    self.environ.stop()
+
+  def load(self, overrides: dict | None = None) -> tuple[dict, bool]:
+    """
+    Returns the configuration and True if it was built from files instead of the snapshot
+    """
+    with mock.patch.object(self.builder, "build_from_files", wraps=self.builder.build_from_files) as build:
+      cfg = snapshot_load(self.builder, self.paths, self.snapshot_path, overrides)
+    return (cfg, build.called)
+
+  def test_load(self) -> None:
+    manifest = snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    assert manifest.env_vars == {"SNAPSHOT_TEST_HOME": "/home/user"}
+    assert sorted(manifest.templates) == sorted(self.paths)
+
+    (cfg, rebuilt) = self.load({"d": 4})
+    assert not rebuilt
+    # The environment variables with prefix and overrides are applied on load
+    assert cfg == {"default": 0, "a": 1, "home": "/home/user", "b": 20, "c": "data", "d": 4}
+    assert cfg == self.builder.build_from_files(self.paths, {"d": 4})
+
+    os.environ["SNAPSHOT_TEST_CFG__B"] = "30"
+    (cfg, rebuilt) = self.load()
+    assert not rebuilt
+    assert cfg["b"] == 30
+
+  def test_outdated(self) -> None:
+    snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    self.write("data.txt", "new data")
+    (cfg, rebuilt) = self.load()
+    assert rebuilt
+    assert cfg["c"] == "new data"
+
+    snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    os.environ["SNAPSHOT_TEST_HOME"] = "/root"
+    (cfg, rebuilt) = self.load()
+    assert rebuilt
+    assert cfg["home"] == "/root"
+
+    snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    (cfg, rebuilt) = self.load()
+    assert not rebuilt
+    # Other paths
+    cfg = snapshot_load(self.builder, self.paths[:1], self.snapshot_path)
+    assert cfg == {"default": 0, "a": 1, "home": "/root", "b": 20}
+
+  def test_touched_file(self) -> None:
+    snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    # The modification time is changed, but the contents are the same
+    os.utime(self.tmp_dir / "data.txt", ns=(0, 0))
+    (_, rebuilt) = self.load()
+    assert not rebuilt
+
+  def test_invalid_snapshot(self) -> None:
+    expected = self.builder.build_from_files(self.paths)
+    # Missing
+    (cfg, rebuilt) = self.load()
+    assert rebuilt
+    assert cfg == expected
+
+    for contents in (b"", b"not a snapshot", b"CONFIGTPL-SNAPSHOT-1\n\xff\xff"):
+      self.snapshot_path.write_bytes(contents)
+      (cfg, rebuilt) = self.load()
+      assert rebuilt
+      assert cfg == expected
+
+  def test_nondeterministic(self) -> None:
+    self.write("layer_2.cfg", "id: {{ uuid() }}")
+    with pytest.raises(ValueError, match=r"nondeterministic globals \(uuid\)"):
+      snapshot_compile(self.builder, self.paths, self.snapshot_path)
+    assert not self.snapshot_path.exists()
+
+    snapshot_compile(self.builder, self.paths, self.snapshot_path, allow_nondeterministic=True)
+    (cfg, rebuilt) = self.load()
+    assert not rebuilt
+    assert len(cfg["id"]) == 36
@@ -0,0 +1,49 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from configtpl.main import STR_TEMPLATE_NAME, ConfigTpl
+from configtpl.stats import STAGE_COMPILE, STAGE_ENV, STAGE_MERGE, STAGE_PARSE, STAGE_RENDER, BuildStats
+
+
+class TestBuildStats(unittest.TestCase):
+  def test_build_from_files(self) -> None:
+    stats = BuildStats()
+    builder = ConfigTpl(hooks=stats)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      paths = []
+      for i in range(2):
+        path = Path(tmp_dir, f"config_{i}.cfg").resolve()
+        path.write_text(f'value_{i}: {{{{ env("STATS_TEST_UNDEFINED", "x") }}}}')
+        paths.append(str(path))
+
+      cfg = builder.build_from_files(paths)
+
+    assert cfg == {"value_0": "x", "value_1": "x"}
+    snapshot = stats.snapshot()
+    for stage in (STAGE_COMPILE, STAGE_RENDER, STAGE_PARSE):
+      assert snapshot.stages[stage].count == 2
+      for path in paths:
+        assert snapshot.files[path][stage].count == 1
+    # A merge per layer and a merge with environment and overrides
+    assert snapshot.stages[STAGE_MERGE].count == 3
+    assert snapshot.stages[STAGE_ENV].count == 1
+    assert snapshot.globals["env"].count == 2
+    assert snapshot.bytes_rendered == len("value_0: x") * 2
+
+  def test_build_from_str(self) -> None:
+    stats = BuildStats()
+    ConfigTpl(hooks=stats).build_from_str('a: {{ cmd("echo 1") }}')
+
+    snapshot = stats.snapshot()
+    assert snapshot.globals["cmd"].count == 1
+    assert snapshot.files[STR_TEMPLATE_NAME][STAGE_RENDER].count == 1
+    assert snapshot.stages[STAGE_RENDER].total >= snapshot.stages[STAGE_RENDER].max > 0
+
+  def test_reset(self) -> None:
+    stats = BuildStats()
+    ConfigTpl(hooks=stats).build_from_str("a: 1")
+    stats.reset()
+
+    assert stats.snapshot().stages == {}
+    assert stats.snapshot().bytes_rendered == 0
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from temp_dir_case import TempDirTestCase
+
+from configtpl.main import ConfigTpl
+from configtpl.watcher import ConfigWatcher
+
+
+class TestConfigWatcher(TempDirTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.cfg_path = self.tmp_dir / "config.cfg"
+    self.cfg_path.write_text('value: 1\nname: {{ env("WATCHER_TEST_NAME", "none") }}')
+    self.watcher = ConfigWatcher(ConfigTpl(), [str(self.cfg_path)], interval=0.01, debounce=0.01)
+
+  def tearDown(self) -> None:
+    self.watcher.stop()
+
+  def write_config(self, contents: str) -> None:
+    self.cfg_path.write_text(contents)
+    # Make sure the modification time differs on file systems with low precision of timestamps
+    st = self.cfg_path.stat()
+    os.utime(self.cfg_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+  def test_check(self) -> None:
+    received = []
+    self.watcher.subscribe(received.append)
+
+    assert self.watcher.config == {"value": 1, "name": "none"}
+    assert not self.watcher.check()
+
+    self.write_config("value: 2")
+    assert self.watcher.check()
+    assert self.watcher.config == {"value": 2}
+    assert received == [{"value": 2}]
+
+  def test_env_var_change(self) -> None:
+    with patch.dict(os.environ, {"WATCHER_TEST_NAME": "test"}):
+      assert self.watcher.check()
+      assert self.watcher.config == {"value": 1, "name": "test"}
+
+  def test_failed_rebuild(self) -> None:
+    errors = []
+    self.watcher.on_error = errors.append
+    self.write_config("value: {{ undefined_var }}")
+
+    assert not self.watcher.check()
+    assert self.watcher.config == {"value": 1, "name": "none"}
+    assert len(errors) == 1
+    # The failed state is not rebuilt again until the file changes
+    assert not self.watcher.check()
+    assert len(errors) == 1
+
+  def test_failed_rebuild_env_var_change(self) -> None:
+    errors = []
+    self.watcher.on_error = errors.append
+    self.write_config('{% if env("WATCHER_TEST_NAME", "none").startswith("bad") %}{{ undefined_var }}{% endif %}')
+    assert self.watcher.check()
+
+    for i, name in enumerate(("bad_1", "bad_2"), 1):
+      with patch.dict(os.environ, {"WATCHER_TEST_NAME": name}):
+        assert not self.watcher.check()
+        assert not self.watcher.check()
+        assert len(errors) == i
+
+    with patch.dict(os.environ, {"WATCHER_TEST_NAME": "good"}):
+      assert self.watcher.check()
+    assert len(errors) == 2
+
+  def test_unsubscribe(self) -> None:
+    received = []
+    unsubscribe = self.watcher.subscribe(received.append)
+    unsubscribe()
+    self.write_config("value: 2")
+    self.watcher.check()
+
+    assert received == []
+
+  def test_background_thread(self) -> None:
+    rebuilt = threading.Event()
+    self.watcher.subscribe(lambda _: rebuilt.set())
+    with self.watcher:
+      self.write_config("value: 3")
+      assert rebuilt.wait(5)
+
+    assert self.watcher.config == {"value": 3}
+
+  def test_concurrent_check(self) -> None:
+    builds = []
+    build = self.watcher._build  # noqa: SLF001
+
+    def slow_build() -> tuple:
+      builds.append(1)
+      time.sleep(0.05)
+      return build()
+
+    self.watcher._build = slow_build  # noqa: SLF001
+    self.write_config("value: 4")
+
+    with self.watcher, ThreadPoolExecutor(8) as pool:
+      results = list(pool.map(lambda _: self.watcher.check(), range(8)))
+      self.watcher.stop()
+
+    assert len(builds) == 1
+    assert results.count(True) <= 1
+    assert self.watcher.config == {"value": 4}
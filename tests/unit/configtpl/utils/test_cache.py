@@ -0,0 +1,42 @@
+import unittest
+
+from configtpl.utils.cache import LruCache
+
+
+class TestLruCache(unittest.TestCase):
+  def test_max_entries(self) -> None:
+    evicted = []
+    cache = LruCache(2, on_evict=lambda k, v: evicted.append((k, v)))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert evicted == [("b", 2)]
+    assert cache.stats.evictions == 1
+
+  def test_max_size(self) -> None:
+    cache = LruCache(10, max_size=5)
+    cache.put("a", "aaa", size=3)
+    cache.put("b", "bb", size=2)
+    assert cache.size == 5
+
+    cache.put("c", "cc", size=2)
+    assert cache.get("a") is None
+    assert cache.size == 4
+
+    # Entries larger than the limit are not kept
+    cache.put("d", "dddddd", size=6)
+    assert cache.get("d") is None
+    assert len(cache) == 2
+
+    cache.remove_if(lambda k, _: k == "b")
+    assert cache.size == 2
+    cache.remove("c")
+    cache.remove("missing")
+    assert cache.size == 0
+    assert cache.stats.evictions == 1
+    cache.put("e", "e", size=1)
+    cache.clear()
+    assert cache.size == 0
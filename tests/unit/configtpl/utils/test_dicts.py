@@ -1,6 +1,17 @@
+import collections
+import copy
 import unittest
 
-from configtpl.utils.dicts import dict_deep_merge, dict_init_dicts_from_list
+import pytest
+
+from configtpl.utils.dicts import (
+  FrozenDict,
+  FrozenList,
+  dict_deep_merge,
+  dict_freeze,
+  dict_init_dicts_from_list,
+  dict_thaw,
+)
 
 
 class TestDictUtils(unittest.TestCase):
@@ -63,6 +74,70 @@ class TestDictUtils(unittest.TestCase):
     expected = {"a": {"x": 1}, "b": 2}
     assert dict_deep_merge(d1, d2) == expected
 
+  def test_dict_deep_merge_list_strategies(self) -> None:
+    d1 = {"a": [1, 2], "b": {"c": [{"x": 1}]}}
+    d2 = {"a": [2, 3], "b": {"c": [{"x": 1}, {"y": 2}]}}
+    d3 = {"a": [3, 4]}
+
+    assert dict_deep_merge(d1, d2, d3) == {"a": [3, 4], "b": {"c": [{"x": 1}, {"y": 2}]}}
+    assert dict_deep_merge(d1, d2, d3, list_strategy="append") == {
+      "a": [1, 2, 2, 3, 3, 4],
+      "b": {"c": [{"x": 1}, {"x": 1}, {"y": 2}]},
+    }
+    assert dict_deep_merge(d1, d2, d3, list_strategy="unique") == {
+      "a": [1, 2, 3, 4],
+      "b": {"c": [{"x": 1}, {"y": 2}]},
+    }
+    # Lists which are not merged with other lists are deduplicated too
+    d4 = {"a": [1, 1], "b": {"c": [2, 2]}, "d": "e"}
+    assert dict_deep_merge(d4, {"d": "f"}, list_strategy="unique") == {"a": [1], "b": {"c": [2]}, "d": "f"}
+    assert dict_deep_merge(d4, list_strategy="unique", frozen=True) == {"a": [1], "b": {"c": [2]}, "d": "e"}
+    # A non-list value discards the previous lists
+    assert dict_deep_merge(d1, {"a": None}, d3, list_strategy="append") == {"a": [3, 4], "b": {"c": [{"x": 1}]}}
+    # Inputs are not modified
+    assert d1 == {"a": [1, 2], "b": {"c": [{"x": 1}]}}
+
+    with pytest.raises(ValueError, match="Unknown list strategy"):
+      dict_deep_merge(d1, list_strategy="invalid")
+
+  def test_dict_deep_merge_structural_sharing(self) -> None:
+    d1 = {"a": {"x": 1}, "b": {"y": 2}}
+    d2 = {"b": {"z": 3}}
+    merged = dict_deep_merge(d1, d2)
+
+    # Subtrees from a single dictionary are reused
+    assert merged["a"] is d1["a"]
+    # Subtrees from multiple dictionaries are new
+    assert merged["b"] == {"y": 2, "z": 3}
+    assert d1["b"] == {"y": 2}
+
+  def test_dict_deep_merge_frozen(self) -> None:
+    d1 = dict_freeze({"a": {"x": 1}, "b": {"y": 2}})
+    d2 = {"b": {"z": [1]}, "c": {"w": 4}}
+    merged = dict_deep_merge(d1, d2, frozen=True)
+
+    assert merged == {"a": {"x": 1}, "b": {"y": 2, "z": [1]}, "c": {"w": 4}}
+    assert isinstance(merged, FrozenDict)
+    assert isinstance(merged["b"], FrozenDict)
+    assert isinstance(merged["b"]["z"], FrozenList)
+    assert isinstance(merged["c"], FrozenDict)
+    # Read-only subtrees are reused
+    assert merged["a"] is d1["a"]
+
+  def test_dict_deep_merge_deep(self) -> None:
+    depth = 10000
+
+    def make_deep(leaf: dict) -> dict:
+      d = leaf
+      for _ in range(depth):
+        d = {"n": d}
+      return d
+
+    merged = dict_deep_merge(make_deep({"x": 1}), make_deep({"y": 2}))
+    for _ in range(depth):
+      merged = merged["n"]
+    assert merged == {"x": 1, "y": 2}
+
   def test_dict_init_dicts_from_list(self) -> None:
     # Test with all None inputs
     assert dict_init_dicts_from_list(None, None, None) == ({}, {}, {})
@@ -81,3 +156,53 @@ class TestDictUtils(unittest.TestCase):
 
     # Test with empty dict
     assert dict_init_dicts_from_list({}, None) == ({}, {})
+
+  def test_dict_freeze(self) -> None:
+    d = {"a": {"b": [1, {"c": 2}]}, "d": 3}
+    frozen = dict_freeze(d)
+
+    assert frozen == d
+    assert isinstance(frozen, FrozenDict)
+    assert isinstance(frozen["a"]["b"], FrozenList)
+    assert isinstance(frozen["a"]["b"][1], FrozenDict)
+    # Frozen values are shared, not copied
+    assert dict_freeze(frozen) is frozen
+    assert dict_freeze({"x": frozen["a"]})["x"] is frozen["a"]
+
+    with pytest.raises(TypeError):
+      frozen["a"]["e"] = 1
+    with pytest.raises(TypeError):
+      frozen["a"]["b"].append(1)
+    with pytest.raises(TypeError):
+      frozen.update({"a": 1})
+    assert frozen == d
+
+    assert copy.deepcopy(frozen) == d
+
+  def test_dict_freeze_subclasses(self) -> None:
+    counts = collections.defaultdict(int)
+    items = collections.UserList([1])
+    frozen = dict_freeze({"counts": counts, "ordered": collections.OrderedDict(a=1), "items": items})
+
+    # Subclasses keep their behavior, so they are not copied
+    assert frozen["counts"] is counts
+    assert type(frozen["ordered"]) is collections.OrderedDict
+    assert dict_thaw(frozen)["counts"] is counts
+
+  def test_dict_freeze_circular(self) -> None:
+    d = {"a": []}
+    d["a"].append(d)
+    frozen = dict_freeze(d)
+
+    assert frozen["a"][0] is frozen
+
+  def test_dict_thaw(self) -> None:
+    frozen = dict_freeze({"a": {"b": [1, {"c": 2}]}})
+    thawed = dict_thaw(frozen)
+
+    assert thawed == frozen
+    assert type(thawed) is dict
+    assert type(thawed["a"]["b"]) is list
+    assert type(thawed["a"]["b"][1]) is dict
+    thawed["a"]["b"].append(3)
+    assert frozen == {"a": {"b": [1, {"c": 2}]}}
@@ -0,0 +1,33 @@
+import unittest
+
+from configtpl.utils.streams import ChunkReader
+
+
+class TestChunkReader(unittest.TestCase):
+  def test_read(self) -> None:
+    reader = ChunkReader(["ab", "", "cdef", "g"])
+    assert reader.read(3) == "abc"
+    assert reader.read(0) == ""
+    assert reader.read(2) == "de"
+    assert reader.read() == "fg"
+    assert reader.read() == ""
+    assert reader.read(10) == ""
+
+  def test_lazy(self) -> None:
+    taken = []
+
+    def chunks() -> object:
+      for chunk in ("abc", "def", "ghi"):
+        taken.append(chunk)
+        yield chunk
+
+    reader = ChunkReader(chunks())
+    assert reader.read(4) == "abcd"
+    assert taken == ["abc", "def"]
+    reader.close()
+    assert reader.read() == ""
+
+  def test_bytes_read(self) -> None:
+    reader = ChunkReader(["a", "ä"], count_bytes=True)
+    reader.read()
+    assert reader.bytes_read == 3
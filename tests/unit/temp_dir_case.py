@@ -0,0 +1,30 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TempDirTestCase(unittest.TestCase):
+  """
+  A test case with a temporary directory which is removed after each test, after `tearDown`.
+  Can be combined with other test case classes, e.g. `class TestX(TempDirTestCase, IsolatedAsyncioTestCase)`
+  """
+
+  def setUp(self) -> None:
+    super().setUp()
+    tmp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(tmp_dir.cleanup)
+    self.tmp_dir = Path(tmp_dir.name).resolve()
+
+  def write(self, name: str, contents: str) -> str:
+    """
+    Writes a file into the temporary directory and returns its path
+    """
+    path = self.tmp_dir / name
+    path.write_text(contents)
+    return str(path)
+
+  def write_layers(self, *contents: str) -> list[str]:
+    """
+    Writes configuration files "layer_0.cfg", "layer_1.cfg" and so on, and returns their paths
+    """
+    return [self.write(f"layer_{i}.cfg", text) for i, text in enumerate(contents)]